@@ -0,0 +1,62 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import sys
+import argparse
+import contextlib
+from dmtipci.dictionary import Dictionary
+from dmtipci.find       import Finder
+from dmtipci            import system, predicates, suggest, batch
+
+
+def main(args):
+    # stdout only carries results, everything the library reports goes to stderr
+    stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        d = Dictionary()
+        # every shard is needed sooner or later, map them while the first words are read
+        d.load(args.text, prefetch=True)
+        index = predicates.load(d, predicates.index_filename(args.text)) if args.index else None
+        if args.suggestions:
+            # written once here rather than by every worker
+            d.suggest = suggest.load(d, d.suggest_file)
+        finder = Finder(d, index=index)
+        source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+        output = stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        try:
+            summary = batch.run(finder, source, output, sys.stderr, args.processes, args.batch_size, not args.unordered, args.window, args.suggestions)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not stdout:
+                output.close()
+    sys.stderr.write('Looked up %d words in %.1fs, %.0f words/s, %d unknown\n' % (summary['words'], summary['seconds'], summary['words_per_second'], summary['unknown']))
+
+
+if __name__ == '__main__':
+    sys.stderr.write("╔╦╗╔╦╗╔╦╗╦╔═╗╔═╗╦\n")
+    sys.stderr.write(" ║║║║║ ║ ║╠═╝║  ║\n")
+    sys.stderr.write("═╩╝╩ ╩ ╩ ╩╩  ╚═╝╩\n")
+    sys.stderr.write("- DMTIPCI Batch -\n")
+    sys.stderr.write("    v" + str(system.VERSION) + "    \n")
+    parser = argparse.ArgumentParser(description='DMTIPCI Batch Lookups, words (one per line) to JSON lines')
+    parser.add_argument('input', nargs='?', default='-', help='File of words to look up, one per line (default: stdin)')
+    parser.add_argument('-o', '--output', default='-', help='JSON lines results file (default: stdout)')
+    parser.add_argument('-t', '--text', default='dict/pg29765.txt', help='Gutenberg dictionary text')
+    parser.add_argument('-j', '--processes', type=int, default=1, help='Number of worker processes looking up chunks')
+    parser.add_argument('-b', '--batch-size', type=int, default=256, help='Number of words looked up together')
+    parser.add_argument('-w', '--window', type=int, default=0, help='Most chunks read ahead of the output (default: 4 per worker)')
+    parser.add_argument('-u', '--unordered', action='store_true', help='Write results as soon as their chunk is done instead of in input order')
+    parser.add_argument('-s', '--suggestions', action='store_true', help='Add spelling suggestions to unknown words')
+    parser.add_argument('-i', '--index', action='store_true', help='Answer from the predicate index precomputed by build_dict.py --predicates, when it is up to date')
+    args = parser.parse_args()
+    try:
+        main(args)
+    except BrokenPipeError:
+        # i.e. piped into head, the rest of the output is not wanted
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,281 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import io
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+from dmtipci.dictionary import Dictionary
+from dmtipci.find       import Finder
+from dmtipci            import system, synthetic, gutenberg, inflection, evaluate, wordnet, pipeline, vector, find
+
+
+# Offline benchmarks over synthetic dictionaries (see dmtipci/synthetic.py),
+# every scale is BASE_HEADWORDS times headwords. Results go to a JSON file,
+# --compare prints the change against an earlier one, --check fails when private
+# memory per worker process grows with the number of workers, or numpy engine
+# workers hold their own copy of the matrix. With numpy installed, every run
+# also fails when the numpy engine gives other predicates than the Python path
+# for any headword.
+
+BASE_HEADWORDS = 1000
+
+
+def quiet():
+    # the library reports progress on stdout, benchmarks only print results
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def timed(function, *args, **kwargs):
+    started = time.time()
+    with quiet():
+        result = function(*args, **kwargs)
+    return (time.time() - started, result)
+
+
+def latencies(values):
+    values = sorted(values)
+    return {
+        'count':    len(values),
+        'mean':     sum(values) / len(values) if values else 0,
+        'p50':      evaluate.percentile(values, 50),
+        'p90':      evaluate.percentile(values, 90),
+        'p99':      evaluate.percentile(values, 99),
+        'max':      values[-1] if values else 0,
+    }
+
+
+def _attach_worker(payload, words, queue):
+    # a spawned process: attach to the pickled finder, look up `words`, report its memory
+    started     = time.time()
+    finder      = pickle.loads(payload)
+    attached    = time.time() - started
+    with quiet():
+        finder.lookup_many(words)
+    queue.put({'attach': attached, 'memory': pipeline.memory_usage(), 'engine_heap': finder.engine.heapBytes() if finder.engine is not None else None})
+
+
+def bench_workers(finder, words, workers):
+    # 1, 2, 4 ... `workers` processes at once, each attaching to the mapped
+    # artifact (see Dictionary.__getstate__()), private memory per worker should
+    # not depend on how many there are
+    context     = multiprocessing.get_context('spawn')
+    payload     = pickle.dumps(finder)
+    results     = {'payload': len(payload), 'runs': []}
+    count       = 1
+    while count <= workers:
+        queue       = context.Queue()
+        processes   = [context.Process(target=_attach_worker, args=(payload, words, queue)) for x in range(count)]
+        for process in processes:
+            process.start()
+        reports     = [queue.get() for x in processes]
+        for process in processes:
+            process.join()
+        memory      = [x['memory'] for x in reports if x['memory'] is not None]
+        heaps       = [x['engine_heap'] for x in reports if x['engine_heap'] is not None]
+        results['runs'].append({
+            'workers':  count,
+            'attach':   max([x['attach'] for x in reports]),
+            'rss':      sum([x['rss'] for x in memory]) / len(memory) if memory else None,
+            'private':  sum([x['private'] for x in memory]) / len(memory) if memory else None,
+            'shared':   sum([x['shared'] for x in memory]) / len(memory) if memory else None,
+            'engine_heap': max(heaps) if heaps else None,
+        })
+        count *= 2
+    return results
+
+
+def check_workers(run, tolerance):
+    # [failure] of the worker runs of a scale whose private memory per worker grew
+    # by more than `tolerance` from 1 worker to the most workers, or whose numpy
+    # engine holds any of its matrix on the heap: a private copy is the same size
+    # in every worker, so only the total grows with them
+    failures = []
+    for name in ('workers', 'workers_numpy'):
+        runs = run['results'].get(name, {}).get('runs', [])
+        if len(runs) > 0 and runs[-1].get('engine_heap'):
+            failures.append('%dx %s: %.1f MB of the matrix private to every worker' % (run['scale'], name, runs[-1]['engine_heap'] / 1048576))
+        if len(runs) < 2 or runs[0]['private'] is None:
+            continue
+        if runs[-1]['private'] > runs[0]['private'] * (1 + tolerance):
+            failures.append('%dx %s: private per worker %.1f MB with 1 worker, %.1f MB with %d' % (run['scale'], name, runs[0]['private'] / 1048576, runs[-1]['private'] / 1048576, runs[-1]['workers']))
+    return failures
+
+
+def bench_scale(work, scale, args):
+    results     = {}
+    text        = os.path.join(work, 'dict', 'pg29765.txt')
+    os.makedirs(os.path.dirname(text), exist_ok=True)
+    (seconds, headwords) = timed(synthetic.generate, text, BASE_HEADWORDS * scale, args.seed, args.definition_length)
+    results['generate'] = {'seconds': seconds, 'headwords': headwords, 'bytes': os.path.getsize(text)}
+    print('  generated %d headwords, %.1f MB' % (headwords, os.path.getsize(text) / 1048576))
+
+    # build stages, one at a time, as Dictionary.update*() run them
+    (seconds, parsed) = timed(gutenberg.parse, text, args.processes)
+    results['parse'] = {'seconds': seconds, 'headwords': len(parsed)}
+    (seconds, word_infl) = timed(inflection.build, parsed, Dictionary.getVariationPOS, args.processes)
+    results['inflection'] = {'seconds': seconds, 'forms': len(word_infl)}
+    d = Dictionary()
+    d.dictionary = parsed
+    d.word_infl = word_infl
+    (seconds, tokens) = timed(d.countWordFrequency)
+    results['frequency'] = {'seconds': seconds, 'tokens': tokens, 'tokens_per_second': tokens / seconds if seconds > 0 else 0}
+
+    # fused build and artifact
+    d = Dictionary()
+    (seconds, x) = timed(d.load, text, args.processes, False, True)
+    results['build'] = {'seconds': seconds, 'stages': d.build_stats.stages}
+    d = Dictionary()
+    (seconds, x) = timed(d.load, text)
+    results['artifact_load'] = {'seconds': seconds}
+
+    # lookups, on the freshly mapped artifact
+    words       = sorted(d.dictionary)
+    sample      = random.Random(args.seed).sample(words, min(args.queries, len(words)))
+    finder      = Finder(d)
+    cold        = []
+    for word in sample:
+        (seconds, x) = timed(finder.find, word, False)
+        cold.append(seconds)
+    warm        = []
+    for word in sample:
+        (seconds, x) = timed(finder.find, word, False)
+        warm.append(seconds)
+    results['find'] = {'cold': latencies(cold), 'warm': latencies(warm)}
+    (seconds, x) = timed(finder.find_many, sample, args.processes, args.batch_size)
+    results['find_many'] = {'seconds': seconds, 'words': len(sample), 'words_per_second': len(sample) / seconds if seconds > 0 else 0}
+    results['memory'] = d.memory_report()
+    if vector.np is not None:
+        # the numpy engine must give exactly the same predicates as the Python path, for every headword
+        with quiet():
+            engine = vector.MatrixEngine(d)
+        (seconds, mismatches) = timed(find.verify_engine, d, engine, words)
+        results['engine'] = {'seconds': seconds, 'headwords': len(words), 'mismatches': [x[0] for x in mismatches]}
+        # warm lookups of the same sample as 'find', the engine only wins on long level-2 definition lists (see vector.py)
+        engine_finder = Finder(d, engine=engine)
+        warm    = []
+        for word in sample:
+            (seconds, x) = timed(engine_finder.find, word, False)
+            warm.append(seconds)
+        results['find_numpy'] = {'warm': latencies(warm)}
+    if args.workers > 0:
+        results['workers'] = bench_workers(finder, sample, args.workers)
+        if vector.np is not None:
+            # numpy engine workers map the matrix index next to the artifact (see
+            # MatrixEngine.__reduce__()), nothing of it should be private
+            results['workers_numpy'] = bench_workers(Finder(d, engine=engine), sample, args.workers)
+
+    # evaluation over a synthetic WordNet
+    synthetic.generate_wordnet(os.path.join(work, 'wordnet_db'), text, args.seed)
+    with quiet():
+        db = wordnet.load(os.path.join(work, 'wordnet_db'))
+    (seconds, summary) = timed(evaluate.run, finder, db, os.path.join(work, 'eval_log.jsonl'), args.processes, args.batch_size, True)
+    results['eval'] = {'seconds': seconds, 'words': summary['evaluated'], 'words_per_second': summary['words_per_second'], 'latency': summary['latency']}
+    d.store.close()
+    return results
+
+
+def report(run):
+    results = run['results']
+    print('  parse %.2fs, inflection %.2fs, frequency %.2fs (%.0f tokens/s), build %.2fs, artifact load %.3fs' % (results['parse']['seconds'], results['inflection']['seconds'], results['frequency']['seconds'], results['frequency']['tokens_per_second'], results['build']['seconds'], results['artifact_load']['seconds']))
+    print('  heap %.1f MB, mapped %.1f MB after lookups' % (results['memory']['total'] / 1048576, results['memory']['mapped'] / 1048576))
+    print('  find p50 %.2fms p99 %.2fms (cold p50 %.2fms), find_many %.0f words/s, eval %.0f words/s' % (results['find']['warm']['p50'] * 1000, results['find']['warm']['p99'] * 1000, results['find']['cold']['p50'] * 1000, results['find_many']['words_per_second'], results['eval']['words_per_second']))
+    if 'engine' in results:
+        print('  numpy engine: %d headwords in %.2fs, %d with other predicates than the Python path' % (results['engine']['headwords'], results['engine']['seconds'], len(results['engine']['mismatches'])))
+        print('  numpy engine find p50 %.2fms p99 %.2fms mean %.3fms, %.2fx the Python path mean' % (results['find_numpy']['warm']['p50'] * 1000, results['find_numpy']['warm']['p99'] * 1000, results['find_numpy']['warm']['mean'] * 1000, results['find_numpy']['warm']['mean'] / results['find']['warm']['mean']))
+    if 'workers' in results and results['workers']['runs'][0]['private'] is not None:
+        runs = results['workers']['runs']
+        print('  workers: %d byte payload, attach %.2fms, private per worker %s MB (shared %.1f MB)' % (results['workers']['payload'], max([x['attach'] for x in runs]) * 1000, ', '.join(['%dx %.1f' % (x['workers'], x['private'] / 1048576) for x in runs]), runs[-1]['shared'] / 1048576))
+    if 'workers_numpy' in results and results['workers_numpy']['runs'][0]['private'] is not None:
+        runs = results['workers_numpy']['runs']
+        print('  numpy engine workers: attach %.2fms, private per worker %s MB, matrix on the heap %.1f MB' % (max([x['attach'] for x in runs]) * 1000, ', '.join(['%dx %.1f' % (x['workers'], x['private'] / 1048576) for x in runs]), (runs[-1]['engine_heap'] or 0) / 1048576))
+
+
+def compare(current, previous):
+    # ratio of every 'seconds' figure to the same one of an earlier run, > 1 is slower
+    print('----- Compared to', previous['meta'].get('timestamp'), '----')
+    for run in current['runs']:
+        before = [x for x in previous['runs'] if x['scale'] == run['scale']]
+        if not before:
+            continue
+        for name in run['results']:
+            old = before[0]['results'].get(name, {}).get('seconds')
+            new = run['results'][name].get('seconds')
+            if old and new:
+                print('%4dx %-14s %8.3fs -> %8.3fs  %5.2fx' % (run['scale'], name, old, new, new / old))
+
+
+def main(args):
+    output = {
+        'meta': {
+            'timestamp':    time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'version':      system.VERSION,
+            'python':       platform.python_version(),
+            'platform':     platform.platform(),
+            'cpus':         os.cpu_count(),
+            'processes':    args.processes,
+            'seed':         args.seed,
+            'definition_length': args.definition_length,
+        },
+        'runs': [],
+    }
+    failures = []
+    mismatches = []
+    for scale in args.scales:
+        print('Benchmarking %dx (%d headwords) ...' % (scale, BASE_HEADWORDS * scale))
+        work = tempfile.mkdtemp(prefix='dmtipci-bench-')
+        try:
+            run = {'scale': scale, 'results': bench_scale(work, scale, args), 'peak_memory': pipeline.peak_memory()}
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        report(run)
+        output['runs'].append(run)
+        failures += check_workers(run, args.tolerance)
+        mismatches += ['%dx %s' % (scale, x) for x in run['results'].get('engine', {}).get('mismatches', [])]
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=4)
+    print('Results written to', args.output)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(output, json.load(f))
+    if mismatches:
+        print('! Numpy engine predicates differ from the Python path:', ', '.join(mismatches[:20]))
+        sys.exit(1)
+    if args.check:
+        for x in failures:
+            print('! Worker memory grows with the number of workers:', x)
+        if failures:
+            sys.exit(1)
+        print('Private memory per worker stays within %d%% of a single worker.' % (args.tolerance * 100))
+
+
+if __name__ == '__main__':
+    print("╔╦╗╔╦╗╔╦╗╦╔═╗╔═╗╦")
+    print(" ║║║║║ ║ ║╠═╝║  ║")
+    print("═╩╝╩ ╩ ╩ ╩╩  ╚═╝╩")
+    print("- DMTIPCI Bench -")
+    print("    v" + str(system.VERSION) + "    ")
+    parser = argparse.ArgumentParser(description='DMTIPCI Benchmarks')
+    parser.add_argument('-s', '--scales', type=lambda x: [int(y) for y in x.split(',')], default=[1, 10], help='Comma separated multiples of %d headwords, i.e. 1,10,100' % BASE_HEADWORDS)
+    parser.add_argument('-j', '--processes', type=int, default=1, help='Number of worker processes for parsing, inflection, batches and evaluation')
+    parser.add_argument('-b', '--batch-size', type=int, default=256, help='Number of words looked up together')
+    parser.add_argument('-q', '--queries', type=int, default=500, help='Number of sampled headwords timed with Finder.find')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='Most worker processes attached to the artifact at once when measuring their memory, 0 to skip')
+    parser.add_argument('--check', action='store_true', help='Exit non-zero when private memory per worker grows with the number of workers (needs -w 2 or more) or numpy engine workers copy the matrix')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Growth of private memory per worker --check allows, 0.1 for 10%%')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='JSON results file')
+    parser.add_argument('-c', '--compare', metavar='FILE', help='Earlier results file to compare with')
+    parser.add_argument('--seed', type=int, default=29765, help='Seed of the synthetic dictionary')
+    parser.add_argument('--definition-length', type=int, default=14, help='Mean number of words of a synthetic definition, longer ones favour the numpy engine')
+    args = parser.parse_args()
+    main(args)
@@ -1,7 +1,7 @@
 #!/bin/bash
 
 PYTHON_DEV="/Library/Frameworks/Python.framework/Versions/"
-PYTHON_VER="3.4"
+PYTHON_VER="3.7"
 
 PYTHON_INC=$PYTHON_DEV$PYTHON_VER"/include/python"$PYTHON_VER"m"
 PYTHON_LIB=$PYTHON_DEV$PYTHON_VER"/lib"
@@ -0,0 +1,40 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import json
+import argparse
+from dmtipci.dictionary import Dictionary
+from dmtipci            import system, predicates
+
+
+def main(args):
+    d = Dictionary()
+    d.load(args.text, processes=args.processes, rebuild=True)
+    if args.export_json:
+        d.exportJSON(args.text)
+    if args.predicates:
+        with d.build_stats.stage('predicates') as stage:
+            stage.unit = 'headwords'
+            precomputed = predicates.build(d, predicates.index_filename(args.text), args.processes)
+            stage.items = precomputed['computed']
+        print('! %d headwords, %d looked up, %d unchanged in %.2fs' % (precomputed['headwords'], precomputed['computed'], precomputed['reused'], precomputed['seconds']))
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump({'text': args.text, 'version': system.VERSION, 'stages': d.build_stats.stages, 'memory': d.memory_report()}, f, indent=4)
+
+
+if __name__ == '__main__':
+    print("╔╦╗╔╦╗╔╦╗╦╔═╗╔═╗╦")
+    print(" ║║║║║ ║ ║╠═╝║  ║")
+    print("═╩╝╩ ╩ ╩ ╩╩  ╚═╝╩")
+    print("- DMTIPCI Build -")
+    print("    v" + str(system.VERSION) + "    ")
+    parser = argparse.ArgumentParser(description='DMTIPCI Dictionary Build')
+    parser.add_argument('text', nargs='?', default='dict/pg29765.txt', help='Gutenberg dictionary text')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='Number of worker processes parsing the text and precomputing predicates (default: all CPUs)')
+    parser.add_argument('-p', '--predicates', action='store_true', help='Also precompute the predicates of every headword into an index, only headwords whose definitions changed are looked up again')
+    parser.add_argument('-s', '--stats', metavar='FILE', help='Also write the stage timings as JSON')
+    parser.add_argument('--export-json', action='store_true', help='Also write the dictionary, frequency and inflection maps as JSON')
+    args = parser.parse_args()
+    main(args)
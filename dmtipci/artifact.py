@@ -0,0 +1,225 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+from array          import array
+
+
+# Versioned binary artifact container.
+#
+# ----------------------------------------
+# MAGIC (8 bytes) | format (uint32) | header length (uint32)
+# header: JSON {'meta': {...}, 'sections': {name: [offset, bytes, typecode]}}
+# sections: raw native arrays, 8 byte aligned
+# ----------------------------------------
+#
+# Files are memory-mapped read-only, sections are handed out as memoryviews
+# cast to their typecode, so loading copies nothing. Pickled, a mapped artifact
+# is only its filename (see attach()), worker processes map the same pages of
+# the page cache instead of receiving a copy.
+
+MAGIC           = b'DMTIPCI\x00'
+FORMAT_VERSION  = 1
+ALIGN           = 8
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def hash_file(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(filename):
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_hash(source_hash, params):
+    # identifies source text + build parameters, artifacts with another build hash are stale
+    return hashlib.sha1((source_hash + json.dumps(params, sort_keys=True)).encode('utf-8')).hexdigest()
+
+
+def pack_strings(strings):
+    # string table: utf-8 blob and offsets, string i is blob[offsets[i]:offsets[i + 1]]
+    offsets = array('q', [0])
+    blob    = bytearray()
+    for x in strings:
+        blob += x.encode('utf-8')
+        offsets.append(len(blob))
+    return (offsets, bytes(blob))
+
+
+class StringTable:
+    # read-only sequence of strings over a packed string table, searchable
+    # when written with its ids in string order (a '.sorted' section)
+
+    def __init__(self, offsets, blob, order=None):
+        self.offsets    = offsets
+        self.blob       = blob
+        self.order      = order
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        return str(self.blob[self.offsets[idx]:self.offsets[idx + 1]], 'utf-8')
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def find(self, word):
+        # id of a string by bisection over the sorted ids, -1 when missing
+        (lo, hi) = (0, len(self.order))
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[self.order[mid]] < word:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self[self.order[lo]] == word:
+            return self.order[lo]
+        return -1
+
+
+def write(filename, meta, sections):
+    # `sections` maps names to array.array or bytes, written atomically
+    layout  = {}
+    offset  = 0
+    for name in sections:
+        size = len(sections[name]) * (sections[name].itemsize if isinstance(sections[name], array) else 1)
+        layout[name] = [offset, size, sections[name].typecode if isinstance(sections[name], array) else 'B']
+        offset += size + (-size % ALIGN)
+    header  = json.dumps({'meta': meta, 'byteorder': sys.byteorder, 'sections': layout}, ensure_ascii=False).encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+    with open(filename + '.tmp', 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', FORMAT_VERSION, len(header)) + header)
+        for name in sections:
+            data = sections[name]
+            f.write(data.tobytes() if isinstance(data, array) else data)
+            f.write(b'\x00' * (-layout[name][1] % ALIGN))
+    os.replace(filename + '.tmp', filename)
+
+
+def rewrite_meta(filename, meta):
+    # writes `filename` again with another meta, sections unchanged
+    source      = Artifact(filename)
+    sections    = {}
+    for name in source.sections:
+        (offset, size, typecode) = source.sections[name]
+        data = source.buffer[source.base + offset:source.base + offset + size]
+        sections[name] = array(typecode, data.tobytes()) if typecode != 'B' else data.tobytes()
+    source.close()
+    write(filename, meta, sections)
+
+
+class Artifact:
+    # A memory-mapped artifact (or any buffer holding one, i.e. shared memory).
+
+    def __init__(self, filename=None, buffer=None):
+        self.filename   = filename
+        self.file       = None
+        self.mmap       = None
+        if buffer is None:
+            self.file   = open(filename, 'rb')
+            self.mmap   = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer      = self.mmap
+        self.buffer     = memoryview(buffer)
+        if len(self.buffer) < len(MAGIC) + 8 or self.buffer[:len(MAGIC)] != MAGIC:
+            raise ArtifactError("Not a DMTIPCI artifact: " + str(filename))
+        (fmt, header_len) = struct.unpack('<II', self.buffer[len(MAGIC):len(MAGIC) + 8])
+        if fmt != FORMAT_VERSION:
+            raise ArtifactError("Unsupported artifact format %d: %s" % (fmt, filename))
+        header          = json.loads(str(self.buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_len], 'utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            raise ArtifactError("Artifact byte order differs from this machine: " + str(filename))
+        self.meta       = header['meta']
+        self.sections   = header['sections']
+        self.base       = len(MAGIC) + 8 + header_len
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def array(self, name):
+        (offset, size, typecode) = self.sections[name]
+        return self.buffer[self.base + offset:self.base + offset + size].cast(typecode)
+
+    def strings(self, name):
+        return StringTable(self.array(name + '.offsets'), self.array(name + '.blob'), self.array(name + '.sorted') if name + '.sorted' in self else None)
+
+    def __reduce__(self):
+        if self.file is None:
+            raise ArtifactError("Only artifacts mapped from a file can be sent to other processes: " + str(self.filename))
+        return (attach, (self.filename, self.meta))
+
+    def close(self):
+        # views handed out keep the mapping alive, so only drop our references
+        self.buffer = None
+        self.mmap   = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def attach(filename, meta):
+    # Maps an artifact another process has mapped, i.e. while unpickling, the
+    # file must not have changed in between.
+    source = Artifact(filename)
+    if source.meta != meta:
+        source.close()
+        raise ArtifactError("Artifact changed since it was mapped, reload it: " + filename)
+    return source
+
+
+def open_artifact(filename, expected_hash=None):
+    # Returns an Artifact, or None when it's missing, unreadable or stale.
+    if not os.path.exists(filename):
+        return None
+    try:
+        artifact = Artifact(filename)
+    except (OSError, ValueError, KeyError, struct.error, ArtifactError) as e:
+        print("Ignoring artifact", filename + ":", e)
+        return None
+    if expected_hash is not None and artifact.meta.get('build_hash') != expected_hash:
+        print("Artifact", filename, "is stale, rebuilding ...")
+        artifact.close()
+        return None
+    return artifact
+
+
+def index_filename(filename, kind):
+    # index of a Gutenberg text, next to its dictionary artifact, i.e. dict/pg29765_reverse.dmt
+    return filename.replace('.txt', '') + '_' + kind + '.dmt'
+
+
+def open_index(filename, checks):
+    # Artifact of an index, None when missing, unreadable or its meta differs from `checks`
+    source = open_artifact(filename)
+    if source is not None and [x for x in checks if source.meta.get(x) != checks[x]]:
+        print("Index", filename, "is stale")
+        source.close()
+        source = None
+    return source
+
+
+def load_index(filename, checks, writer, name, rebuild=False):
+    # (Artifact, written) of an index, written by writer(filename, checks) first
+    # when open_index() finds none or `rebuild` is set
+    source = open_index(filename, checks) if not rebuild else None
+    if source is not None:
+        return (source, False)
+    print("Writing", name, "to", filename, "...")
+    writer(filename, checks)
+    return (open_artifact(filename), True)
@@ -0,0 +1,119 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import json
+import time
+import collections
+import concurrent.futures
+
+from .              import find
+
+
+# Streaming batch lookups, used by batch.py.
+#
+# Words are read one per line and written as JSON lines, one per word:
+# ----------------------------------------
+# {"line": 1, "word": "apple", "result": {"word": "APPLE", "def_mode": 0, "senses": [...]}}
+# {"line": 2, "word": "aple", "result": null, "suggestions": ["APPLE", ...]}
+# ----------------------------------------
+# `result` is LookupResult.as_dict() (see result.py), predicates with their
+# weights, null for an unknown word. Suggestions are only looked up on request.
+#
+# Words go to the workers in chunks, level-2 profiles are shared within a chunk.
+# At most `window` chunks are read ahead of the output, so memory stays the same
+# however long the input is. Lines come out in input order, or as soon as their
+# chunk is done when not `ordered` ("line" tells where they belong).
+
+PROGRESS_INTERVAL = 1.0     # seconds
+
+
+def read_chunks(lines, chunk_size):
+    # [(line number, word)] chunks of the non-empty lines
+    chunk   = []
+    for number, line in enumerate(lines, 1):
+        word = line.strip()
+        if len(word) == 0:
+            continue
+        chunk.append((number, word))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def lookup_chunk(finder, chunk, suggestions=False):
+    # (JSON lines, unknown words) of a chunk
+    lines   = []
+    unknown = 0
+    for ((number, word), result) in zip(chunk, finder.lookup_many([x[1] for x in chunk])):
+        entry = {'line': number, 'word': word, 'result': result.as_dict() if result is not None else None}
+        if result is None:
+            unknown += 1
+            if suggestions:
+                entry['suggestions'] = [x[0] for x in finder.suggest(word)]
+        lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+    return (lines, unknown)
+
+
+def _lookup_worker(chunk):
+    # the pool context is `suggestions`, see find.init_worker()
+    return lookup_chunk(find.worker_finder(), chunk, find.worker_context())
+
+
+def run(finder, lines, output, progress, processes=1, chunk_size=256, ordered=True, window=0, suggestions=False):
+    # Look up every word of `lines` (an iterable of text lines), JSON lines go to
+    # `output`, a line of progress per PROGRESS_INTERVAL to `progress`. Returns
+    # a summary dict.
+    window      = window or max(processes, 1) * 4
+    started     = time.time()
+    counts      = {'words': 0, 'unknown': 0, 'chunks': 0}
+    last_progress = [started, 0]
+
+    def write(done):
+        (written, unknown) = done
+        output.writelines(written)
+        output.flush()
+        counts['words']     += len(written)
+        counts['unknown']   += unknown
+        counts['chunks']    += 1
+        now = time.time()
+        if now - last_progress[0] >= PROGRESS_INTERVAL:
+            progress.write('%d words, %.0f words/s, %d unknown\n' % (counts['words'], (counts['words'] - last_progress[1]) / (now - last_progress[0]), counts['unknown']))
+            progress.flush()
+            last_progress[0] = now
+            last_progress[1] = counts['words']
+
+    if processes > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(processes, initializer=find.init_worker, initargs=(finder, suggestions))
+    else:
+        executor = None
+    pending     = collections.deque()
+    try:
+        for chunk in read_chunks(lines, chunk_size):
+            if executor is None:
+                write(lookup_chunk(finder, chunk, suggestions))
+                continue
+            pending.append(executor.submit(_lookup_worker, chunk))
+            while len(pending) >= window:
+                if ordered:
+                    write(pending.popleft().result())
+                    continue
+                (done, x) = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in [y for y in pending if y in done]:
+                    pending.remove(future)
+                    write(future.result())
+        while pending:
+            write(pending.popleft().result())
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+    elapsed     = time.time() - started
+    return {
+        'words':            counts['words'],
+        'unknown':          counts['unknown'],
+        'chunks':           counts['chunks'],
+        'seconds':          elapsed,
+        'words_per_second': counts['words'] / elapsed if elapsed > 0 else 0,
+    }
@@ -0,0 +1,62 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+from collections    import OrderedDict
+from .              import util, result
+
+
+class ResultCache:
+    # Size bounded LRU cache for Finder results. Keys are built by
+    # Finder.cache_key(): (word, def_mode, thresholds, artifact version).
+
+    def __init__(self, capacity=4096):
+        self.capacity   = capacity
+        self.entries    = OrderedDict()
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            'size':         len(self.entries),
+            'capacity':     self.capacity,
+            'hits':         self.hits,
+            'misses':       self.misses,
+            'evictions':    self.evictions
+        }
+
+    def load(self, filename, artifact_version, version):
+        # entries computed from other dictionary artifacts, or of another result format, are useless, drop them all
+        data = util.load_pickle(filename + '.json.pd', 'result cache', version)
+        if len(data) == 0 or data['artifact_version'] != artifact_version or data.get('format') != result.FORMAT:
+            return
+        for (key, value) in data['entries']:
+            self.put(tuple(key), value)
+
+    def save(self, filename, artifact_version, version):
+        print("Writing result cache to", filename, "...")
+        util.save_pickle({'artifact_version': artifact_version, 'format': result.FORMAT, 'entries': list(self.entries.items())}, filename, version)
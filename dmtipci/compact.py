@@ -0,0 +1,101 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+from array          import array
+from collections.abc import Mapping
+
+
+# Compact in-memory tables of a built Dictionary, read through the same
+# Mapping interface as the dicts they replace (and as the store.py views):
+# ----------------------------------------
+# InflectionTable   word_infl, {FORM: {pos: [HEADWORD]}} with a single
+#                   (pos, HEADWORD) tuple for the (most) forms having one
+# FrequencyTable    word_freq, counts in a flat array indexed by token id,
+#                   '---SUM---' and '---CUTOFF---' kept apart
+# ----------------------------------------
+
+
+class InflectionTable(Mapping):
+    # {form: {pos: [word]}}, values are materialized on access only
+    __slots__ = ('entries',)
+
+    def __init__(self, word_infl=()):
+        self.entries    = {}
+        for form in word_infl:
+            value = word_infl[form]
+            if len(value) == 1:
+                pos = next(iter(value))
+                if len(value[pos]) == 1:
+                    self.entries[form] = (pos, value[pos][0])
+                    continue
+            self.entries[form] = {x: tuple(value[x]) for x in value}
+
+    def first(self, form):
+        # the first word of the first POS (see inflection.PRIORITY), what undecorating picks
+        value = self.entries[form]
+        if isinstance(value, tuple):
+            return value[1]
+        return value[next(iter(value))][0]
+
+    def __getitem__(self, form):
+        value = self.entries[form]
+        if isinstance(value, tuple):
+            return {value[0]: [value[1]]}
+        return {x: list(value[x]) for x in value}
+
+    def __contains__(self, form):
+        return form in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FrequencyTable(Mapping):
+    # {word: count} over token ids: counts[token] is the count of token_words[token],
+    # the few counted words without a token go to `extra`. `order` keeps the
+    # counting order, extra words as -1 - their index.
+    __slots__ = ('ids', 'words', 'counts', 'order', 'extra', 'extra_words', 'specials')
+
+    def __init__(self, word_freq, ids, words):
+        self.ids        = ids       # Dictionary.token_ids, shared
+        self.words      = words     # Dictionary.token_words, shared
+        self.counts     = array('i', [0] * len(words))
+        self.order      = array('i')
+        self.extra      = {}
+        self.extra_words = []
+        self.specials   = {}        # '---SUM---', '---CUTOFF---'
+        for word in word_freq:
+            count = word_freq[word]
+            if word.startswith('---'):
+                self.specials[word] = count
+            elif word in ids:
+                self.counts[ids[word]] = count
+                self.order.append(ids[word])
+            else:
+                self.extra[word] = count
+                self.order.append(-1 - len(self.extra_words))
+                self.extra_words.append(word)
+
+    def __getitem__(self, word):
+        token = self.ids.get(word, -1)
+        if 0 <= token < len(self.counts) and self.counts[token] > 0:
+            return self.counts[token]
+        if word in self.extra:
+            return self.extra[word]
+        return self.specials[word]
+
+    def __contains__(self, word):
+        token = self.ids.get(word, -1)
+        return (0 <= token < len(self.counts) and self.counts[token] > 0) or word in self.extra or word in self.specials
+
+    def __iter__(self):
+        for token in self.order:
+            yield self.words[token] if token >= 0 else self.extra_words[-1 - token]
+        yield from self.specials
+
+    def __len__(self):
+        return len(self.order) + len(self.specials)
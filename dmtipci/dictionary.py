@@ -3,12 +3,15 @@
 #cython: language_level=3, boundscheck=False
 
 import os
+import sys
 import json
 import pickle
+from array          import array
 
-from .third_party   import inflect
 from .debug         import _assert, __LINE__, __FILE__
-from .              import util, system
+from .              import util, system, gutenberg, inflection, pipeline, artifact, store, compact, reverse, suggest, vector
+from .record        import POS_NAMES, Sense, WordRecord
+
 
 class Dictionary:
 
@@ -17,6 +20,30 @@ class Dictionary:
         self.word_freq  = {}
         self.word_infl  = {}
         self.version    = system.VERSION
+        # sha1 of the Gutenberg text, intermediate pickles and artifacts of another text are stale
+        self.source_hash = None
+        # identifies the dictionary artifacts lookups were computed from, i.e. for result caches
+        self.artifact_version = str(self.version)
+        # integer token store, see updateTokenIndex()
+        self.token_ids  = {}
+        self.token_words = []
+        self.def_tokens = {}
+        # word records, see finalize()
+        self.records    = {}
+        self.token_records = []
+        self.finalized  = False
+        # mapped artifact the maps above are read from, see loadArtifact()
+        self.store      = None
+        # pipeline.BuildStats of the last build()
+        self.build_stats = None
+        # inverted index of the definitions, see getMentions()
+        self.reverse_file = None
+        self.reverse    = None
+        # headword completions and spelling suggestions, see getSuggestions()
+        self.suggest_file = None
+        self.suggest    = None
+        # CSR matrix of vector.MatrixEngine, mapped by the engine
+        self.matrix_file = None
 
     @staticmethod
     def isFloat(word):
@@ -46,17 +73,34 @@ class Dictionary:
             return ['PP']
         return []
 
+    @staticmethod
+    def getPOSMask(pos):
+        mask = 0
+        for x in pos:
+            mask |= 1 << POS_NAMES.index(x)
+        return mask
+
+    @staticmethod
+    def getPOSNames(mask):
+        return [x for idx, x in enumerate(POS_NAMES) if mask & (1 << idx)]
+
+    @staticmethod
+    def bareWord(word):
+        return word.strip('.,!?;:\'" \t\n#()&@+=-*/$[]{}|£§').upper()
+
     def undecorateWord(self, word):
         # remove unnecessary marks from a word, for statistics
-        bare_word = word.strip('.,!?;:\'" \t\n#()&@+=-*/$[]{}|£§').upper()
+        bare_word = self.bareWord(word)
+        if self.finalized:
+            record = self.records.get(bare_word)
+            return record.canonical.word if record else bare_word
         if not bare_word in self.word_freq and bare_word in self.word_infl:
-            # flawed, just pick the first POS tag
-            pos = next(iter(self.word_infl[bare_word]))
-            # flawed, pick the first inflected word
-            bare_word = self.word_infl[bare_word][pos][0]
+            # flawed, just pick the POS tag of the highest priority (see inflection.PRIORITY)
+            # flawed, pick the first inflected word in dictionary order
+            bare_word = self.word_infl.first(bare_word)
         return bare_word
 
-    def updateFromGutenbergText(self, filename):
+    def updateFromGutenbergText(self, filename, processes=None):
         # dictionary is in the following format:
         # ----------------------------------------
         # WORD
@@ -67,66 +111,16 @@ class Dictionary:
         self.dictionary = {}
         filename_json   = filename.replace('.txt', '.json')
         filename_pd     = filename_json + '.pd'
-        self.dictionary = util.load_pickle(filename_pd, 'dictionary', self.version)
+        if os.path.exists(filename):
+            self.source_hash = artifact.hash_file(filename)
+            self.artifact_version = '%d-%s' % (self.version, self.source_hash[:16])
+        self.dictionary = util.load_pickle(filename_pd, 'dictionary', self.version, self.source_hash)
 
         if len(self.dictionary) == 0:
             print("Updating dictionary from Gutenberg text:", filename, "...")
-            current_word        = ''
-            current_variation   = ''
-            current_def         = []
-            variation_solid     = False
-            for idx, line in enumerate(open(filename, 'r', encoding='utf-8', errors='ignore').readlines()):
-                # cleanup a line
-                line = line.strip()
-                if line.startswith('*** '):
-                    # Gutenberg marker
-                    continue
-                if len(line) == 0:
-                    # empty line
-                    if current_word and current_variation and not variation_solid:
-                        # variation can come across multiple lines
-                        variation_solid = True
-                    elif current_word and current_variation and variation_solid and current_def:
-                        # append an entry to definition
-                        current_def[len(current_def) - 1] = current_def[len(current_def) - 1].strip()
-                        # 'Note:' section in definitions are being ignored because they usually contain usage information and explanation of related terms. Since they are not like 'definitions', they won't be able to contribute to predicate selection.
-                        if current_def[len(current_def) - 1].startswith('Note: '):
-                            del current_def[len(current_def) - 1]
-                        # A situation where the previous definition is just a class (i.e. 3. (bot.) or 5. (law)) and the real definition came in 'current_def', merge with previous
-                        elif len(current_def) >= 2 and len(current_def[len(current_def) - 2]) > 0 and current_def[len(current_def) - 2][0].isdigit() and current_def[len(current_def) - 2][-1:] == ')':
-                            current_def[len(current_def) - 2] += ' ' + current_def[len(current_def) - 1]
-                            del current_def[len(current_def) - 1]
-                        current_def.append('')
-                    continue
-                if line.isupper():
-                    # upper case indicates a new word
-                    if current_word and current_variation and current_def and variation_solid:
-                        # collect the current word
-                        if not current_word in self.dictionary:
-                            self.dictionary[current_word] = {}
-                        if not current_variation in self.dictionary[current_word]:
-                            self.dictionary[current_word][current_variation] = [x for x in current_def if len(x) > 0]
-                    # start a new word
-                    current_word        = line
-                    current_variation   = ''
-                    current_def         = []
-                    variation_solid     = False
-                    continue
-                if current_word and not current_variation:
-                    # new variation segment
-                    current_variation   = line
-                    continue
-                if current_word and current_variation and not variation_solid:
-                    # variation continued
-                    current_variation   += ' ' + line
-                    continue
-                if current_word and current_variation and variation_solid:
-                    # definitions
-                    if len(current_def) == 0:
-                        current_def.append('')
-                    current_def[len(current_def) - 1] += ' ' + line.replace('Defn: ', '')
-                    continue
-            util.save_pickle(self.dictionary, filename.replace('.txt', ''), self.version)
+            # streamed in chunks, parsed in worker processes, see gutenberg.py
+            self.dictionary = gutenberg.parse(filename, processes)
+            util.save_pickle(self.dictionary, filename.replace('.txt', ''), self.version, self.source_hash)
 
     def updateWordFrequency(self, filename):
         _assert(len(self.dictionary) > 0, __FILE__(), __LINE__(), "Word frequency update requires dictionary to be loaded beforehand.")
@@ -134,54 +128,77 @@ class Dictionary:
         self.word_freq  = {}
         filename_json   = filename + '.json'
         filename_pd     = filename_json + '.pd'
-        self.word_freq  = util.load_pickle(filename_pd, 'word frequencies', self.version)
+        self.word_freq  = util.load_pickle(filename_pd, 'word frequencies', self.version, self.source_hash)
 
         if len(self.word_freq) == 0:
             print("Writing word frequency to", filename, "...")
-            self.word_freq = {}
-            sum_all_words = 0
-            for word in self.dictionary:
-                for variation in self.dictionary[word]:
-                    for definition in self.dictionary[word][variation]:
-                        for def_word in definition.split(' '):
-                            bare_word = self.undecorateWord(def_word)
-                            if not bare_word in self.dictionary and bare_word in self.word_infl:
-                                # flawed, just pick the first POS tag
-                                pos = list(self.word_infl[bare_word].keys())[0]
-                                # flawed, pick the first inflected word
-                                bare_word = self.word_infl[bare_word][pos][0]
-                            # don't count empties, numbers
-                            if len(bare_word) == 0 or bare_word.isdecimal() or bare_word.isdigit() or self.isFloat(bare_word):
-                                continue
-                            sum_all_words += 1
-                            if not bare_word in self.word_freq:
-                                self.word_freq[bare_word] = 1
-                            else:
-                                self.word_freq[bare_word] += 1
-            print('----- Top 100 Words ----')
-            top_words = []
-            for idx, w in enumerate(sorted(self.word_freq, key=self.word_freq.get, reverse=True)):
-                if idx >= 100:
-                    break
-                top_words.append(w)
-            self.word_freq['---SUM---'] = sum_all_words
-            # cut off logic: any word above this count is never likely to be a target match, so there will be no need to look them up
-            # the current 'cut off' word is 'ZOÖL', review the top 100 word list for the words being cut off
-            try:
-                # deal with Windows quirks
-                print(top_words)
-                print('Cut off set to ZOÖL', self.word_freq['ZOÖL'])
-            except:
-                pass
-            self.word_freq['---CUTOFF---'] = self.word_freq['ZOÖL']
-            util.save_pickle(self.word_freq, filename.replace('.txt', ''), self.version)
-
-    def updateWordInflection(self, filename):
+            self.countWordFrequency()
+            util.save_pickle(self.word_freq, filename.replace('.txt', ''), self.version, self.source_hash)
+
+    def countWordFrequency(self):
+        # Count definition words into word_freq, returns how many were read.
+        #
+        # Words are undecorated against the counts so far, like undecorateWord()
+        # does, so they're counted strictly in dictionary order. Undecorated
+        # forms, inflection targets and number checks are memoized per distinct
+        # string though, they don't depend on the counts.
+        self.word_freq  = {}
+        word_freq       = self.word_freq
+        bare_words      = {}
+        # flawed, just pick the POS tag of the highest priority (see inflection.PRIORITY)
+        # flawed, pick the first inflected word in dictionary order
+        inflected       = {x: self.word_infl.first(x) for x in self.word_infl}
+        skipped         = {}
+        sum_all_words   = 0
+        read_words      = 0
+        for word in self.dictionary:
+            for variation in self.dictionary[word]:
+                for definition in self.dictionary[word][variation]:
+                    for def_word in definition.split(' '):
+                        read_words += 1
+                        bare_word = bare_words.get(def_word)
+                        if bare_word is None:
+                            bare_word = bare_words[def_word] = sys.intern(self.bareWord(def_word))
+                        # undecorateWord()
+                        if not bare_word in word_freq and bare_word in inflected:
+                            bare_word = inflected[bare_word]
+                        if not bare_word in self.dictionary and bare_word in inflected:
+                            bare_word = inflected[bare_word]
+                        # don't count empties, numbers
+                        skip = skipped.get(bare_word)
+                        if skip is None:
+                            skip = skipped[bare_word] = len(bare_word) == 0 or bare_word.isdecimal() or bare_word.isdigit() or self.isFloat(bare_word)
+                        if skip:
+                            continue
+                        sum_all_words += 1
+                        if not bare_word in word_freq:
+                            word_freq[bare_word] = 1
+                        else:
+                            word_freq[bare_word] += 1
+        print('----- Top 100 Words ----')
+        top_words = []
+        for idx, w in enumerate(sorted(word_freq, key=word_freq.get, reverse=True)):
+            if idx >= 100:
+                break
+            top_words.append(w)
+        word_freq['---SUM---'] = sum_all_words
+        # cut off logic: any word above this count is never likely to be a target match, so there will be no need to look them up
+        # the current 'cut off' word is 'ZOÖL', review the top 100 word list for the words being cut off
+        try:
+            # deal with Windows quirks
+            print(top_words)
+            print('Cut off set to ZOÖL', word_freq['ZOÖL'])
+        except:
+            pass
+        word_freq['---CUTOFF---'] = word_freq['ZOÖL']
+        return read_words
+
+    def updateWordInflection(self, filename, processes=None):
         _assert(len(self.dictionary) > 0, __FILE__(), __LINE__(), "Word inflection update requires dictionary to be loaded.")
         self.word_infl  = {}
         filename_json   = filename + '.json'
         filename_pd     = filename_json + '.pd'
-        self.word_infl  = util.load_pickle(filename_pd, 'word inflection map', self.version)
+        self.word_infl  = compact.InflectionTable(util.load_pickle(filename_pd, 'word inflection map', self.version, self.source_hash))
 
         if len(self.word_infl) == 0:
             # Note: This inflection map has a flaw when not used with POS tagger.
@@ -193,45 +210,328 @@ class Dictionary:
             # 
             # This flaw is currently ignored due to minority nature of such words.
             #
-            # Note: Verb forms are not yet fully implemented
+            # Plurals, present participles, past tense and past participles, in
+            # inflection.PRIORITY order, see inflection.py
             #
             print("Writing word inflection map to", filename, "...")
-            self.word_infl = {}
-            p = inflect.engine()
-            for word in self.dictionary:
-                for variation in self.dictionary[word]:
-                    pos = self.getVariationPOS(variation)
-                    if 'N' in pos:
-                        # add plural for nouns
-                        plural = p.plural(word.lower()).upper()
-                        if not plural in self.word_infl:
-                            self.word_infl[plural] = {}
-                        if not 'N' in self.word_infl[plural]:
-                            self.word_infl[plural]['N'] = []
-                        self.word_infl[plural]['N'].append(word)
-                    elif 'VT' in pos or 'VI' in pos:
-                        # handling present participles
-                        # warning: past tense / participles are not yet handled
-                        pp = p.present_participle(word.lower()).upper()
-                        if not pp in self.word_infl:
-                            self.word_infl[pp] = {}
-                        if not 'VT' in self.word_infl[pp]:
-                            self.word_infl[pp]['VT'] = []
-                        self.word_infl[pp]['VT'].append(word)
-            util.save_pickle(self.word_infl, filename.replace('.txt', ''), self.version)
+            self.word_infl = inflection.build(self.dictionary, self.getVariationPOS, processes)
+            util.save_pickle(dict(self.word_infl), filename.replace('.txt', ''), self.version, self.source_hash)
 
     def getWord(self, bare_word):
-        _assert(len(self.dictionary) > 0, __FILE__(), __LINE__(), "Dictionary is still empty.")
-        if bare_word in self.dictionary:
-            return self.dictionary[bare_word]
-        return None
+        # readiness is checked once by finalize()
+        return self.dictionary.get(bare_word)
 
     def getWordFrequency(self, bare_word):
-        _assert(len(self.word_freq) > 0, __FILE__(), __LINE__(), "Dictionary word frequency is still empty.")
-        _assert(len(self.word_infl) > 0, __FILE__(), __LINE__(), "Dictionary word inflection map is still empty.")
+        # readiness is checked once by finalize()
         if bare_word in self.word_freq:
             # boundary cutoff, if it's more frequent than 'WHICH' (incl.) or less frequent than 1 (incl.)
             if (self.word_freq[bare_word] >= self.word_freq["---CUTOFF---"]) or self.word_freq[bare_word] <= 1:
                 return 0
             return self.word_freq[bare_word]
         return 0
+
+    def internToken(self, bare_word):
+        if bare_word in self.token_ids:
+            return self.token_ids[bare_word]
+        token = len(self.token_words)
+        # the same string object as the headword, record and frequency keys
+        bare_word = sys.intern(bare_word)
+        self.token_ids[bare_word] = token
+        self.token_words.append(bare_word)
+        if self.finalized:
+            record = self.records.get(bare_word) or self._makeRecord(bare_word, self.word_freq['---CUTOFF---'])
+            record.token = token
+            self.token_records.append(record)
+        return token
+
+    def tokenizeDefinition(self, definition, memo=None):
+        # Break a definition down into canonical word ids once, so lookups never
+        # have to split and undecorate definition strings again.
+        #
+        # Returns (tokens, cut): 'tokens' holds every word of the definition,
+        # taxonomies like (Bot.) and empties excluded, which is what level-2
+        # matching reads. 'cut' is the position of the first '{' or 'OBS', the
+        # point where a level-1 definition sequence stops.
+        tokens  = array('i')
+        cut     = -1
+        for word in definition.split(' '):
+            # is this a taxonomy? like (Bot.) or (Hort.)
+            if word.startswith('(') and word.endswith('.)'):
+                continue
+            if word == '{':
+                if cut < 0:
+                    cut = len(tokens)
+                continue
+            if memo is not None and word in memo:
+                token = memo[word]
+            else:
+                bare_word = self.undecorateWord(word)
+                token = self.internToken(bare_word) if len(bare_word) > 0 else -1
+                if memo is not None:
+                    memo[word] = token
+            if token < 0:
+                continue
+            if cut < 0 and self.token_words[token] == 'OBS':    # obsolete usage comes after
+                cut = len(tokens)
+            tokens.append(token)
+        if cut < 0:
+            cut = len(tokens)
+        return (tokens, cut)
+
+    def updateTokenIndex(self, filename):
+        _assert(len(self.word_freq) > 0, __FILE__(), __LINE__(), "Token index update requires word frequency update beforehand.")
+        self.token_ids  = {}
+        self.token_words = []
+        self.def_tokens = {}
+        filename_json   = filename + '.json'
+        filename_pd     = filename_json + '.pd'
+        index           = util.load_pickle(filename_pd, 'token index', self.version, self.source_hash)
+
+        if len(index) == 0:
+            print("Writing token index to", filename, "...")
+            self.buildTokenIndex()
+            index = {'words': self.token_words, 'definitions': self.def_tokens}
+            util.save_pickle(index, filename.replace('.txt', ''), self.version, self.source_hash)
+        else:
+            self.token_words = index['words']
+            self.token_ids  = {x: idx for idx, x in enumerate(self.token_words)}
+            self.def_tokens = index['definitions']
+
+    def buildTokenIndex(self):
+        # tokenize every definition, returns the number of tokens
+        self.token_ids  = {}
+        self.token_words = []
+        self.def_tokens = {}
+        # headwords first, every looked up word has an id even if no definition mentions it
+        for word in self.dictionary:
+            self.internToken(word)
+        memo = {}
+        count = 0
+        for word in self.dictionary:
+            self.def_tokens[word] = {}
+            for variation in self.dictionary[word]:
+                self.def_tokens[word][variation] = [self.tokenizeDefinition(x, memo) for x in self.dictionary[word][variation]]
+                count += sum([len(x[0]) for x in self.def_tokens[word][variation]])
+        return count
+
+    def getRecord(self, word):
+        # look up a word as typed: one dict probe, inflections already resolved
+        record = self.records.get(self.bareWord(word))
+        return record.canonical if record else None
+
+    def getSenses(self, word, pos_mask):
+        # variations of a word having any of the POS bits, i.e. getSenses('FRUIT', POS_N)
+        record = self.getRecord(word)
+        if not record:
+            return []
+        if record.pos_mask & pos_mask == 0:
+            return []
+        # grouped by POS bits, in order of appearance
+        senses = []
+        for mask in dict.fromkeys([x.pos_mask for x in record.senses]):
+            if mask & pos_mask:
+                senses += [x for x in record.senses if x.pos_mask == mask]
+        return senses
+
+    def getMentions(self, word, pos_mask=0, level1=False):
+        # [(headword, variation, definition index)] of the definitions mentioning a word,
+        # in variations with any of the POS bits (0 for all), only before the level-1 cut with `level1`
+        if self.reverse is None:
+            self.reverse = reverse.load(self, self.reverse_file)
+        record = self.getRecord(word)
+        if not record or record.token < 0:
+            return []
+        mentions = []
+        for (head, sense, definition, before_cut, mask) in self.reverse.get(record.token):
+            if (pos_mask == 0 or mask & pos_mask) and (before_cut or not level1):
+                mentions.append((self.token_words[head], sense, definition))
+        return mentions
+
+    def getSuggestions(self, word, limit=5):
+        # [(headword, edit distance)] spelled like `word`, closest and most frequent first
+        if self.suggest is None:
+            self.suggest = suggest.load(self, self.suggest_file)
+        return self.suggest.suggest(self.bareWord(word), limit)
+
+    def getCompletions(self, prefix, limit=50):
+        # headwords starting with `prefix`, in string order
+        if self.suggest is None:
+            self.suggest = suggest.load(self, self.suggest_file)
+        return self.suggest.complete(prefix.upper(), limit)
+
+    def getDefinitions(self, word, pos_mask):
+        definitions = []
+        for sense in self.getSenses(word, pos_mask):
+            definitions += sense.entries
+        return definitions
+
+    def finalize(self):
+        # Run the readiness checks once, then precompute a WordRecord for every
+        # known word (headwords, definition words, frequency and inflection
+        # entries), so lookups no longer go through getWord, getWordFrequency and
+        # undecorateWord chains.
+        _assert(len(self.dictionary) > 0, __FILE__(), __LINE__(), "Dictionary is still empty.")
+        _assert(len(self.word_freq) > 0, __FILE__(), __LINE__(), "Dictionary word frequency is still empty.")
+        _assert(len(self.word_infl) > 0, __FILE__(), __LINE__(), "Dictionary word inflection map is still empty.")
+        _assert(len(self.token_words) > 0, __FILE__(), __LINE__(), "Dictionary token index is still empty.")
+        self.finalized  = False
+        self.records    = {}
+        self.token_records = []
+        # counts by token id from here on, see compact.py
+        self.word_freq  = compact.FrequencyTable(self.word_freq, self.token_ids, self.token_words)
+        cutoff          = self.word_freq['---CUTOFF---']
+        for word in self.token_words:
+            self.token_records.append(self._makeRecord(word, cutoff))
+        for keys in (self.dictionary, self.word_freq, self.word_infl):
+            for word in keys:
+                if not word in self.records and not word.startswith('---'):
+                    self._makeRecord(word, cutoff)
+        for word in list(self.records):
+            record = self.records[word]
+            canonical = self.undecorateWord(word)
+            if canonical != word:
+                if not canonical in self.records:
+                    self._makeRecord(canonical, cutoff)
+                record.canonical = self.records[canonical]
+        self.finalized  = True
+
+    def _makeRecord(self, word, cutoff):
+        record = WordRecord(word, self.token_ids.get(word, -1))
+        record.setCount(self.word_freq.get(word, 0), cutoff)
+        variations  = self.dictionary.get(word)
+        if variations:
+            definitions = self.def_tokens[word]
+            record.senses = tuple([Sense(x, self.getPOSMask(self.getVariationPOS(x)), variations[x], definitions[x]) for x in sorted(variations)])
+            for sense in record.senses:
+                record.pos_mask |= sense.pos_mask
+        self.records[word] = record
+        return record
+
+    def load(self, filename, processes=None, prefetch=False, rebuild=False):
+        # Load the dictionary of a Gutenberg text from its mapped artifact, or
+        # build() everything and write the artifact when it's missing, stale or
+        # `rebuild` is set. Only the artifact index is
+        # read here, shards are mapped when needed or, with `prefetch`, by a
+        # background thread.
+        base            = filename.replace('.txt', '')
+        artifact_file   = base + '.dmt'
+        self.reverse_file = reverse.index_filename(filename)
+        self.suggest_file = suggest.index_filename(filename)
+        self.matrix_file = vector.index_filename(filename)
+        params          = {'version': self.version, 'format': artifact.FORMAT_VERSION, 'shard_words': store.SHARD_WORDS}
+        source          = artifact.open_artifact(artifact_file) if not rebuild else None
+        if source is not None and os.path.exists(filename):
+            # unchanged size and mtime skip hashing the text
+            if source.meta.get('source_stamp') != artifact.file_stamp(filename) or source.meta.get('params') != params:
+                if source.meta.get('build_hash') != artifact.build_hash(artifact.hash_file(filename), params):
+                    print("Artifact", artifact_file, "is stale, rebuilding ...")
+                    source.close()
+                    source = None
+                else:
+                    # same text, only copied or touched: stamp it, later loads skip hashing again
+                    meta = dict(source.meta, source_stamp=artifact.file_stamp(filename), params=params)
+                    source.close()
+                    artifact.rewrite_meta(artifact_file, meta)
+                    source = artifact.open_artifact(artifact_file)
+        if source is not None:
+            print("Loading dictionary artifact from", artifact_file, "...")
+            self.loadArtifact(source)
+            if prefetch:
+                self.store.prefetch()
+            return
+        stats = self.build(filename, processes)
+        with stats.stage('artifact') as stage:
+            stage.unit = 'words'
+            self.saveArtifact(artifact_file, filename, params)
+            stage.items = len(self.records)
+        with stats.stage('reverse') as stage:
+            stage.unit = 'headwords'
+            self.reverse = reverse.load(self, self.reverse_file, rebuild)
+            stage.items = len(self.dictionary) if self.reverse.written else 0
+        with stats.stage('suggest') as stage:
+            stage.unit = 'headwords'
+            self.suggest = suggest.load(self, self.suggest_file, rebuild)
+            stage.items = len(self.dictionary) if self.suggest.written else 0
+        stats.report()
+
+    def build(self, filename, processes=None):
+        # Everything from a single pass over the text, see pipeline.py, returns
+        # the stage stats. Nothing is read from or written to the pickles.
+        print("Building dictionary from Gutenberg text:", filename, "...")
+        self.source_hash = artifact.hash_file(filename)
+        self.artifact_version = '%d-%s' % (self.version, self.source_hash[:16])
+        self.build_stats = pipeline.build(self, filename, processes)
+        return self.build_stats
+
+    def saveArtifact(self, filename, source_filename, params):
+        _assert(self.finalized, __FILE__(), __LINE__(), "Dictionary artifact requires finalize() beforehand.")
+        print("Writing dictionary artifact to", filename, "...")
+        meta = {
+            'source_hash':      self.source_hash,
+            'source_stamp':     artifact.file_stamp(source_filename),
+            'params':           params,
+            'build_hash':       artifact.build_hash(self.source_hash, params),
+            'artifact_version': self.artifact_version,
+        }
+        store.write(self, filename, meta)
+
+    def loadArtifact(self, source):
+        # `source` is an artifact.Artifact, the maps become views over it and
+        # word records are built on first use, so nothing is unpickled
+        self.store          = store.DictionaryStore(source)
+        self.source_hash    = source.meta['source_hash']
+        self.artifact_version = source.meta['artifact_version']
+        self.dictionary     = store.DefinitionView(self.store)
+        self.word_freq      = store.FrequencyView(self.store)
+        self.word_infl      = store.InflectionView(self.store)
+        self.token_ids      = store.TokenIds(self.store)
+        self.token_words    = store.TokenWords(self.store)
+        self.def_tokens     = store.DefinitionTokenView(self.store)
+        self.records        = store.RecordTable(self, self.store)
+        self.token_records  = store.TokenRecords(self, self.store)
+        self.finalized      = True
+
+    def __getstate__(self):
+        # A dictionary loaded from its artifact is pickled as the mapped files
+        # (see artifact.attach()), worker processes attach to them in constant
+        # time and read the same pages. A built one is pickled as is.
+        if self.store is None:
+            return self.__dict__
+        return {
+            'artifact':     self.store.artifact,
+            'reverse_file': self.reverse_file,
+            'reverse':      self.reverse,
+            'suggest_file': self.suggest_file,
+            'suggest':      self.suggest,
+            'matrix_file':  self.matrix_file,
+        }
+
+    def __setstate__(self, state):
+        if not 'artifact' in state:
+            self.__dict__.update(state)
+            return
+        self.__init__()
+        self.loadArtifact(state['artifact'])
+        for name in ('reverse_file', 'reverse', 'suggest_file', 'suggest', 'matrix_file'):
+            setattr(self, name, state[name])
+
+    def memory_report(self):
+        # {structure: bytes} of the Python objects each map holds, objects shared
+        # between maps count for the first one. 'mapped' is the size of the
+        # artifact mapped so far, page cache shared with every process mapping it,
+        # so it's not part of 'total'.
+        seen    = set()
+        report  = {}
+        for name in ('token_ids', 'token_words', 'dictionary', 'def_tokens', 'word_freq', 'word_infl', 'records', 'token_records'):
+            report[name] = util.sizeof(getattr(self, name), seen)
+        report['total'] = sum(report.values())
+        report['mapped'] = self.store.mappedBytes() if self.store is not None else 0
+        return report
+
+    def exportJSON(self, filename):
+        # opt-in readable dump of the maps, nothing reads these back
+        base = filename.replace('.txt', '')
+        print("Exporting JSON to", base + '*.json', "...")
+        util.save_json(dict(self.dictionary), base)
+        util.save_json(dict(self.word_freq), base + '_word_freq')
+        util.save_json(dict(self.word_infl), base + '_word_infl')
@@ -0,0 +1,291 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import json
+import math
+import time
+import multiprocessing
+
+from .predicates    import Fingerprints
+from .              import system, find
+
+
+# Resumable WordNet evaluation runner, used by eval.py.
+#
+# Words are evaluated in chunks (by worker processes) and every result goes to
+# an append-only JSON lines log as soon as its chunk is done:
+# ----------------------------------------
+# {"run": {...}}                                  first line, what the results depend on
+# {"word": "APPLE", "predicates": {"N": [...]}, "counted": true, "precision": 0.5, "coverage": 0.25, "latency": 0.0012,
+#  "headword": "APPLE", "reads": ["APPLE", "FLESHY", ...], "fingerprint": -4425372036854775807}
+# ----------------------------------------
+# Restarting with the same log skips the words already in it, final figures
+# are computed over all logged words in WordNet order.
+#
+# `headword` is the word looked up after inflection, `reads` the headwords the
+# lookup read: that one, and every word of its level-1 definitions for their
+# level-2 definitions. `fingerprint` hashes all of those definitions (see
+# predicates.Fingerprints). When the dictionary changed since a log was written,
+# it's kept as LOG.previous and only words whose headword or fingerprint differ
+# now are looked up again, the others keep their predicates and are scored
+# again. report() tells which results changed against LOG.previous.
+
+
+VERB_POS = ('VT', 'VI')
+
+
+def predicates_of(src, pos):
+    # predicates of `src` (Finder.find() result) for WordNet POS 'N' or 'V', None when it has none:
+    # nouns are the 'N' list, verbs the lists of variations that are verbs only ('VT', 'VI', 'VI,VT')
+    if not src:
+        return None
+    if pos == 'N':
+        return src.get('N') or None
+    retval = []
+    for key in src:
+        if all([x in VERB_POS for x in key.split(',')]):
+            retval += [x for x in src[key] if not x in retval]
+    return retval or None
+
+
+def score(src, dst):
+    # (precision, coverage) of predicates `src` (Finder.find() result) against WordNet hypernyms `dst`
+    # ({POS: [hypernym]}), every POS against the predicates of that POS, None when the word does not count
+    src_total   = 0
+    dst_total   = 0
+    precise     = 0
+    covered     = 0
+    for pos in dst:
+        src_ = predicates_of(src, pos)
+        if not src_:
+            continue
+        dst_ = []
+        for e in dst[pos]:
+            dst_ += e.split('_')
+        for e in src_:
+            for e_ in dst_:
+                if e in e_:
+                    precise += 1
+        for e_ in dst_:
+            for e in src_:
+                if e in e_:
+                    covered += 1
+        src_total   += len(src_)
+        dst_total   += len(dst_)
+    if src_total == 0:
+        return None
+    return (precise / src_total, covered / dst_total)
+
+
+def percentile(values, p):
+    # nearest-rank percentile of sorted `values`
+    if len(values) == 0:
+        return 0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def run_info(finder, db):
+    # results in a log are only reused for the same dictionary, WordNet and thresholds
+    return {
+        'version':          system.VERSION,
+        'artifact_version': finder.dictionary.artifact_version,
+        'wordnet':          getattr(db, 'build_hash', None),
+        'thresholds':       [system.MINIMUM_OUTPUT_PREDICATE_WEIGHT, system.MINIMUM_UNIGRAM_WORD_SHARES, system.MINIMUM_DEFINITION_PREDICT_WEIGHT, system.MINIMUM_UNIGRAM_MATCH_PER_DEFINITION],
+    }
+
+
+def read_log(filename, run):
+    # {word: result} of a log written for `run` (any run when None), a torn last
+    # line (interrupted write) is cut off
+    results = {}
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end < len(data):
+        with open(filename, 'r+b') as f:
+            f.truncate(end)
+    lines = data[:end].decode('utf-8').splitlines()
+    if len(lines) == 0 or not 'run' in json.loads(lines[0]) or (run is not None and json.loads(lines[0])['run'] != run):
+        return None
+    for line in lines[1:]:
+        result = json.loads(line)
+        results[result['word']] = result
+    return results
+
+
+def dependencies(hashes, word):
+    # (headword, [headword read], fingerprint) of a word's lookup, Nones for an unknown word
+    record  = hashes.dictionary.getRecord(word)
+    if not record or not record.senses:
+        return (None, None, None)
+    reads   = [record.word] + [hashes.words[x] for x in hashes.reads(record) if hashes.words[x] != record.word]
+    return (record.word, reads, hashes.get(record))
+
+
+def evaluate_words(finder, db, words, hashes=None):
+    # per-word results of a chunk, level-2 profiles shared across the chunk
+    if hashes is None:
+        hashes  = Fingerprints(finder.dictionary)
+    profiles    = {}
+    results     = []
+    for word in words:
+        started = time.time()
+        src     = finder.find_many([word], profiles=profiles)[0]
+        latency = time.time() - started
+        scores  = score(src, db[word])
+        (headword, reads, fingerprint) = dependencies(hashes, word)
+        results.append({
+            'word':         word,
+            'predicates':   src,
+            'counted':      scores is not None,
+            'precision':    scores[0] if scores else None,
+            'coverage':     scores[1] if scores else None,
+            'latency':      latency,
+            'headword':     headword,
+            'reads':        reads,
+            'fingerprint':  fingerprint,
+        })
+    return results
+
+
+def rescore(result, hypernyms):
+    # a logged result whose lookup is still valid, scored against `hypernyms` again
+    scores  = score(result['predicates'], hypernyms)
+    return dict(result, counted=scores is not None, precision=scores[0] if scores else None, coverage=scores[1] if scores else None)
+
+
+def reusable(finder, db, previous):
+    # {word: result} of `previous` results (another run's log) the current
+    # dictionary would give again: same headword and fingerprint
+    hashes  = Fingerprints(finder.dictionary)
+    results = {}
+    for word in db:
+        result = previous.get(word)
+        if result is None or not 'fingerprint' in result:
+            continue
+        (headword, reads, fingerprint) = dependencies(hashes, word)
+        if headword == result['headword'] and fingerprint == result['fingerprint']:
+            results[word] = rescore(result, db[word])
+    return results
+
+
+def _evaluate_worker(words):
+    # the pool context holds the WordNet of run() and, across chunks, the worker's Fingerprints
+    context = find.worker_context()
+    if not 'hashes' in context:
+        context['hashes'] = Fingerprints(find.worker_finder().dictionary)
+    return evaluate_words(find.worker_finder(), context['db'], words, context['hashes'])
+
+
+def run(finder, db, log_file, processes=1, chunk_size=256, fresh=False):
+    # Evaluate every word of `db` ({word: {POS: [hypernym]}}) not yet in `log_file`,
+    # returns a summary dict. A log of another run becomes the previous log,
+    # its results still valid are kept (see reusable()) and summary['report']
+    # compares against it.
+    info        = run_info(finder, db)
+    results     = None if fresh else read_log(log_file, info)
+    if results is None:
+        previous = None if fresh else read_log(log_file, None)
+        results = {}
+        if previous is not None:
+            os.replace(log_file, log_file + '.previous')
+            results = reusable(finder, db, previous)
+            print('Dictionary or WordNet changed since', log_file, 'was written,', len(results), 'of', len(db), 'words are still valid')
+        with open(log_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'run': info}) + '\n')
+            for word in results:
+                f.write(json.dumps(results[word], ensure_ascii=False) + '\n')
+    elif len(results) > 0:
+        print('Resuming evaluation,', len(results), 'words already in', log_file)
+    words       = [x for x in db if not x in results]
+    chunks      = [words[x:x + chunk_size] for x in range(0, len(words), chunk_size)]
+    latencies   = []
+    started     = time.time()
+    last_checkpoint = started
+    with open(log_file, 'a', encoding='utf-8') as log:
+        if processes > 1 and len(chunks) > 1:
+            pool    = multiprocessing.Pool(processes, find.init_worker, (finder, {'db': db}))
+            done    = pool.imap_unordered(_evaluate_worker, chunks)
+        else:
+            pool    = None
+            done    = (evaluate_words(finder, db, x) for x in chunks)
+        try:
+            for chunk in done:
+                for result in chunk:
+                    log.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    results[result['word']] = result
+                    latencies.append(result['latency'])
+                log.flush()
+                checkpoint = time.time()
+                if checkpoint - last_checkpoint >= 15:
+                    summary = summarize(db, results)
+                    print('Precision: %.8f, Coverage (Recall): %.8f' % (summary['precision'], summary['coverage']), ' %d%%' % (100 * len(results) / len(db)), ' %.1f words/s' % (len(latencies) / (checkpoint - started)))
+                    last_checkpoint = checkpoint
+        finally:
+            if pool is not None:
+                pool.terminate()
+    elapsed     = time.time() - started
+    summary     = summarize(db, results)
+    latencies.sort()
+    summary['evaluated']    = len(latencies)
+    summary['seconds']      = elapsed
+    summary['words_per_second'] = len(latencies) / elapsed if elapsed > 0 else 0
+    summary['latency']      = {'p50': percentile(latencies, 50), 'p90': percentile(latencies, 90), 'p99': percentile(latencies, 99), 'max': latencies[-1] if latencies else 0}
+    previous    = None if fresh else read_log(log_file + '.previous', None)
+    summary['report']       = report(db, previous, results) if previous else None
+    return summary
+
+
+def summarize(db, results):
+    # precision / coverage over the counted words, summed in WordNet order
+    precision_total = 0
+    coverage_total  = 0
+    total_counted   = 0
+    for word in db:
+        result = results.get(word)
+        if result and result['counted']:
+            precision_total += result['precision']
+            coverage_total  += result['coverage']
+            total_counted   += 1
+    return {
+        'words':        len(results),
+        'counted':      total_counted,
+        'precision':    precision_total / total_counted if total_counted else 0,
+        'coverage':     coverage_total / total_counted if total_counted else 0,
+    }
+
+
+def report(db, previous, results):
+    # Regressions (and improvements) of `results` against `previous` results of
+    # another run: the words whose predicates or scores changed, largest drop
+    # in precision first, with the headwords their lookup started or stopped reading.
+    changed = []
+    for word in db:
+        before  = previous.get(word)
+        after   = results.get(word)
+        if before is None or after is None:
+            continue
+        if before['predicates'] == after['predicates'] and before['precision'] == after['precision'] and before['coverage'] == after['coverage']:
+            continue
+        reads_before    = before.get('reads') or []
+        reads_after     = after.get('reads') or []
+        changed.append({
+            'word':         word,
+            'predicates':   [before['predicates'], after['predicates']],
+            'precision':    [before['precision'], after['precision']],
+            'coverage':     [before['coverage'], after['coverage']],
+            'reads_added':  [x for x in reads_after if not x in reads_before],
+            'reads_removed': [x for x in reads_before if not x in reads_after],
+        })
+    changed.sort(key=lambda x: ((x['precision'][1] or 0) - (x['precision'][0] or 0), (x['coverage'][1] or 0) - (x['coverage'][0] or 0)))
+    return {
+        'before':       summarize(db, previous),
+        'after':        summarize(db, results),
+        'changed':      changed,
+        'regressed':    len([x for x in changed if (x['precision'][1] or 0) < (x['precision'][0] or 0)]),
+        'improved':     len([x for x in changed if (x['precision'][1] or 0) > (x['precision'][0] or 0)]),
+    }
@@ -4,102 +4,141 @@
 
 import os
 import json
+import multiprocessing
 from .dictionary    import Dictionary
-from .              import util, system
+from .result        import Predicate, SenseResult, LookupResult, render_definitions
+from .              import system
 
 
 class Finder:
 
-    def __init__(self, dictionary):
+    def __init__(self, dictionary, cache=None, engine=None, stats=None, index=None):
         self.dictionary = dictionary
+        self.cache      = cache     # optional ResultCache, see cache.py
+        self.engine     = engine    # optional MatrixEngine, see vector.py
+        self.stats      = stats     # optional FinderStats, see stats.py
+        self.index      = index     # optional PredicateIndex of precomputed results, see predicates.py
 
-    def _getDefinitionUnigramSequence(self, bare_word, pos, definition, master_unigram):
-        # For each definition, break down and flatten all words, like unigram, and find word frequencies
+    def _getDefinitionUnigramSequence(self, bare_token, pos, definition, master_unigram):
+        # For each definition, flatten all (pre-tokenized) words, like unigram, and find word frequencies
         unigram     = master_unigram
         sequence    = []
+        (tokens, cut) = definition
+        token_records = self.dictionary.token_records
         # include the original word in the unigram
-        unigram[bare_word]  = 1
-        for word in definition.split(' '):
-            # is this a taxonomy? like (Bot.) or (Hort.)
-            if word.startswith('(') and word.endswith('.)'):
-                continue
-            if word == '{':
-                break
-            word        = self.dictionary.undecorateWord(word)
-            word_freq   = self.dictionary.getWordFrequency(word)
+        unigram[bare_token] = 1
+        for idx in range(cut):
+            token       = tokens[idx]
             # Upon encounter of the original lookup word, stop look further in the sequence.
             # *WARNING* This decision is arbitrary with no support of scientific evidence. (1)
             # *WARNING* Removing this statement will result in a 2 point drop in precision, and a 2 point rise in coverage.
-            if word == bare_word:
-                break
-            if word == 'OBS':   # obsolete usage comes after
+            # Taxonomies, '{' and 'OBS' (obsolete usage comes after) are already resolved by Dictionary.tokenizeDefinition().
+            if token == bare_token:
                 break
+            record      = token_records[token]
             # According to the procedures in the patent, potential predicates are all in the same part of speech. Plus, it's not trivial to recognize the meaning of words and their importance if we were to count occurrence for other POS. For instance, when we look for "APPLE", we may encounter the word "CULTIVATED" which may be important in sub-level predicate lookups. However, when sub-level definition contains words like "GROW", or "PRODUCE", it's not possible to consider them as the same meaning as "CULTIVATED" therefore the word "CULTIVATED" will be of no use.
             # In the procedure below, we rule out all other POSes in the unigram
-            variations = self.dictionary.getWord(word)
-            if not variations:
+            if not record.senses:
                 continue
-            pos_match = False
-            for variation in variations:
-                v_pos = Dictionary.getVariationPOS(variation)
-                m_pos = [x for x in v_pos if x in pos]
-                if len(m_pos) > 0:
-                    pos_match = True
-                    break
-            if not pos_match:
+            # `pos` is a bit mask (see dictionary.POS_NAMES), a single test covers all variations of the word
+            if not record.pos_mask & pos:
                 continue
-            if not word in unigram and word_freq > 0:
-                unigram[word] = 1
-                sequence.append(word)
-            elif word in unigram and word_freq > 0:
-                unigram[word] += 1
+            if not token in unigram and record.frequency > 0:
+                unigram[token] = 1
+                sequence.append(token)
+            elif token in unigram and record.frequency > 0:
+                unigram[token] += 1
         return (unigram, sequence)
 
-    def _getDefinitionWordWeights(self, defword, pos, variations, unigram):
+    def _getDefinitionWordWeights(self, deftoken, pos, senses, unigram):
         weights         = []
         definition_idx  = -1
-        # print('!!', defword)
         # iterate through level-2-word variations
-        for l2_v in sorted(variations.keys()):
+        for l2_s in senses:
             # match identical POS
-            l2_pos = Dictionary.getVariationPOS(l2_v)
-            m_pos = [x for x in l2_pos if x in pos]
-            if len(m_pos) == 0:
+            if not l2_s.pos_mask & pos:
                 continue
-            # print(util.BOLDWHITE + str(variations[l2_v]) + util.RESET)
+            l2_defs = l2_s.definitions
+            if self.stats is not None:
+                self.stats.definitions += len(l2_defs)
             # count how many level-2-word definition words matched original definition unigram
-            for idx, l2_def in enumerate(variations[l2_v]):
-                # print(' -', l2_def)
+            for idx, (l2_def, cut) in enumerate(l2_defs):
                 def_weights = []
-                for l2_w in l2_def.split(' '):
-                    # is this a taxonomy? like (Bot.) or (Hort.)
-                    if l2_w.startswith('(') and l2_w.endswith('.)'):
-                        continue
-                    l2_bw = self.dictionary.undecorateWord(l2_w)
+                for l2_t in l2_def:
                     # Upon encounter of definition-word, stop look further
                     # *WARNING* Same as (1), this is arbitrary with no scientific evidence.
-                    if l2_bw == defword:
+                    if l2_t == deftoken:
                         continue
-                    if l2_bw in unigram:
-                        weights.append(l2_bw)
-                        def_weights.append(l2_bw)
+                    if l2_t in unigram:
+                        weights.append(l2_t)
+                        def_weights.append(l2_t)
                 # Threshold: requiring unigram match to be at least 2 to count this definition, if it only has 1 unigram match, it'll be discarded
-                # print(' ', l2_def, def_weights)
                 if len(def_weights) >= system.MINIMUM_UNIGRAM_MATCH_PER_DEFINITION:
-                    # print(' =', def_weights)
                     if len(def_weights) > len(weights):
                         weights = def_weights
                         definition_idx = idx
-        # print('!!-', weights)
         return (definition_idx, weights)
 
-    def _findCandidatesFromDefinitions(self, bare_word, pos, definitions, debug_print=True):
-        retval      = []
+    def _getDefinitionProfile(self, deftoken, pos, senses, profiles):
+        # Level-2 definitions of a word with a matching POS, reduced once to {token: occurrences}
+        # (definition-word excluded) and kept in `profiles`, which find_many() shares across a batch.
+        key = (deftoken, pos)
+        if key in profiles:
+            return profiles[key]
+        profile = {}
+        for l2_s in senses:
+            if not l2_s.pos_mask & pos:
+                continue
+            l2_defs = l2_s.definitions
+            if self.stats is not None:
+                self.stats.definitions += len(l2_defs)
+            for (l2_def, cut) in l2_defs:
+                for l2_t in l2_def:
+                    if l2_t != deftoken:
+                        profile[l2_t] = profile.get(l2_t, 0) + 1
+        profiles[key] = profile
+        return profile
+
+    @staticmethod
+    def _getProfileWeight(profile, unigram):
+        # The same weight as len() of _getDefinitionWordWeights() weights: a definition never
+        # replaces the accumulated weights there (its own matches are part of them), so for any
+        # MINIMUM_UNIGRAM_MATCH_PER_DEFINITION the weight is the total of unigram matches over all
+        # definitions with a matching POS.
+        if len(profile) < len(unigram):
+            return sum([profile[x] for x in profile if x in unigram])
+        return sum([profile[x] for x in unigram if x in profile])
+
+    def _findCandidatesFromDefinitions(self, bare_word, pos, definitions, profiles=None):
+        # `definitions` are (tokens, cut) pairs from Dictionary.tokenizeDefinition(), scoring runs on word ids
+        # returns [Predicate], see result.py
+        (scored, unigram) = self._scoreDefinitions(bare_word, pos, definitions, profiles)
+        stats       = self.stats
+        if stats is not None:
+            started = stats.clock()
+        token_words = self.dictionary.token_words
+        selected    = self.selectCandidates(scored, unigram, system.MINIMUM_OUTPUT_PREDICATE_WEIGHT, system.MINIMUM_UNIGRAM_WORD_SHARES, system.MINIMUM_DEFINITION_PREDICT_WEIGHT)
+        retval      = [Predicate(token_words[w], weight, shared, sources) for (w, weight, shared, sources) in selected]
+        if stats is not None:
+            stats.lap('filter', started)
+        return retval
+
+    def _scoreDefinitions(self, bare_word, pos, definitions, profiles=None):
+        # The part of the lookup no threshold affects (see _getProfileWeight() for
+        # MINIMUM_UNIGRAM_MATCH_PER_DEFINITION): per definition its candidates,
+        # [(word id, weight)] by descending weight, and the final unigram.
+        bare_token  = self.dictionary.token_ids[bare_word]
+        scored      = []
         # using a 'unigram' variable, a single word will only be counted once across all definitions
         unigram     = {}
-        master_candidates   = {}
+        stats       = self.stats
         for definition in definitions:
-            (unigram, sequence) = self._getDefinitionUnigramSequence(bare_word, pos, definition, unigram)
+            if stats is not None:
+                started = stats.clock()
+                stats.tokens += definition[1]
+            (unigram, sequence) = self._getDefinitionUnigramSequence(bare_token, pos, definition, unigram)
+            if stats is not None:
+                started = stats.lap('unigram', started)
             # if '[Obs.]' in definition or 'Shak.' in definition or ('(' in definition and '.)' in definition):
             #     break
             # if '[Obs.]' in definition or 'Shak.' in definition:
@@ -111,47 +150,74 @@ class Finder:
             # example: The fleshy pome or fruit of a rosaceous tree (Pyrus malus) cultivated in numberless varieties in the temperate zones.
             # although there are many nouns in this sentence, but obviously 'fruit' is more important than 'zones', so sequence is assumed to be important
             candidates      = {}    # map word to weights
-            for idx, w in enumerate(sequence):
+            if self.engine is not None:
+                # the same weights, all candidates of this definition scored in one mat-vec
+                expanded = self.engine.expandCandidates(sequence, pos)
+                if stats is not None:
+                    started = stats.lap('expand', started)
+                    stats.expanded += len(sequence)
+                    stats.definitions += len(expanded[1])
+                (x, weights) = self.engine.scoreRows(expanded, unigram)
+                for idx, w in enumerate(sequence):
+                    candidates[w] = int(weights[idx])
+            else:
                 # `w` is a word in the definition sequence (definition-word)
-                # lookup this word and find variation (pos) match
-                w_vs = self.dictionary.getWord(w)
-                if not w_vs:
-                    # unseen words or too frequent words
-                    continue
-                # initialize 'word weight' to zero
-                # 'word weight' is how many unigram (words) in the definition-word definition matched the current definition
-                if not w in candidates:
-                    candidates[w] = 0
-                (def_idx, weights) = self._getDefinitionWordWeights(w, pos, w_vs, unigram)
-                candidates[w] += len(weights)
+                # lookup this word and find variation (pos) match, unseen words or too frequent words have none
+                expanded = []
+                for w in sequence:
+                    w_vs = self.dictionary.token_records[w].senses
+                    if w_vs:
+                        expanded.append((w, w_vs if profiles is None else self._getDefinitionProfile(w, pos, w_vs, profiles)))
+                if stats is not None:
+                    started = stats.lap('expand', started)
+                    stats.expanded += len(expanded)
+                if profiles is not None:
+                    for (w, profile) in expanded:
+                        candidates[w] = self._getProfileWeight(profile, unigram)
+                else:
+                    for (w, w_vs) in expanded:
+                        # initialize 'word weight' to zero
+                        # 'word weight' is how many unigram (words) in the definition-word definition matched the current definition
+                        if not w in candidates:
+                            candidates[w] = 0
+                        (x, weights) = self._getDefinitionWordWeights(w, pos, w_vs, unigram)
+                        candidates[w] += len(weights)
+            if stats is not None:
+                started = stats.lap('score', started)
+            scored.append(sorted(candidates.items(), key=lambda x: x[1], reverse=True))
+            if stats is not None:
+                stats.lap('filter', started)
+        return (scored, unigram)
+
+    @staticmethod
+    def selectCandidates(scored, unigram, output_weight, word_shares, definition_weight):
+        # Thresholds on _scoreDefinitions() results, returns [(word, weight, shared, definition indices)].
+        # The lookup applies the system.py thresholds, sweep.py any others.
+        retval      = []
+        sources     = {}    # candidate word to indices of the definitions it was a candidate in
+        master_candidates   = {}
+        for def_idx, candidates in enumerate(scored):
             # Collect all candidates where weight >= 1 (i.e. at least two match from original definition to predicate definition.)
             # *WARNING* The choice of 'weight >= 1' is arbitrary with no scientific evidence.
-            for w in sorted(candidates, key=candidates.get, reverse=True):
-                if candidates[w] >= system.MINIMUM_DEFINITION_PREDICT_WEIGHT:
+            for (w, weight) in candidates:
+                if weight >= definition_weight:
                     if w in master_candidates:
-                        master_candidates[w] += candidates[w]
+                        master_candidates[w] += weight
+                        sources[w].append(def_idx)
                     else:
-                        master_candidates[w] = candidates[w]
-                if not w in retval and candidates[w] >= system.MINIMUM_DEFINITION_PREDICT_WEIGHT:
-                    retval.append(w)
+                        master_candidates[w] = weight
+                        sources[w] = [def_idx]
+                        retval.append(w)
         # In the final master unigram, look for clues of the words shared among all definitions, if they are in candidate list, add weights
         # *WARNING* This is arbitrary with no support of scientific evidence.
         final_gathered = {}
-        for u in unigram:
-            if unigram[u] >= system.MINIMUM_UNIGRAM_WORD_SHARES and u in master_candidates:
+        for u in master_candidates:
+            if unigram[u] >= word_shares:
                 master_candidates[u] += unigram[u]
                 final_gathered[u] = unigram[u]
         # Threshold: remove any candidates with weight < MINIMUM_OUTPUT_PREDICATE_WEIGHT.
         # *WARNING* This is arbitrary with no support of scientific evidence.
-        new_retval = []
-        for w in retval:
-            if master_candidates[w] >= system.MINIMUM_OUTPUT_PREDICATE_WEIGHT:
-                new_retval.append(w)
-        retval = new_retval
-        if debug_print:
-            for w in retval:
-                print(' ·', w, master_candidates[w], ('(' + str(final_gathered[w]) + ')') if w in final_gathered else '')
-        return retval
+        return [(w, master_candidates[w], final_gathered.get(w), sources[w]) for w in retval if master_candidates[w] >= output_weight]
 
     @staticmethod
     def cleanup_definition(entry):
@@ -161,40 +227,182 @@ class Finder:
             entry = entry[entry.find(' ') + 1:]
         return entry
 
-    def find(self, word, debug_print=True, def_mode=0):
-        # def_mode: -1 = print definitions, 0 = do nothing, 1+ = select definition
-        bare_word   = self.dictionary.undecorateWord(word)
-        variations  = self.dictionary.getWord(bare_word)
-        retval      = {}
+    @staticmethod
+    def cache_key(bare_word, def_mode, dictionary):
+        # results are only valid for the same thresholds and dictionary artifacts
+        thresholds = (system.MINIMUM_OUTPUT_PREDICATE_WEIGHT, system.MINIMUM_UNIGRAM_WORD_SHARES, system.MINIMUM_DEFINITION_PREDICT_WEIGHT, system.MINIMUM_UNIGRAM_MATCH_PER_DEFINITION)
+        return (bare_word, def_mode, thresholds, dictionary.artifact_version)
+
+    def _findResults(self, record, def_mode, profiles=None):
+        # returns a LookupResult, senses in variation order
+        results     = []
+        keys        = {}
         def_count   = 0
-        if not variations:
-            return None
-        for variation in sorted(variations.keys()):
-            if debug_print and def_mode == -1:
-                print(variation)
+        for sense in record.senses:
             # for each variation, in terms of part of speech, look for similar words
-            pos = Dictionary.getVariationPOS(variation)
-            m_pos = [x for x in pos if not x in retval]
+            pos = Dictionary.getPOSNames(sense.pos_mask)
+            m_pos = [x for x in pos if not x in keys]
             if len(m_pos) == 0:
                 continue
-            if debug_print and def_mode == 0:
-                print('[', bare_word, ','.join(pos).lower() + '.', ']')
-            if def_mode == -1:
-                for entry in variations[variation]:
-                    print('  ' + util.BOLDWHITE + str(def_count + 1) + util.RESET + '.', self.cleanup_definition(entry))
-                    def_count += 1
-            elif def_mode == 0:
-                retval[','.join(pos)] = self._findCandidatesFromDefinitions(bare_word, pos, variations[variation], debug_print)
+            if def_mode == 0:
+                keys[','.join(pos)] = True
+                results.append(SenseResult(','.join(pos), sense.pos_mask, None, self._findCandidatesFromDefinitions(record.word, sense.pos_mask, sense.definitions, profiles)))
             else:
-                for entry in variations[variation]:
+                for idx, entry in enumerate(sense.entries):
                     def_count += 1
                     if def_count == def_mode:
                         entry = self.cleanup_definition(entry)
-                        print('<Selected definition ' + util.BOLDWHITE + str(def_mode) + util.RESET + '. ' + entry + '>')
-                        if debug_print:
-                            print('[', bare_word, ','.join(pos).lower() + '.', ']')
-                        retval[','.join(pos)] = self._findCandidatesFromDefinitions(bare_word, pos, [entry], debug_print)
+                        keys[','.join(pos)] = True
+                        predicates = self._findCandidatesFromDefinitions(record.word, sense.pos_mask, [self.dictionary.tokenizeDefinition(entry)], profiles)
+                        for x in predicates:
+                            x.definitions = [idx]
+                        results.append(SenseResult(','.join(pos), sense.pos_mask, entry, predicates))
                         break
-        if def_count > 0 and def_mode == -1:
-            print('<Enter ' + util.BOLDWHITE + '1-' + str(def_count) + util.RESET + ' to select definition>')
+        return LookupResult(record.word, def_mode, results)
+
+    def _lookupResults(self, record, def_mode, profiles=None):
+        if self.stats is not None:
+            self.stats.begin(record.word)
+        head = self.index.position(record.word) if self.index is not None and def_mode == 0 else -1
+        if head >= 0:
+            # counted as a cache hit, nothing is scored
+            results = self.index.result(head)
+            if self.stats is not None:
+                self.stats.cache_hit = True
+        elif self.cache is None:
+            results = self._findResults(record, def_mode, profiles)
+        else:
+            key     = self.cache_key(record.word, def_mode, self.dictionary)
+            results = self.cache.get(key)
+            if results is None:
+                results = self._findResults(record, def_mode, profiles)
+                self.cache.put(key, results)
+            elif self.stats is not None:
+                self.stats.cache_hit = True
+        if self.stats is not None:
+            self.stats.end()
+        return results
+
+    def definitions(self, word):
+        # [(variation, pos mask, [definition])] of a word to select from (find() def_mode), None for an unknown word
+        record      = self.dictionary.getRecord(word)
+        if not record or not record.senses:
+            return None
+        return [(x.variation, x.pos_mask, [self.cleanup_definition(y) for y in x.entries]) for x in record.senses]
+
+    def lookup(self, word, def_mode=0, profiles=None):
+        # LookupResult of a word (see result.py), None for an unknown word. No output,
+        # def_mode: 0 = all definitions, 1+ = the selected definition (numbered as by definitions())
+        record      = self.dictionary.getRecord(word)
+        if not record or not record.senses:
+            return None
+        return self._lookupResults(record, def_mode, profiles)
+
+    def lookup_many(self, words, processes=1, chunk_size=256, profiles=None):
+        # Batch version of lookup(word), results are in input order.
+        # Level-2 definition profiles are built once and shared by every query of
+        # the batch (or across calls, passing the same `profiles` dict), optionally
+        # chunks of the batch go to a process pool.
+        words = list(words)
+        if processes > 1 and len(words) > chunk_size:
+            chunks = [words[x:x + chunk_size] for x in range(0, len(words), chunk_size)]
+            retval = []
+            with multiprocessing.Pool(processes, init_worker, (self,)) as pool:
+                for results in pool.imap(_lookup_many_worker, chunks):
+                    retval += results
+            return retval
+        if profiles is None:
+            profiles = {}
+        return [self.lookup(word, 0, profiles) for word in words]
+
+    def suggest(self, word, limit=5):
+        # [(headword, edit distance)] to offer for a word lookup() knows nothing about
+        return self.dictionary.getSuggestions(word, limit)
+
+    def reverse(self, word, pos_mask=0):
+        # [(headword, pos, weight)] of the headwords having `word` as a predicate, by weight,
+        # from the postings of the predicate index. None without one, looking up every
+        # headword mentioning the word instead takes seconds on a full dictionary.
+        if self.index is None:
+            return None
+        record      = self.dictionary.getRecord(word)
+        if not record:
+            return []
+        return self.index.users(record.word, pos_mask)
+
+    def trace(self, word, profiles=None):
+        # [(pos, scored, unigram)] of a word, the threshold-independent part of
+        # lookup(word) per POS (see _scoreDefinitions()), None for an unknown word
+        record      = self.dictionary.getRecord(word)
+        if not record or not record.senses:
+            return None
+        retval      = []
+        keys        = {}
+        for sense in record.senses:
+            pos = Dictionary.getPOSNames(sense.pos_mask)
+            if len([x for x in pos if not x in keys]) == 0:
+                continue
+            keys[','.join(pos)] = True
+            retval.append((','.join(pos),) + self._scoreDefinitions(record.word, sense.pos_mask, sense.definitions, profiles))
         return retval
+
+    def find(self, word, debug_print=True, def_mode=0):
+        # def_mode: -1 = print definitions, 0 = do nothing, 1+ = select definition
+        # prints lookup() results, returns them as {pos: [predicate]}
+        if def_mode == -1:
+            listing = self.definitions(word)
+            if listing is None:
+                return None
+            for line in render_definitions(listing, debug_print):
+                print(line)
+            return {}
+        result      = self.lookup(word, def_mode)
+        if result is None:
+            return None
+        for line in result.render(debug_print):
+            print(line)
+        return result.by_pos()
+
+    def find_many(self, words, processes=1, chunk_size=256, profiles=None):
+        # Batch version of find(word, debug_print=False), see lookup_many()
+        return [x.by_pos() if x is not None else None for x in self.lookup_many(words, processes, chunk_size, profiles)]
+
+
+def verify_engine(dictionary, engine, words):
+    # [(word, expected, actual)] of `words` whose predicates with `engine` (see
+    # vector.py) differ from the pure-Python path, an engine must give exactly the same
+    finder      = Finder(dictionary)
+    vectorized  = Finder(dictionary, engine=engine)
+    mismatches  = []
+    for word in words:
+        expected    = finder.find(word, debug_print=False)
+        actual      = vectorized.find(word, debug_print=False)
+        if expected != actual:
+            mismatches.append((word, expected, actual))
+    return mismatches
+
+
+# Process pool workers looking up with the finder of the parent process, shared
+# by every pool of the package. Pickled, the finder is its attached artifacts
+# (see Dictionary.__getstate__()), `context` is anything else the jobs need.
+_worker_finder = None
+_worker_context = None
+
+
+def init_worker(finder, context=None):
+    # pool initializer
+    global _worker_finder, _worker_context
+    _worker_finder = finder
+    _worker_context = context
+
+
+def worker_finder():
+    return _worker_finder
+
+
+def worker_context():
+    return _worker_context
+
+
+def _lookup_many_worker(words):
+    return _worker_finder.lookup_many(words)
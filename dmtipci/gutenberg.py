@@ -0,0 +1,157 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import sys
+import multiprocessing
+from collections    import deque
+
+
+# Streaming parser of the Gutenberg MWUD text, used by Dictionary.updateFromGutenbergText.
+#
+# dictionary is in the following format:
+# ----------------------------------------
+# WORD
+# Word variation, incl POS, and etymology
+#
+# Defn: Definitions
+# ----------------------------------------
+#
+# An upper case line always starts a new word with a fresh parser state, so the
+# text is split into chunks right before such lines and the chunks are parsed
+# independently (in worker processes). Merging the chunk entries in order gives
+# exactly the dictionary a single pass over the whole text gives.
+
+CHUNK_LINES = 65536
+
+
+def is_headword_line(line):
+    # upper case indicates a new word, Gutenberg markers are skipped by the parser
+    return line.isupper() and not line.startswith('*** ')
+
+
+def read_chunks(filename, chunk_lines=CHUNK_LINES):
+    # Yields (lines, final) with at least `chunk_lines` lines per chunk, every
+    # chunk but the first one starts with a headword line.
+    chunk   = []
+    pending = None
+    for line in open(filename, 'r', encoding='utf-8', errors='ignore'):
+        if len(chunk) >= chunk_lines and is_headword_line(line.strip()):
+            if pending is not None:
+                yield (pending, False)
+            pending = chunk
+            chunk   = []
+        chunk.append(line)
+    if pending is not None:
+        yield (pending, False)
+    yield (chunk, True)
+
+
+def parse_chunk(chunk):
+    # Returns [(word, variation, [definition])] in text order. The word being
+    # parsed when a chunk ends is collected just like the next headword line
+    # would, except for the final chunk: the last word of the text is dropped,
+    # as it has always been.
+    (lines, final)      = chunk
+    entries             = []
+    current_word        = ''
+    current_variation   = ''
+    current_def         = []        # finished definitions
+    current_parts       = None      # pieces of the definition being read, None when there is none
+    variation_solid     = False
+    for line in lines:
+        # cleanup a line
+        line = line.strip()
+        if line.startswith('*** '):
+            # Gutenberg marker
+            continue
+        if len(line) == 0:
+            # empty line
+            if current_word and current_variation and not variation_solid:
+                # variation can come across multiple lines
+                variation_solid = True
+            elif current_word and current_variation and variation_solid and current_parts is not None:
+                # append an entry to definition
+                definition = ''.join(current_parts).strip()
+                # 'Note:' section in definitions are being ignored because they usually contain usage information and explanation of related terms. Since they are not like 'definitions', they won't be able to contribute to predicate selection.
+                if definition.startswith('Note: '):
+                    pass
+                # A situation where the previous definition is just a class (i.e. 3. (bot.) or 5. (law)) and the real definition came in 'current_def', merge with previous
+                elif len(current_def) >= 1 and len(current_def[-1]) > 0 and current_def[-1][0].isdigit() and current_def[-1][-1:] == ')':
+                    current_def[-1] += ' ' + definition
+                else:
+                    current_def.append(definition)
+                current_parts = []
+            continue
+        if line.isupper():
+            # upper case indicates a new word
+            if current_word and current_variation and current_parts is not None and variation_solid:
+                # collect the current word
+                entries.append((current_word, current_variation, _collect(current_def, current_parts)))
+            # start a new word
+            current_word        = line
+            current_variation   = ''
+            current_def         = []
+            current_parts       = None
+            variation_solid     = False
+            continue
+        if current_word and not current_variation:
+            # new variation segment
+            current_variation   = line
+            continue
+        if current_word and current_variation and not variation_solid:
+            # variation continued
+            current_variation   += ' ' + line
+            continue
+        if current_word and current_variation and variation_solid:
+            # definitions
+            if current_parts is None:
+                current_parts = []
+            current_parts.append(' ' + line.replace('Defn: ', ''))
+            continue
+    if not final and current_word and current_variation and current_parts is not None and variation_solid:
+        entries.append((current_word, current_variation, _collect(current_def, current_parts)))
+    return entries
+
+
+def _collect(current_def, current_parts):
+    # the definition being read is kept as is (not stripped), like a plain string concatenation would
+    return [x for x in current_def + [''.join(current_parts)] if len(x) > 0]
+
+
+def map_chunks(filename, worker=parse_chunk, processes=None, chunk_lines=CHUNK_LINES):
+    # Yields worker(chunk) for every chunk of the text, in text order.
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            # keep only a few chunks in flight, so memory stays bounded by the chunk size, not the text size
+            pending = deque()
+            for chunk in read_chunks(filename, chunk_lines):
+                pending.append(pool.apply_async(worker, (chunk,)))
+                if len(pending) > 2 * processes:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+    else:
+        for chunk in read_chunks(filename, chunk_lines):
+            yield worker(chunk)
+
+
+def parse(filename, processes=None, chunk_lines=CHUNK_LINES):
+    # Parse the text into {word: {variation: [definition]}}. A variation of a
+    # word seen a second time is ignored.
+    dictionary = {}
+    for entries in map_chunks(filename, parse_chunk, processes, chunk_lines):
+        merge(dictionary, entries)
+    return dictionary
+
+
+def merge(dictionary, entries):
+    for (word, variation, definitions) in entries:
+        if not word in dictionary:
+            # headwords come back from workers as new strings, one copy is kept (see Dictionary.internToken)
+            dictionary[sys.intern(word)] = {}
+        if not variation in dictionary[word]:
+            dictionary[word][variation] = definitions
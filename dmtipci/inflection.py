@@ -0,0 +1,163 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import re
+import multiprocessing
+
+from .third_party   import inflect
+from .              import compact
+
+
+# Inflection map builder, used by Dictionary.updateWordInflection.
+#
+# Maps inflected forms back to headwords, {FORM: {pos: [HEADWORD]}}:
+# ----------------------------------------
+# N      plural of a noun                 (inflect engine)
+# VT     present participle of a verb     (inflect engine, [p. pr. ...])
+# IMP    past tense of a verb             ([imp. ...], else the -ed rule)
+# PP     past participle of a verb        ([p. p. ...], else the -ed rule)
+# ----------------------------------------
+# Verb forms come from the [imp. & p. p. ...; p. pr. & vb. n. ...] header of a
+# variation whatever its POS, Dictionary.getVariationPOS() takes most verbs
+# for nouns because of the 'vb. n.' in there.
+#
+# Readers pick the first POS and the first headword of a form, so POS keys are
+# ordered by PRIORITY and headwords by dictionary order, each listed once. The
+# map is kept as a compact.InflectionTable, most forms have a single headword.
+#
+# Engine calls run many regexes, so every (POS, headword) pair is inflected
+# once, no matter how many variations share it, and the distinct pairs are
+# spread across worker processes.
+
+PRIORITY    = ['N', 'VT', 'IMP', 'PP']
+HEADER_PARTS = [('imp. & p. p.', ('IMP', 'PP')), ('imp.', ('IMP',)), ('p. p.', ('PP',)), ('p. pr. & vb. n.', ('VT',)), ('p. pr.', ('VT',))]
+CHUNK_SIZE  = 2048
+
+_engine = None
+
+
+def _init_worker():
+    global _engine
+    _engine = inflect.engine()
+
+
+def inflect_words(jobs):
+    # [(pos, word)] -> [FORM], pos is 'N' (plural) or 'VT' (present participle)
+    if _engine is None:
+        _init_worker()
+    forms = []
+    for (pos, word) in jobs:
+        if pos == 'N':
+            forms.append(_engine.plural(word.lower()).upper())
+        else:
+            forms.append(_engine.present_participle(word.lower()).upper())
+    return forms
+
+
+def parse_verb_forms(variation):
+    # {pos: [FORM]} from a header like '[imp. & p. p. Abandoned; p. pr. & vb. n. Abandoning.]'
+    # or '[imp. Saw; p. p. Seen; ...]', None when the variation has none
+    start       = variation.find('[')
+    end         = variation.find(']', start)
+    if start < 0 or end < 0:
+        return None
+    forms       = {}
+    for part in variation[start + 1:end].split(';'):
+        part = part.strip()
+        for (prefix, targets) in HEADER_PARTS:
+            if part.startswith(prefix):
+                part = part[len(prefix):]
+                break
+        else:
+            continue
+        # '(Spake, Archaic)' remarks are left out, 'Dwelt or Dwelled' gives both
+        for form in re.sub(r'\([^)]*\)', '', part).split():
+            form = form.strip('.,')
+            if len(form) == 0 or form in ('or', 'and', '&') or not form.replace('-', '').isalpha():
+                continue
+            for pos in targets:
+                if not pos in forms:
+                    forms[pos] = []
+                forms[pos].append(form.upper())
+    return forms or None
+
+
+def regular_past(word):
+    # fallback for verbs without an [imp. ...] header, the regular -ed rule
+    word = word.lower()
+    if word.endswith('e'):
+        word += 'd'
+    elif len(word) > 1 and word.endswith('y') and not word[-2] in 'aeiou':
+        word = word[:-1] + 'ied'
+    else:
+        word += 'ed'
+    return word.upper()
+
+
+def variation_entries(word, variation, get_variation_pos):
+    # [(FORM, pos)] of a single variation of a headword, engine forms still as (pos, word) jobs
+    pos     = get_variation_pos(variation)
+    entries = []
+    if 'N' in pos:
+        # add plural for nouns
+        entries.append((('N', word), 'N'))
+    elif 'VT' in pos or 'VI' in pos:
+        # add present participle for verbs
+        entries.append((('VT', word), 'VT'))
+    forms = parse_verb_forms(variation)
+    if forms is None and ('VT' in pos or 'VI' in pos):
+        forms = {'IMP': [regular_past(word)], 'PP': [regular_past(word)]}
+    for x in (forms or {}):
+        for form in forms[x]:
+            entries.append((form, x))
+    return entries
+
+
+def resolve(entries, memo):
+    # run the engine jobs of variation_entries(), every distinct job once per `memo`
+    resolved = []
+    for (form, pos) in entries:
+        if isinstance(form, tuple):
+            if not form in memo:
+                memo[form] = inflect_words([form])[0]
+            form = memo[form]
+        resolved.append((form, pos))
+    return resolved
+
+
+def assemble(entries):
+    # the reverse map (an InflectionTable) of (FORM, pos, word) triples in dictionary order
+    word_infl   = {}
+    for (form, pos, word) in entries:
+        if not form in word_infl:
+            word_infl[form] = {}
+        if not pos in word_infl[form]:
+            word_infl[form][pos] = []
+        if not word in word_infl[form][pos]:
+            word_infl[form][pos].append(word)
+    for form in word_infl:
+        word_infl[form] = {x: word_infl[form][x] for x in sorted(word_infl[form], key=PRIORITY.index)}
+    return compact.InflectionTable(word_infl)
+
+
+def build(dictionary, get_variation_pos, processes=None, chunk_size=CHUNK_SIZE):
+    # `dictionary` is {word: {variation: [definition]}}, `get_variation_pos` Dictionary.getVariationPOS
+    if processes is None:
+        processes = os.cpu_count() or 1
+    entries     = []
+    for word in dictionary:
+        for variation in dictionary[word]:
+            for (form, pos) in variation_entries(word, variation, get_variation_pos):
+                entries.append((form, pos, word))
+    # distinct engine jobs, spread across the pool
+    keys        = list(dict.fromkeys([x[0] for x in entries if isinstance(x[0], tuple)]))
+    if processes > 1 and len(keys) > chunk_size:
+        chunks = [keys[x:x + chunk_size] for x in range(0, len(keys), chunk_size)]
+        with multiprocessing.Pool(processes, _init_worker) as pool:
+            forms = [x for chunk in pool.map(inflect_words, chunks) for x in chunk]
+    else:
+        forms = inflect_words(keys)
+    memo        = dict(zip(keys, forms))
+    return assemble([(memo[form] if isinstance(form, tuple) else form, pos, word) for (form, pos, word) in entries])
@@ -0,0 +1,77 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import json
+import time
+import random
+import asyncio
+from urllib.parse   import quote
+
+from .evaluate      import percentile
+
+
+# Load generator for the query service (see service.py), used by loadtest.py.
+#
+# `concurrency` clients, each on its own keep-alive connection, send
+# GET /find?word=... back to back (or POST batches of `batch` words) until
+# `requests` are done, words drawn at random from `words`.
+
+
+async def _request(reader, writer, host, method, target, body=b''):
+    # (status, payload) of a single request on an open connection
+    writer.write(('%s %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n' % (method, target, host, len(body))).encode('latin-1') + body)
+    await writer.drain()
+    status  = int((await reader.readline()).split()[1])
+    length  = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        (name, x, value) = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value.strip())
+    return (status, json.loads((await reader.readexactly(length)).decode('utf-8')))
+
+
+async def _client(host, port, words, seed, batch, counter, latencies, statuses):
+    rng     = random.Random(seed)
+    (reader, writer) = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] > 0:
+            counter[0] -= 1
+            started = time.time()
+            if batch > 1:
+                body = json.dumps({'words': [rng.choice(words) for x in range(batch)]}).encode('utf-8')
+                (status, payload) = await _request(reader, writer, host, 'POST', '/find', body)
+            else:
+                (status, payload) = await _request(reader, writer, host, 'GET', '/find?word=' + quote(rng.choice(words)))
+            latencies.append(time.time() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(host, port, words, requests=1000, concurrency=16, batch=1, seed=29765):
+    # summary dict: qps, latency percentiles (seconds), responses by status
+    counter     = [requests]
+    latencies   = []
+    statuses    = {}
+    started     = time.time()
+    await asyncio.gather(*[_client(host, port, words, seed + x, batch, counter, latencies, statuses) for x in range(concurrency)])
+    elapsed     = time.time() - started
+    (reader, writer) = await asyncio.open_connection(host, port)
+    (status, metrics) = await _request(reader, writer, host, 'GET', '/metrics')
+    writer.close()
+    latencies.sort()
+    return {
+        'requests':     len(latencies),
+        'words':        len(latencies) * batch,
+        'concurrency':  concurrency,
+        'batch':        batch,
+        'seconds':      elapsed,
+        'qps':          len(latencies) / elapsed if elapsed > 0 else 0,
+        'latency':      {'p50': percentile(latencies, 50), 'p90': percentile(latencies, 90), 'p99': percentile(latencies, 99), 'max': latencies[-1] if latencies else 0},
+        'statuses':     {str(x): statuses[x] for x in sorted(statuses)},
+        'server':       metrics,
+    }
@@ -0,0 +1,142 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import sys
+import time
+import functools
+
+from .              import gutenberg, inflection
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Fused dictionary build, used by Dictionary.build.
+#
+# ----------------------------------------
+# parse        the text is streamed once, chunk workers parse it and run the
+#              inflect engine on the variations of their chunk
+# inflection   reverse map of the per-variation forms, in dictionary order
+# frequency    word counts and ---CUTOFF---, see Dictionary.countWordFrequency
+# tokens       token index, see Dictionary.buildTokenIndex
+# finalize     word records
+# ----------------------------------------
+# Inflection needs every headword and frequency needs the whole inflection map,
+# so the last stages run over the parsed dictionary in memory, they never go
+# back to the text.
+
+
+def peak_memory():
+    # peak resident set size in bytes, this process plus its largest worker, None when unknown
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+def memory_usage():
+    # {'rss', 'shared', 'private'} bytes of this process, None when unknown. Mapped
+    # artifact pages are 'shared' with every process mapping them, 'private'
+    # is what another process adds.
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            fields = {x.split(':')[0]: int(x.split()[1]) * 1024 for x in f if x.split()[-1] == 'kB'}
+    except OSError:
+        return None
+    return {
+        'rss':      fields['Rss'],
+        'shared':   fields['Shared_Clean'] + fields['Shared_Dirty'],
+        'private':  fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+class BuildStats:
+    # wall time, items processed and peak memory per build stage
+
+    def __init__(self):
+        self.stages     = []
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds, items, unit):
+        self.stages.append({'stage': name, 'seconds': seconds, 'items': items, 'unit': unit, 'peak_memory': peak_memory()})
+
+    def total(self):
+        return sum([x['seconds'] for x in self.stages])
+
+    def report(self):
+        print('----- Build Stages ----')
+        for x in self.stages:
+            rate = ('%12.0f %s/s' % (x['items'] / x['seconds'], x['unit'])) if x['items'] and x['seconds'] > 0 else ''
+            memory = ('%8.1f MB peak' % (x['peak_memory'] / 1048576)) if x['peak_memory'] is not None else ''
+            print('%-12s %8.2fs %s %s' % (x['stage'], x['seconds'], rate.ljust(24), memory))
+        print('%-12s %8.2fs' % ('total', self.total()))
+
+
+class _Stage:
+
+    def __init__(self, stats, name):
+        self.stats      = stats
+        self.name       = name
+        self.items      = 0
+        self.unit       = 'tokens'
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.stats.add(self.name, time.time() - self.started, self.items, self.unit)
+        return False
+
+
+def build_chunk(get_variation_pos, chunk):
+    # gutenberg.parse_chunk() plus the inflection forms of every entry and the words read
+    entries = gutenberg.parse_chunk(chunk)
+    forms   = [inflection.resolve(inflection.variation_entries(word, variation, get_variation_pos), _memo) for (word, variation, definitions) in entries]
+    words   = sum([len(x.split(' ')) for (word, variation, definitions) in entries for x in definitions])
+    return (entries, forms, words)
+
+
+# engine results of a worker process, kept across its chunks
+_memo = {}
+
+
+def build(dictionary, filename, processes=None, chunk_lines=gutenberg.CHUNK_LINES):
+    # fills in `dictionary` (a Dictionary), returns BuildStats
+    stats   = BuildStats()
+    forms   = {}
+    with stats.stage('parse') as stage:
+        dictionary.dictionary = {}
+        worker = functools.partial(build_chunk, dictionary.getVariationPOS)
+        for (entries, chunk_forms, words) in gutenberg.map_chunks(filename, worker, processes, chunk_lines):
+            for (entry, entry_forms) in zip(entries, chunk_forms):
+                (word, variation, definitions) = entry
+                # a variation of a word seen a second time is ignored
+                if not (word, variation) in forms:
+                    forms[(word, variation)] = entry_forms
+            gutenberg.merge(dictionary.dictionary, entries)
+            stage.items += words
+    with stats.stage('inflection') as stage:
+        stage.unit = 'forms'
+        entries = []
+        for word in dictionary.dictionary:
+            for variation in dictionary.dictionary[word]:
+                for (form, pos) in forms[(word, variation)]:
+                    entries.append((form, pos, word))
+        dictionary.word_infl = inflection.assemble(entries)
+        stage.items = len(entries)
+    with stats.stage('frequency') as stage:
+        stage.items = dictionary.countWordFrequency()
+    with stats.stage('tokens') as stage:
+        stage.items = dictionary.buildTokenIndex()
+    with stats.stage('finalize') as stage:
+        stage.unit = 'words'
+        dictionary.finalize()
+        stage.items = len(dictionary.records)
+    return stats
@@ -0,0 +1,290 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import time
+import hashlib
+from array          import array
+from collections.abc import Mapping
+
+from .dictionary    import Dictionary
+from .find          import Finder
+from .result        import Predicate, SenseResult, LookupResult
+from .              import artifact, result, system
+
+
+# Precomputed Finder.lookup() results of every headword (def_mode 0), built by
+# build_dict.py --predicates, so serving a lookup is a single index read.
+#
+# Stored as an artifact (see artifact.py), i.e. dict/pg29765_predicates.dmt:
+# ----------------------------------------
+# words          string table of headwords and predicates, words.sorted: ids in string order (bisect)
+# heads          word ids of the headwords, positions: word id -> head, -1 for other words
+# fingerprints   per head, see Fingerprints
+# sense_ptr      head -> senses (sense.mask), CSR style
+# pred_ptr       sense -> predicates (pred.word, pred.weight, pred.shared: -1 for None)
+# pred_def_ptr   predicate -> indices of its definitions (pred.defs)
+# pred.sense     predicate -> sense, sense.head: sense -> head
+# user_ptr       word id -> predicates of that word (users), by weight: the
+#                postings of Finder.reverse()
+# ----------------------------------------
+# A rebuild only looks up headwords whose fingerprint changed, the results of
+# the others are copied from the previous index.
+
+INDEX_FORMAT    = 2     # of the sections above
+
+
+def thresholds():
+    return [system.MINIMUM_OUTPUT_PREDICATE_WEIGHT, system.MINIMUM_UNIGRAM_WORD_SHARES, system.MINIMUM_DEFINITION_PREDICT_WEIGHT, system.MINIMUM_UNIGRAM_MATCH_PER_DEFINITION]
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest()
+
+
+class Fingerprints:
+    # 64 bit hashes of everything the lookup of a headword reads: thresholds,
+    # its own definitions and, for every level-1 token, the POS bits, frequency
+    # and definitions of that word. Tokens are hashed as strings, token ids
+    # change between builds of different texts.
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self.words      = list(dictionary.token_words)
+        self.tokens     = {}    # token id -> digest of the word as a level-1 token
+        self.salt       = repr((system.VERSION, result.FORMAT, thresholds())).encode('utf-8')
+
+    def senses(self, senses):
+        # POS bits and tokens of all definitions of a word
+        words   = self.words
+        parts   = []
+        for sense in senses:
+            parts.append('%d' % sense.pos_mask)
+            for (tokens, cut) in sense.definitions:
+                parts.append('%d:%s' % (cut, ' '.join([words[x] for x in tokens])))
+        return _digest('\n'.join(parts))
+
+    def token(self, token):
+        if not token in self.tokens:
+            record = self.dictionary.token_records[token]
+            if record.senses and record.frequency > 0:
+                self.tokens[token] = _digest('%s %d' % (self.words[token], record.pos_mask)) + self.senses(record.senses)
+            else:
+                self.tokens[token] = _digest('%s %d %d' % (self.words[token], 1 if record.senses else 0, 1 if record.frequency > 0 else 0))
+        return self.tokens[token]
+
+    def get(self, record):
+        digest  = hashlib.blake2b(self.salt + record.word.encode('utf-8'), digest_size=8)
+        # a headword seen as a level-1 token before has its senses hashed already
+        if record.token >= 0 and record.frequency > 0 and record.token in self.tokens:
+            digest.update(self.tokens[record.token][8:])
+        else:
+            digest.update(self.senses(record.senses))
+        for token in self.reads(record):
+            digest.update(self.token(token))
+        return int.from_bytes(digest.digest(), 'little', signed=True)
+
+    @staticmethod
+    def reads(record):
+        # level-1 tokens of a headword in order of appearance, the other words its lookup reads
+        seen    = {}
+        for sense in record.senses:
+            for (tokens, cut) in sense.definitions:
+                for idx in range(cut):
+                    seen[tokens[idx]] = True
+        return list(seen)
+
+
+def write(filename, meta, heads, fingerprints, results):
+    # `results` are LookupResult of the `heads`, in the same order
+    words   = []
+    ids     = {}
+
+    def intern(word):
+        if not word in ids:
+            ids[word] = len(words)
+            words.append(word)
+        return ids[word]
+
+    sections    = {}
+    head_ids    = array('i', [intern(x) for x in heads])
+    sense_ptr   = array('q', [0])
+    sense_mask  = array('i')
+    pred_ptr    = array('q', [0])
+    pred_word   = array('i')
+    pred_weight = array('i')
+    pred_shared = array('i')
+    pred_def_ptr = array('q', [0])
+    pred_defs   = array('i')
+    pred_sense  = array('i')
+    sense_head  = array('i')
+    for head, lookup in enumerate(results):
+        for sense in lookup.senses:
+            sense_mask.append(sense.pos_mask)
+            sense_head.append(head)
+            for x in sense.predicates:
+                pred_sense.append(len(sense_mask) - 1)
+                pred_word.append(intern(x.word))
+                pred_weight.append(x.weight)
+                pred_shared.append(x.shared if x.shared is not None else -1)
+                pred_defs.extend(x.definitions)
+                pred_def_ptr.append(len(pred_defs))
+            pred_ptr.append(len(pred_word))
+        sense_ptr.append(len(sense_mask))
+    (sections['words.offsets'], sections['words.blob']) = artifact.pack_strings(words)
+    sections['words.sorted'] = array('i', sorted(range(len(words)), key=words.__getitem__))
+    sections['heads']       = head_ids
+    positions   = array('i', [-1] * len(words))
+    for idx, x in enumerate(head_ids):
+        positions[x] = idx
+    sections['positions']   = positions
+    sections['fingerprints'] = array('q', fingerprints)
+    sections['sense_ptr']   = sense_ptr
+    sections['sense.mask']  = sense_mask
+    sections['pred_ptr']    = pred_ptr
+    sections['pred.word']   = pred_word
+    sections['pred.weight'] = pred_weight
+    sections['pred.shared'] = pred_shared
+    sections['pred_def_ptr'] = pred_def_ptr
+    sections['pred.defs']   = pred_defs
+    sections['pred.sense']  = pred_sense
+    sections['sense.head']  = sense_head
+    users       = [[] for x in words]
+    for x in range(len(pred_word)):
+        users[pred_word[x]].append(x)
+    user_ptr    = array('q', [0])
+    user_pred   = array('i')
+    for x in users:
+        user_pred.extend(sorted(x, key=pred_weight.__getitem__, reverse=True))
+        user_ptr.append(len(user_pred))
+    sections['user_ptr']    = user_ptr
+    sections['users']       = user_pred
+    artifact.write(filename, meta, sections)
+
+
+class PredicateIndex(Mapping):
+    # read-only {HEADWORD: LookupResult} over a mapped index, in headword order
+
+    def __init__(self, source):
+        self.artifact   = source
+        self.meta       = source.meta
+        self.words      = source.strings('words')
+        self.heads      = source.array('heads')
+        self.positions  = source.array('positions')
+        self.fingerprints = source.array('fingerprints')
+        self.sense_ptr  = source.array('sense_ptr')
+        self.sense_mask = source.array('sense.mask')
+        self.pred_ptr   = source.array('pred_ptr')
+        self.pred_word  = source.array('pred.word')
+        self.pred_weight = source.array('pred.weight')
+        self.pred_shared = source.array('pred.shared')
+        self.pred_def_ptr = source.array('pred_def_ptr')
+        self.pred_defs  = source.array('pred.defs')
+        self.pred_sense = source.array('pred.sense')
+        self.sense_head = source.array('sense.head')
+        self.user_ptr   = source.array('user_ptr')
+        self.user_pred  = source.array('users')
+
+    def __reduce__(self):
+        # pickled as its artifact, see artifact.attach()
+        return (self.__class__, (self.artifact,))
+
+    def position(self, word):
+        # head of a headword, -1 when not indexed
+        idx = self.words.find(word)
+        return self.positions[idx] if idx >= 0 else -1
+
+    def result(self, head):
+        senses = []
+        for sense in range(self.sense_ptr[head], self.sense_ptr[head + 1]):
+            predicates = []
+            for x in range(self.pred_ptr[sense], self.pred_ptr[sense + 1]):
+                shared = self.pred_shared[x]
+                predicates.append(Predicate(self.words[self.pred_word[x]], self.pred_weight[x], shared if shared >= 0 else None, list(self.pred_defs[self.pred_def_ptr[x]:self.pred_def_ptr[x + 1]])))
+            senses.append(SenseResult(','.join(Dictionary.getPOSNames(self.sense_mask[sense])), self.sense_mask[sense], None, predicates))
+        return LookupResult(self.words[self.heads[head]], 0, senses)
+
+    def users(self, word, pos_mask=0):
+        # [(headword, pos, weight)] of the headwords having `word` as a predicate
+        # in senses with any of the POS bits (0 for all), by weight
+        retval  = []
+        idx     = self.words.find(word)
+        if idx < 0:
+            return retval
+        for x in self.user_pred[self.user_ptr[idx]:self.user_ptr[idx + 1]]:
+            sense = self.pred_sense[x]
+            if pos_mask and not self.sense_mask[sense] & pos_mask:
+                continue
+            retval.append((self.words[self.heads[self.sense_head[sense]]], ','.join(Dictionary.getPOSNames(self.sense_mask[sense])), self.pred_weight[x]))
+        return retval
+
+    def __getitem__(self, word):
+        head = self.position(word) if isinstance(word, str) else -1
+        if head < 0:
+            raise KeyError(word)
+        return self.result(head)
+
+    def __contains__(self, word):
+        return isinstance(word, str) and self.position(word) >= 0
+
+    def __iter__(self):
+        for x in self.heads:
+            yield self.words[x]
+
+    def __len__(self):
+        return len(self.heads)
+
+
+def index_filename(filename):
+    return artifact.index_filename(filename, 'predicates')
+
+
+def load(dictionary, filename):
+    # PredicateIndex of `dictionary`, None when missing or built from other artifacts or thresholds
+    source = artifact.open_index(filename, {'artifact_version': dictionary.artifact_version, 'thresholds': thresholds(), 'format': result.FORMAT, 'index_format': INDEX_FORMAT})
+    return PredicateIndex(source) if source is not None else None
+
+
+def build(dictionary, filename, processes=None, chunk_size=256):
+    # Looks up every headword and writes the index, reusing results of the
+    # previous index whose fingerprints still match. Returns counts and timing.
+    started     = time.time()
+    previous    = artifact.open_artifact(filename)
+    if previous is not None and (previous.meta.get('format') != result.FORMAT or previous.meta.get('index_format') != INDEX_FORMAT):
+        previous.close()
+        previous = None
+    previous    = PredicateIndex(previous) if previous is not None else None
+    previous_heads = {x: idx for idx, x in enumerate(previous)} if previous is not None else {}
+    heads       = []
+    fingerprints = []
+    results     = []
+    pending     = []
+    hashes      = Fingerprints(dictionary)
+    for word in dictionary.dictionary:
+        record = dictionary.getRecord(word)
+        # inflected headwords resolve to their canonical word, indexed once
+        if not record or not record.senses or record.word != word:
+            continue
+        value = hashes.get(record)
+        head  = previous_heads.get(word, -1)
+        heads.append(word)
+        fingerprints.append(value)
+        if head >= 0 and previous.fingerprints[head] == value:
+            results.append(previous.result(head))
+        else:
+            results.append(None)
+            pending.append(len(heads) - 1)
+    print("Precomputing predicates of", len(pending), "of", len(heads), "headwords ...")
+    finder      = Finder(dictionary)
+    for (idx, lookup) in zip(pending, finder.lookup_many([heads[x] for x in pending], processes or os.cpu_count() or 1, chunk_size)):
+        results[idx] = lookup
+    meta = {
+        'artifact_version': dictionary.artifact_version,
+        'thresholds':       thresholds(),
+        'format':           result.FORMAT,
+        'index_format':     INDEX_FORMAT,
+    }
+    print("Writing predicate index to", filename, "...")
+    write(filename, meta, heads, fingerprints, results)
+    return {'headwords': len(heads), 'computed': len(pending), 'reused': len(heads) - len(pending), 'seconds': time.time() - started}
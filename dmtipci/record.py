@@ -0,0 +1,53 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+
+# part of speech bits, a variation like 'a. ... as a noun' carries POS_N | POS_A
+POS_N       = 1
+POS_A       = 2
+POS_ADV     = 4
+POS_PREP    = 8
+POS_VI      = 16
+POS_VT      = 32
+POS_PP      = 64
+POS_NAMES   = ['N', 'A', 'ADV', 'PREP', 'VI', 'VT', 'PP']    # in bit order
+
+
+class Sense:
+    # A single variation of a headword with its POS parsed once at load,
+    # store.StoredSense is the same over a mapped artifact.
+    __slots__ = ('variation', 'pos_mask', 'entries', 'definitions')
+
+    def __init__(self, variation, pos_mask, entries, definitions):
+        self.variation      = variation
+        self.pos_mask       = pos_mask
+        self.entries        = entries       # [definition]
+        self.definitions    = definitions   # [(tokens, cut)]
+
+
+class WordRecord:
+    # Everything a lookup needs to know about a single (bare) word, precomputed
+    # by Dictionary.finalize() so the hot path is one dict probe.
+    __slots__ = ('word', 'token', 'canonical', 'count', 'frequency', 'too_common', 'too_rare', 'pos_mask', 'senses')
+
+    def __init__(self, word, token):
+        self.word           = word
+        self.token          = token     # token id, -1 when no definition mentions the word
+        self.canonical      = self      # record of the word after inflection mapping (see undecorateWord)
+        self.count          = 0         # raw occurrence count in all definitions
+        self.frequency      = 0         # count after cut offs, the same as getWordFrequency()
+        self.too_common     = False
+        self.too_rare       = True
+        self.pos_mask       = 0         # POS bits of all variations
+        self.senses         = ()        # Sense per variation, sorted by variation, empty unless a headword
+
+    def setCount(self, count, cutoff):
+        # the same cut offs as Dictionary.getWordFrequency()
+        self.count          = count
+        self.frequency      = count if 1 < count < cutoff else 0
+        self.too_common     = count >= cutoff
+        self.too_rare       = count <= 1
+
+    def __repr__(self):
+        return '<WordRecord ' + self.word + ('' if self.canonical is self else ' -> ' + self.canonical.word) + '>'
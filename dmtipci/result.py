@@ -0,0 +1,87 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+from .              import util
+
+
+# Results of Finder.lookup(), plain data: scoring does no I/O, callers rank,
+# threshold or render them (see render()).
+
+FORMAT = 1      # bumped when the classes below change, persisted result caches of another format are dropped
+
+
+class Predicate:
+    # A predicate found for one POS of a word.
+    __slots__ = ('word', 'weight', 'shared', 'definitions')
+
+    def __init__(self, word, weight, shared, definitions):
+        self.word           = word
+        self.weight         = weight        # total weight, the shared bonus included
+        self.shared         = shared        # bonus for a word shared among definitions (MINIMUM_UNIGRAM_WORD_SHARES), None when not
+        self.definitions    = definitions   # indices (in the entries of the sense) of the definitions it was a candidate in
+
+    def __repr__(self):
+        return '<Predicate %s %d>' % (self.word, self.weight)
+
+    def as_dict(self):
+        return {'word': self.word, 'weight': self.weight, 'shared': self.shared, 'definitions': list(self.definitions)}
+
+
+class SenseResult:
+    # Predicates of the variations of a word sharing the same POS.
+    __slots__ = ('pos', 'pos_mask', 'definition', 'predicates')
+
+    def __init__(self, pos, pos_mask, definition, predicates):
+        self.pos            = pos           # POS names, i.e. 'N' or 'N,A'
+        self.pos_mask       = pos_mask
+        self.definition     = definition    # the selected definition text, None when all were used
+        self.predicates     = predicates    # [Predicate], ordered as found
+
+    def as_dict(self):
+        return {'pos': self.pos, 'definition': self.definition, 'predicates': [x.as_dict() for x in self.predicates]}
+
+
+class LookupResult:
+    __slots__ = ('word', 'def_mode', 'senses')
+
+    def __init__(self, word, def_mode, senses):
+        self.word           = word          # bare headword looked up
+        self.def_mode       = def_mode      # 0 = all definitions, 1+ = the selected one
+        self.senses         = senses        # [SenseResult] in variation order
+
+    def by_pos(self):
+        # {pos: [predicate]}, what Finder.find() returns
+        return {x.pos: [y.word for y in x.predicates] for x in self.senses}
+
+    def as_dict(self):
+        return {'word': self.word, 'def_mode': self.def_mode, 'senses': [x.as_dict() for x in self.senses]}
+
+    def render(self, debug_print=True):
+        # the lines the shell prints for this result
+        lines = []
+        for sense in self.senses:
+            if sense.definition is not None:
+                lines.append('<Selected definition ' + util.BOLDWHITE + str(self.def_mode) + util.RESET + '. ' + sense.definition + '>')
+            if debug_print:
+                lines.append(' '.join(['[', self.word, sense.pos.lower() + '.', ']']))
+                for x in sense.predicates:
+                    lines.append(' '.join([' ·', x.word, str(x.weight), ('(' + str(x.shared) + ')') if x.shared is not None else '']))
+        return lines
+
+
+def render_definitions(listing, debug_print=True):
+    # lines of a Finder.definitions() listing, numbered for selection
+    lines   = []
+    count   = 0
+    for (variation, pos_mask, entries) in listing:
+        if debug_print:
+            lines.append(variation)
+        if pos_mask == 0:
+            continue
+        for entry in entries:
+            count += 1
+            lines.append('  ' + util.BOLDWHITE + str(count) + util.RESET + '. ' + entry)
+    if count > 0:
+        lines.append('<Enter ' + util.BOLDWHITE + '1-' + str(count) + util.RESET + ' to select definition>')
+    return lines
@@ -0,0 +1,123 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import functools
+from array          import array
+
+from .              import artifact
+
+
+# Inverted index of the definitions, for reverse lookups ("which headwords
+# mention FRUIT?"), see Dictionary.getMentions() and Finder.reverse().
+#
+# Postings are keyed by token id, so by canonical word, and stored next to the
+# dictionary artifact, i.e. dict/pg29765_reverse.dmt:
+# ----------------------------------------
+# post_ptr       token id -> postings (byte offsets), post_count: postings per token
+# postings       varint stream, per (headword, variation, definition) mentioning the token:
+#                headword token id (delta to the previous posting), variation index
+#                (as in WordRecord.senses), definition index << 1 | before the
+#                level-1 cut, POS bits of the variation
+# ----------------------------------------
+# Headwords come first in the token index, postings are in headword order.
+
+
+def _varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def write(dictionary, filename, meta):
+    token_ids   = dictionary.token_ids
+    postings    = {}    # token -> [varints, last headword, postings]
+    for word in sorted(dictionary.dictionary, key=token_ids.__getitem__):
+        head        = token_ids[word]
+        definitions = dictionary.def_tokens[word]
+        for sense, variation in enumerate(sorted(definitions)):
+            mask = dictionary.getPOSMask(dictionary.getVariationPOS(variation))
+            for def_idx, (tokens, cut) in enumerate(definitions[variation]):
+                # a word mentioned twice in a definition is posted once, level-1 if either is
+                seen = {}
+                for idx, token in enumerate(tokens):
+                    if not token in seen:
+                        seen[token] = idx < cut
+                for token in seen:
+                    if not token in postings:
+                        postings[token] = [bytearray(), 0, 0]
+                    posting = postings[token]
+                    _varint(posting[0], head - posting[1])
+                    _varint(posting[0], sense)
+                    _varint(posting[0], def_idx << 1 | (1 if seen[token] else 0))
+                    _varint(posting[0], mask)
+                    posting[1] = head
+                    posting[2] += 1
+    tokens      = len(dictionary.token_words)
+    post_ptr    = array('q', [0])
+    post_count  = array('i', [0] * tokens)
+    blob        = bytearray()
+    for token in range(tokens):
+        if token in postings:
+            blob += postings[token][0]
+            post_count[token] = postings[token][2]
+        post_ptr.append(len(blob))
+    meta = dict(meta)
+    meta['tokens'] = tokens
+    artifact.write(filename, meta, {'post_ptr': post_ptr, 'post_count': post_count, 'postings': bytes(blob)})
+
+
+class ReverseIndex:
+    # read side of a mapped inverted index
+
+    def __init__(self, source, written=False):
+        self.artifact   = source
+        self.meta       = source.meta
+        self.written    = written   # by this load(), not found up to date
+        self.post_ptr   = source.array('post_ptr')
+        self.post_count = source.array('post_count')
+        self.postings   = source.array('postings')
+
+    def __reduce__(self):
+        # worker processes map the index again, see artifact.attach()
+        return (self.__class__, (self.artifact,))
+
+    def count(self, token):
+        return self.post_count[token] if 0 <= token < len(self.post_count) else 0
+
+    def get(self, token):
+        # [(headword token id, variation index, definition index, level-1, POS bits)]
+        retval  = []
+        if not 0 <= token < len(self.post_count):
+            return retval
+        data    = self.postings[self.post_ptr[token]:self.post_ptr[token + 1]]
+        values  = []
+        value   = 0
+        shift   = 0
+        for byte in data:
+            value |= (byte & 0x7f) << shift
+            if byte & 0x80:
+                shift += 7
+                continue
+            values.append(value)
+            value = 0
+            shift = 0
+        head    = 0
+        for idx in range(0, len(values), 4):
+            head += values[idx]
+            retval.append((head, values[idx + 1], values[idx + 2] >> 1, values[idx + 2] & 1 == 1, values[idx + 3]))
+        return retval
+
+    def close(self):
+        self.artifact.close()
+
+
+def index_filename(filename):
+    return artifact.index_filename(filename, 'reverse')
+
+
+def load(dictionary, filename, rebuild=False):
+    # ReverseIndex of `dictionary`, written first when missing, built from other artifacts or `rebuild` is set
+    (source, written) = artifact.load_index(filename, {'artifact_version': dictionary.artifact_version}, functools.partial(write, dictionary), 'reverse index', rebuild)
+    return ReverseIndex(source, written)
@@ -0,0 +1,325 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import json
+import time
+import asyncio
+import functools
+import collections
+import concurrent.futures
+from urllib.parse   import urlsplit, parse_qs
+
+from .find          import Finder
+from .cache         import ResultCache
+from .evaluate      import percentile
+from .              import system, find
+
+
+# Asyncio HTTP/JSON query service, used by serve.py.
+#
+# ----------------------------------------
+# GET  /find?word=apple           {"word": "apple", "result": {"N": [...]}}, unknown words
+#                                 get "result": null and "suggestions": [...]
+# POST /find {"word": "apple"}    same as GET
+# POST /find {"words": [...]}     {"results": [...]}, in request order
+# GET  /health                    {"status": "ok", ...}
+# GET  /metrics                   counters, batch sizes, latency percentiles
+# ----------------------------------------
+# The dictionary is loaded once. Words arriving within `batch_wait` seconds of
+# each other are looked up together with Finder.find_many(), so level-2
+# profiles are shared across the batch, in a worker process pool (or a single
+# worker thread) so the event loop never scores. A request not answered within
+# `timeout` seconds gets a 504, its words are still looked up and cached. A
+# body over MAX_BODY gets a 413 and the connection is closed.
+# Given a precomputed PredicateIndex (see predicates.py), indexed headwords are
+# answered straight from it on the event loop.
+
+LATENCY_WINDOW  = 10000     # latencies kept for /metrics percentiles
+QPS_WINDOW      = 10        # seconds
+MAX_BODY        = 1 << 20
+
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+
+
+def _find_batch(words):
+    return find.worker_finder().find_many(words)
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class Batcher:
+    # Queues words, looks them up in batches of up to `batch_size`, at most one
+    # batch per worker in flight. While every worker is busy words keep queueing,
+    # so batches grow with the load.
+
+    def __init__(self, executor, workers, batch_size, batch_wait):
+        self.executor   = executor
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue      = asyncio.Queue()
+        self.slots      = asyncio.Semaphore(workers)
+        self.batches    = 0
+        self.batched    = 0
+        self.task       = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    def lookup(self, word):
+        # future of Finder.find_many([word])[0]
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((word, future))
+        return future
+
+    async def run(self):
+        while True:
+            await self.slots.acquire()
+            batch = [await self.queue.get()]
+            # give words arriving right after this one a chance to join
+            if self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.batch_wait)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            asyncio.ensure_future(self.dispatch(batch))
+
+    async def dispatch(self, batch):
+        try:
+            # the same word queued twice is looked up once
+            words = list(dict.fromkeys([word for (word, future) in batch]))
+            self.batches += 1
+            self.batched += len(words)
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(self.executor, _find_batch, words)
+            except Exception as e:
+                for (word, future) in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            results = dict(zip(words, results))
+            for (word, future) in batch:
+                if not future.done():
+                    future.set_result(results[word])
+        finally:
+            self.slots.release()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+class QueryService:
+
+    def __init__(self, dictionary, processes=0, batch_size=64, batch_wait=0.002, timeout=5.0, cache_size=4096, max_words=1024, index=None):
+        # processes: worker processes scoring batches, 0 for a single worker thread
+        self.dictionary = dictionary
+        self.index      = index
+        self.finder     = Finder(dictionary, index=index)
+        self.processes  = processes
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.timeout    = timeout
+        self.max_words  = max_words
+        self.cache      = ResultCache(cache_size)
+        self.executor   = None
+        self.batcher    = None
+        self.server     = None
+        self.started    = time.time()
+        self.requests   = 0
+        self.words      = 0
+        self.errors     = 0
+        self.timeouts   = 0
+        self.indexed    = 0
+        self.in_flight  = 0
+        self.latencies  = collections.deque(maxlen=LATENCY_WINDOW)
+        self.completed  = collections.deque()
+
+    async def start(self, host='127.0.0.1', port=8765):
+        # the single worker thread looks up in this process
+        find.init_worker(self.finder)
+        if self.processes > 0:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.processes, initializer=find.init_worker, initargs=(self.finder,))
+            # fork the workers before the server has sockets, a worker holding a copy
+            # of a connection would keep it open after the service closed it
+            await asyncio.get_running_loop().run_in_executor(self.executor, int)
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.batcher    = Batcher(self.executor, max(self.processes, 1), self.batch_size, self.batch_wait)
+        self.batcher.start()
+        self.server     = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        self.batcher.stop()
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def lookup(self, words):
+        # results of `words` in order, cached ones without queueing
+        keys    = [Finder.cache_key(self.dictionary.bareWord(x), 0, self.dictionary) for x in words]
+        results = [self.cache.get(x) for x in keys]
+        if self.index is not None:
+            for idx in range(len(words)):
+                if results[idx] is None:
+                    results[idx] = self.indexResult(words[idx])
+        pending = {}
+        for (word, key, result) in zip(words, keys, results):
+            if result is None and not key in pending:
+                pending[key] = self.batcher.lookup(word)
+                pending[key].add_done_callback(functools.partial(self.cacheResult, key))
+        self.words += len(words)
+        if pending:
+            # on a timeout the lookups go on (shielded), their results still get cached
+            await asyncio.wait_for(asyncio.shield(asyncio.gather(*pending.values(), return_exceptions=True)), self.timeout)
+        return [results[idx] if results[idx] is not None else pending[keys[idx]].result() for idx in range(len(words))]
+
+    def indexResult(self, word):
+        # precomputed result of a word, None when it's not an indexed headword
+        record  = self.dictionary.getRecord(word)
+        head    = self.index.position(record.word) if record else -1
+        if head < 0:
+            return None
+        self.indexed += 1
+        return self.index.result(head).by_pos()
+
+    def cacheResult(self, key, future):
+        # None (no such word) is not cached, the cache can't tell it from a miss
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            self.cache.put(key, future.result())
+
+    def findResult(self, word, result):
+        # single word answer of GET and POST /find, unknown words get suggestions
+        if result is None:
+            return {'word': word, 'result': None, 'suggestions': [x[0] for x in self.finder.suggest(word)]}
+        return {'word': word, 'result': result}
+
+    async def route(self, method, target, body):
+        url     = urlsplit(target)
+        if url.path == '/health':
+            return {'status': 'ok', 'version': system.VERSION, 'artifact_version': self.dictionary.artifact_version, 'uptime': time.time() - self.started}
+        if url.path == '/metrics':
+            return self.metrics()
+        if url.path != '/find':
+            raise HTTPError(404, 'No such endpoint: ' + url.path)
+        if method == 'GET':
+            words = parse_qs(url.query).get('word', [])
+            if len(words) != 1 or len(words[0].strip()) == 0:
+                raise HTTPError(400, 'Expected a single ?word= parameter')
+            return self.findResult(words[0], (await self.lookup(words))[0])
+        if method == 'POST':
+            try:
+                request = json.loads(body.decode('utf-8'))
+            except ValueError:
+                raise HTTPError(400, 'Request body is not JSON')
+            if isinstance(request, dict) and isinstance(request.get('word'), str):
+                return self.findResult(request['word'], (await self.lookup([request['word']]))[0])
+            words = request.get('words') if isinstance(request, dict) else None
+            if not isinstance(words, list) or not all([isinstance(x, str) for x in words]):
+                raise HTTPError(400, 'Expected {"word": "..."} or {"words": ["...", ...]}')
+            if len(words) > self.max_words:
+                raise HTTPError(413, 'At most %d words per request' % self.max_words)
+            return {'results': await self.lookup(words)}
+        raise HTTPError(405, 'Method not allowed: ' + method)
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts   = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    (name, x, value) = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length  = headers.get('content-length') or '0'
+                if not (length.isascii() and length.isdigit()):
+                    # where the body ends is unknown, so the connection can't go on
+                    self.requests += 1
+                    self.errors += 1
+                    await self.respond(writer, 400, {'error': 'Content-Length is not a non-negative integer'}, True)
+                    break
+                length  = int(length)
+                if length > MAX_BODY:
+                    # the body is not read, so the connection can't go on
+                    self.requests += 1
+                    self.errors += 1
+                    await self.respond(writer, 413, {'error': 'Request body over %d bytes' % MAX_BODY}, True)
+                    break
+                body    = await reader.readexactly(length) if length > 0 else b''
+                started = time.time()
+                self.requests += 1
+                self.in_flight += 1
+                try:
+                    if len(parts) != 3:
+                        raise HTTPError(400, 'Malformed request line')
+                    payload = await self.route(parts[0].upper(), parts[1], body)
+                    status  = 200
+                except HTTPError as e:
+                    (status, payload) = (e.status, {'error': str(e)})
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    (status, payload) = (504, {'error': 'Timed out after %.1fs' % self.timeout})
+                except Exception as e:
+                    (status, payload) = (500, {'error': repr(e)})
+                finally:
+                    self.in_flight -= 1
+                if status != 200:
+                    self.errors += 1
+                elif parts[1].startswith('/find'):
+                    self.latencies.append(time.time() - started)
+                    self.completed.append(time.time())
+                    self.pruneCompleted(time.time())
+                close   = headers.get('connection', '').lower() == 'close' or (len(parts) == 3 and parts[2] == 'HTTP/1.0')
+                await self.respond(writer, status, payload, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, close):
+        data    = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: %d\r\n%s\r\n' % (status, STATUS[status], len(data), 'Connection: close\r\n' if close else '')).encode('latin-1') + data)
+        await writer.drain()
+
+    def pruneCompleted(self, now):
+        # only the last QPS_WINDOW seconds of completions are kept, /metrics or not
+        while self.completed and self.completed[0] < now - QPS_WINDOW:
+            self.completed.popleft()
+
+    def metrics(self):
+        now     = time.time()
+        self.pruneCompleted(now)
+        latencies = sorted(self.latencies)
+        return {
+            'uptime':       now - self.started,
+            'requests':     self.requests,
+            'words':        self.words,
+            'errors':       self.errors,
+            'timeouts':     self.timeouts,
+            'indexed':      self.indexed,
+            'in_flight':    self.in_flight,
+            'queued':       self.batcher.queue.qsize(),
+            'qps':          len(self.completed) / QPS_WINDOW,
+            'batches':      self.batcher.batches,
+            'batch_mean':   self.batcher.batched / self.batcher.batches if self.batcher.batches else 0,
+            'latency':      {'p50': percentile(latencies, 50), 'p90': percentile(latencies, 90), 'p99': percentile(latencies, 99), 'max': latencies[-1] if latencies else 0},
+            'cache':        self.cache.stats(),
+            'mapped':       self.dictionary.store.mappedBytes() if self.dictionary.store is not None else 0,
+        }
@@ -0,0 +1,107 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import json
+import time
+
+
+# Lookup instrumentation for Finder(stats=FinderStats()). Finder only touches it
+# when given, so lookups without stats run exactly as before.
+#
+# Phases of Finder._findCandidatesFromDefinitions():
+# ----------------------------------------
+# unigram    unigram and candidate sequence of a level-1 definition
+# expand     senses (or profiles) of the level-2 words in the sequence, with the
+#            engine their definitions (MatrixEngine.expandCandidates())
+# score      candidate weights, _getDefinitionWordWeights() or the engine mat-vec
+# filter     MINIMUM_DEFINITION_PREDICT_WEIGHT, MINIMUM_UNIGRAM_WORD_SHARES and
+#            MINIMUM_OUTPUT_PREDICATE_WEIGHT thresholds
+# ----------------------------------------
+# Counters: level-1 tokens read (up to the definition cut), level-2 words
+# expanded, level-2 definitions scored. Lookups in find_many() worker processes
+# are not counted.
+
+PHASES      = ('unigram', 'expand', 'score', 'filter')
+COUNTERS    = ('tokens', 'expanded', 'definitions')
+
+
+class FinderStats:
+    # Counters of the query in progress are plain attributes the hot path adds
+    # to, end() folds them into the totals and, given `dump_file`, appends them
+    # to a JSON lines file.
+
+    def __init__(self, dump_file=None):
+        self.clock      = time.perf_counter
+        self.dump       = open(dump_file, 'a', encoding='utf-8') if dump_file else None
+        self.reset()
+
+    def reset(self):
+        self.queries    = 0
+        self.cached     = 0
+        self.seconds    = 0
+        self.totals     = {x: 0 for x in COUNTERS}
+        self.phase_totals = {x: 0 for x in PHASES}
+        self.slowest    = None
+        self.begin(None)
+
+    def begin(self, word):
+        self.word       = word
+        self.cache_hit  = False
+        self.tokens     = 0
+        self.expanded   = 0
+        self.definitions = 0
+        self.phases     = {x: 0 for x in PHASES}
+        self.started    = self.clock()
+
+    def lap(self, phase, started):
+        # adds the time since `started` to `phase`, returns the time now
+        now = self.clock()
+        self.phases[phase] += now - started
+        return now
+
+    def end(self):
+        query = {
+            'word':         self.word,
+            'seconds':      self.clock() - self.started,
+            'cached':       self.cache_hit,
+            'tokens':       self.tokens,
+            'expanded':     self.expanded,
+            'definitions':  self.definitions,
+            'phases':       self.phases,
+        }
+        self.queries    += 1
+        self.cached     += 1 if self.cache_hit else 0
+        self.seconds    += query['seconds']
+        for x in COUNTERS:
+            self.totals[x] += query[x]
+        for x in PHASES:
+            self.phase_totals[x] += self.phases[x]
+        if self.slowest is None or query['seconds'] > self.slowest['seconds']:
+            self.slowest = query
+        if self.dump is not None:
+            self.dump.write(json.dumps(query, ensure_ascii=False) + '\n')
+            self.dump.flush()
+        return query
+
+    def report(self):
+        return {
+            'queries':      self.queries,
+            'cached':       self.cached,
+            'seconds':      self.seconds,
+            'mean':         self.seconds / self.queries if self.queries else 0,
+            'counters':     dict(self.totals),
+            'phases':       dict(self.phase_totals),
+            'slowest':      self.slowest,
+        }
+
+    def __getstate__(self):
+        # find_many() worker processes get a copy without the dump file
+        state = dict(self.__dict__)
+        state['dump'] = None
+        return state
+
+    def close(self):
+        if self.dump is not None:
+            self.dump.close()
+            self.dump = None
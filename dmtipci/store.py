@@ -0,0 +1,532 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import mmap
+import weakref
+import threading
+from array          import array
+from collections.abc import Mapping
+
+from .              import artifact
+from .record        import WordRecord
+
+
+# Dictionary artifact layout, on top of the artifact.py container.
+#
+# Every word gets an id: token ids first (so word id == token id for words of
+# the token index), then the remaining frequency, inflection and canonical
+# words. Per word id there is a frequency, a canonical word id and a range of
+# senses (variations), per sense a range of definitions, per definition a range
+# of tokens, CSR style.
+#
+# The index file (i.e. pg29765.dmt) only holds what's kept per word:
+# ----------------------------------------
+# words          string table, words.sorted: ids in string order (bisect)
+# freq           occurrences, 0 when the word is not in the frequency map
+# canon          canonical word id (see Dictionary.undecorateWord)
+# sense_ptr      word id -> senses
+# infl_ptr       word id -> inflection entries (infl.pos, infl.word)
+# ----------------------------------------
+# Senses of SHARD_WORDS consecutive word ids go to a shard file (pg29765.dmt.000,
+# ...), with sense and definition ranges relative to the shard:
+# ----------------------------------------
+# senses.mask    POS bits, variations: string table
+# sense_def_ptr  sense -> definitions
+# entries        definition text, def_cut: level-1 cut, def_tok_ptr -> tokens
+# ----------------------------------------
+# A shard is mapped the first time a word of it is needed. Dictionary.loadArtifact()
+# exposes the maps through the read-only views below, values are materialized on
+# access only. Word records are built straight from the arrays, their senses
+# decode text on access and keep nothing but token slices.
+
+SHARD_WORDS = 4096
+
+
+def shard_filename(filename, shard):
+    return '%s.%03d' % (filename, shard)
+
+
+def write(dictionary, filename, meta):
+    # serialize a finalized Dictionary, shards first, the index last
+    words       = list(dictionary.token_words)
+    ids         = {x: idx for idx, x in enumerate(words)}
+
+    def intern(word):
+        if not word in ids:
+            ids[word] = len(words)
+            words.append(word)
+        return ids[word]
+
+    for keys in (dictionary.dictionary, dictionary.word_freq, dictionary.word_infl, dictionary.records):
+        for word in keys:
+            if not word.startswith('---'):
+                intern(word)
+    for word in dictionary.word_infl:
+        for pos in dictionary.word_infl[word]:
+            for x in dictionary.word_infl[word][pos]:
+                intern(x)
+    for word in dictionary.records:
+        intern(dictionary.records[word].canonical.word)
+    pos_labels  = sorted(set([x for word in dictionary.word_infl for x in dictionary.word_infl[word]]))
+    shards      = (len(words) + SHARD_WORDS - 1) // SHARD_WORDS
+    sections    = {}
+    freq        = array('i', [0] * len(words))
+    canon       = array('i', range(len(words)))
+    sense_ptr   = array('q', [0])
+    infl_ptr    = array('q', [0])
+    infl_pos    = array('B')
+    infl_word   = array('i')
+    for shard in range(shards):
+        base        = sense_ptr[-1]
+        sense_mask  = array('i')
+        variations  = []
+        sense_def_ptr = array('q', [0])
+        entries     = []
+        def_cut     = array('i')
+        def_tok_ptr = array('q', [0])
+        tokens      = array('i')
+        for idx in range(shard * SHARD_WORDS, min(len(words), (shard + 1) * SHARD_WORDS)):
+            word = words[idx]
+            freq[idx] = dictionary.word_freq.get(word, 0)
+            record = dictionary.records.get(word)
+            if record:
+                canon[idx] = ids[record.canonical.word]
+            # variations in text order, records sort them
+            for variation in dictionary.dictionary.get(word, ()):
+                variations.append(variation)
+                sense_mask.append(dictionary.getPOSMask(dictionary.getVariationPOS(variation)))
+                for (entry, (def_tokens, cut)) in zip(dictionary.dictionary[word][variation], dictionary.def_tokens[word][variation]):
+                    entries.append(entry)
+                    def_cut.append(cut)
+                    tokens.extend(def_tokens)
+                    def_tok_ptr.append(len(tokens))
+                sense_def_ptr.append(len(entries))
+            sense_ptr.append(base + len(sense_mask))
+            for pos in dictionary.word_infl.get(word, ()):
+                for x in dictionary.word_infl[word][pos]:
+                    infl_pos.append(pos_labels.index(pos))
+                    infl_word.append(ids[x])
+            infl_ptr.append(len(infl_word))
+        shard_sections = {'senses.mask': sense_mask, 'sense_def_ptr': sense_def_ptr, 'def_cut': def_cut, 'def_tok_ptr': def_tok_ptr, 'tokens': tokens}
+        (shard_sections['variations.offsets'], shard_sections['variations.blob']) = artifact.pack_strings(variations)
+        (shard_sections['entries.offsets'], shard_sections['entries.blob']) = artifact.pack_strings(entries)
+        artifact.write(shard_filename(filename, shard), {'build_hash': meta.get('build_hash'), 'shard': shard}, shard_sections)
+    # shards of an earlier, larger build
+    shard = shards
+    while os.path.exists(shard_filename(filename, shard)):
+        os.remove(shard_filename(filename, shard))
+        shard += 1
+    (sections['words.offsets'], sections['words.blob']) = artifact.pack_strings(words)
+    sections['words.sorted']    = array('i', sorted(range(len(words)), key=words.__getitem__))
+    sections['freq']            = freq
+    sections['freq.order']      = array('i', [ids[x] for x in dictionary.word_freq if not x.startswith('---')])
+    sections['canon']           = canon
+    sections['headwords']       = array('i', [ids[x] for x in dictionary.dictionary])
+    sections['sense_ptr']       = sense_ptr
+    sections['infl.order']      = array('i', [ids[x] for x in dictionary.word_infl])
+    sections['infl_ptr']        = infl_ptr
+    sections['infl.pos']        = infl_pos
+    sections['infl.word']       = infl_word
+    meta = dict(meta)
+    meta['tokens']      = len(dictionary.token_words)
+    meta['shards']      = shards
+    meta['shard_words'] = SHARD_WORDS
+    meta['pos_labels']  = pos_labels
+    meta['freq_keys']   = {x: dictionary.word_freq[x] for x in dictionary.word_freq if x.startswith('---')}
+    artifact.write(filename, meta, sections)
+
+
+class Shard:
+    # senses of SHARD_WORDS word ids, `base` is the global id of the first sense
+
+    def __init__(self, source, base):
+        self.artifact   = source
+        self.base       = base
+        self.sense_mask = source.array('senses.mask')
+        self.variations = source.strings('variations')
+        self.sense_def_ptr = source.array('sense_def_ptr')
+        self.entries    = source.strings('entries')
+        self.def_cut    = source.array('def_cut')
+        self.def_tok_ptr = source.array('def_tok_ptr')
+        self.tokens     = source.array('tokens')
+
+
+class StoredSense:
+    # record.Sense of a shard, nothing but the POS bits is kept, text and tokens
+    # are read from the shard on access
+    __slots__ = ('shard', 'sense', 'pos_mask')
+
+    def __init__(self, shard, sense):
+        self.shard      = shard
+        self.sense      = sense     # relative to the shard
+        self.pos_mask   = shard.sense_mask[sense]
+
+    @property
+    def variation(self):
+        return self.shard.variations[self.sense]
+
+    @property
+    def entries(self):
+        shard = self.shard
+        return [shard.entries[x] for x in range(shard.sense_def_ptr[self.sense], shard.sense_def_ptr[self.sense + 1])]
+
+    @property
+    def definitions(self):
+        # zero-copy token slices, cheaper to cut again than to keep
+        shard = self.shard
+        return [(shard.tokens[shard.def_tok_ptr[x]:shard.def_tok_ptr[x + 1]], shard.def_cut[x]) for x in range(shard.sense_def_ptr[self.sense], shard.sense_def_ptr[self.sense + 1])]
+
+
+# stores of this process, see _after_fork()
+_stores = weakref.WeakSet()
+
+
+def _after_fork():
+    # a process forked (i.e. a pool worker) while the prefetch thread was mapping
+    # a shard would wait on its lock forever, the thread isn't forked along
+    for store in _stores:
+        store.lock       = threading.Lock()
+        store.prefetcher = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class DictionaryStore:
+    # Read side of an artifact, all lookups go through the mapped arrays.
+
+    def __init__(self, source):
+        self.artifact   = source
+        self.filename   = source.filename
+        self.meta       = source.meta
+        self.words      = source.strings('words')
+        self.tokens     = self.meta['tokens']
+        self.freq       = source.array('freq')
+        self.freq_order = source.array('freq.order')
+        self.freq_keys  = self.meta['freq_keys']
+        self.canon      = source.array('canon')
+        self.headwords  = source.array('headwords')
+        self.sense_ptr  = source.array('sense_ptr')
+        self.infl_order = source.array('infl.order')
+        self.infl_ptr   = source.array('infl_ptr')
+        self.infl_pos   = source.array('infl.pos')
+        self.infl_word  = source.array('infl.word')
+        self.pos_labels = self.meta['pos_labels']
+        self.shard_words = self.meta['shard_words']
+        self.shards     = [None] * self.meta['shards']
+        self.lock       = threading.Lock()
+        self.prefetcher = None
+        _stores.add(self)
+
+    def wordId(self, word):
+        # -1 when unknown
+        return self.words.find(word)
+
+    def getShard(self, shard):
+        # map a shard on first use, the prefetch thread may be mapping it as well
+        if self.shards[shard] is None:
+            with self.lock:
+                if self.shards[shard] is None:
+                    filename = shard_filename(self.filename, shard)
+                    source = artifact.Artifact(filename)
+                    if source.meta.get('build_hash') != self.meta.get('build_hash'):
+                        raise artifact.ArtifactError("Shard does not belong to this artifact, rebuild it: " + filename)
+                    self.shards[shard] = Shard(source, self.sense_ptr[shard * self.shard_words])
+        return self.shards[shard]
+
+    def prefetch(self):
+        # map all shards in a background thread, ahead of lookups needing them
+        if self.prefetcher is None:
+            self.prefetcher = threading.Thread(target=self._prefetch, daemon=True)
+            self.prefetcher.start()
+
+    def _prefetch(self):
+        for shard in range(len(self.shards)):
+            source = self.getShard(shard).artifact
+            if source.mmap is not None and hasattr(source.mmap, 'madvise'):
+                # page reads are left to the kernel, no GIL held
+                source.mmap.madvise(mmap.MADV_WILLNEED)
+
+    def hasSenses(self, idx):
+        return self.sense_ptr[idx] < self.sense_ptr[idx + 1]
+
+    def getSenseMasks(self, idx):
+        shard = self.getShard(idx // self.shard_words)
+        return [shard.sense_mask[x - shard.base] for x in range(self.sense_ptr[idx], self.sense_ptr[idx + 1])]
+
+    def getVariations(self, idx):
+        shard = self.getShard(idx // self.shard_words)
+        variations = {}
+        for sense in range(self.sense_ptr[idx] - shard.base, self.sense_ptr[idx + 1] - shard.base):
+            variations[shard.variations[sense]] = [shard.entries[x] for x in range(shard.sense_def_ptr[sense], shard.sense_def_ptr[sense + 1])]
+        return variations
+
+    def getDefinitionTokens(self, idx):
+        # (tokens, cut) pairs like Dictionary.tokenizeDefinition(), tokens are zero-copy views
+        shard = self.getShard(idx // self.shard_words)
+        definitions = {}
+        for sense in range(self.sense_ptr[idx] - shard.base, self.sense_ptr[idx + 1] - shard.base):
+            definitions[shard.variations[sense]] = [(shard.tokens[shard.def_tok_ptr[x]:shard.def_tok_ptr[x + 1]], shard.def_cut[x]) for x in range(shard.sense_def_ptr[sense], shard.sense_def_ptr[sense + 1])]
+        return definitions
+
+    def getSenses(self, idx):
+        # StoredSense per variation, sorted by variation like Dictionary._makeRecord()
+        shard = self.getShard(idx // self.shard_words)
+        senses = [StoredSense(shard, x - shard.base) for x in range(self.sense_ptr[idx], self.sense_ptr[idx + 1])]
+        return tuple(sorted(senses, key=lambda x: x.variation))
+
+    def firstInflection(self, idx):
+        return self.words[self.infl_word[self.infl_ptr[idx]]]
+
+    def getInflections(self, idx):
+        inflections = {}
+        for x in range(self.infl_ptr[idx], self.infl_ptr[idx + 1]):
+            pos = self.pos_labels[self.infl_pos[x]]
+            if not pos in inflections:
+                inflections[pos] = []
+            inflections[pos].append(self.words[self.infl_word[x]])
+        return inflections
+
+    def mappedBytes(self):
+        # size of the index and the shards mapped so far, shared by every process mapping them
+        return sum([len(x.buffer) for x in [self.artifact] + [y.artifact for y in self.shards if y is not None] if x.buffer is not None])
+
+    def close(self):
+        for shard in self.shards:
+            if shard is not None:
+                shard.artifact.close()
+        self.artifact.close()
+
+
+class _StoreView(Mapping):
+    # read-only {word: value} over a DictionaryStore, iterating ids in `order`
+    __slots__ = ('store', 'order')
+
+    def __init__(self, store, order):
+        self.store      = store
+        self.order      = order
+
+    def _id(self, word):
+        idx = self.store.wordId(word) if isinstance(word, str) else -1
+        return idx if idx >= 0 and self._has(idx) else -1
+
+    def __getitem__(self, word):
+        idx = self._id(word)
+        if idx < 0:
+            raise KeyError(word)
+        return self._value(idx)
+
+    def __contains__(self, word):
+        return self._id(word) >= 0
+
+    def __iter__(self):
+        for idx in self.order:
+            yield self.store.words[idx]
+
+    def __len__(self):
+        return len(self.order)
+
+
+class DefinitionView(_StoreView):
+    # Dictionary.dictionary: {word: {variation: [definition]}}
+    __slots__ = ()
+
+    def __init__(self, store):
+        _StoreView.__init__(self, store, store.headwords)
+
+    def _has(self, idx):
+        return self.store.hasSenses(idx)
+
+    def _value(self, idx):
+        return self.store.getVariations(idx)
+
+
+class DefinitionTokenView(DefinitionView):
+    # Dictionary.def_tokens: {word: {variation: [(tokens, cut)]}}
+    __slots__ = ()
+
+    def _value(self, idx):
+        return self.store.getDefinitionTokens(idx)
+
+
+class InflectionView(_StoreView):
+    # Dictionary.word_infl: {word: {pos: [word]}}
+    __slots__ = ()
+
+    def __init__(self, store):
+        _StoreView.__init__(self, store, store.infl_order)
+
+    def _has(self, idx):
+        return self.store.infl_ptr[idx] < self.store.infl_ptr[idx + 1]
+
+    def _value(self, idx):
+        return self.store.getInflections(idx)
+
+    def first(self, word):
+        # see compact.InflectionTable.first()
+        idx = self._id(word)
+        if idx < 0:
+            raise KeyError(word)
+        return self.store.firstInflection(idx)
+
+
+class FrequencyView(_StoreView):
+    # Dictionary.word_freq: {word: count}, '---SUM---' and '---CUTOFF---' included
+    __slots__ = ()
+
+    def __init__(self, store):
+        _StoreView.__init__(self, store, store.freq_order)
+
+    def _has(self, idx):
+        return self.store.freq[idx] > 0
+
+    def _value(self, idx):
+        return self.store.freq[idx]
+
+    def __getitem__(self, word):
+        if word in self.store.freq_keys:
+            return self.store.freq_keys[word]
+        return _StoreView.__getitem__(self, word)
+
+    def __contains__(self, word):
+        return word in self.store.freq_keys or _StoreView.__contains__(self, word)
+
+    def __iter__(self):
+        yield from _StoreView.__iter__(self)
+        yield from self.store.freq_keys
+
+    def __len__(self):
+        return len(self.order) + len(self.store.freq_keys)
+
+
+class TokenIds(Mapping):
+    # Dictionary.token_ids, words interned after loading go to `extra`
+    __slots__ = ('store', 'extra')
+
+    def __init__(self, store):
+        self.store      = store
+        self.extra      = {}
+
+    def __getitem__(self, word):
+        idx = self.store.wordId(word) if isinstance(word, str) else -1
+        if 0 <= idx < self.store.tokens:
+            return idx
+        return self.extra[word]
+
+    def __setitem__(self, word, token):
+        self.extra[word] = token
+
+    def __iter__(self):
+        for idx in range(self.store.tokens):
+            yield self.store.words[idx]
+        yield from self.extra
+
+    def __len__(self):
+        return self.store.tokens + len(self.extra)
+
+
+class TokenWords:
+    # Dictionary.token_words, appendable like the list it replaces
+    __slots__ = ('store', 'extra')
+
+    def __init__(self, store):
+        self.store      = store
+        self.extra      = []
+
+    def __getitem__(self, token):
+        if token < self.store.tokens:
+            return self.store.words[token]
+        return self.extra[token - self.store.tokens]
+
+    def __len__(self):
+        return self.store.tokens + len(self.extra)
+
+    def __iter__(self):
+        for token in range(len(self)):
+            yield self[token]
+
+    def append(self, word):
+        self.extra.append(word)
+
+
+class RecordTable:
+    # Dictionary.records, a WordRecord is built on first access and kept
+    __slots__ = ('dictionary', 'store', 'cutoff', 'records')
+
+    def __init__(self, dictionary, store):
+        self.dictionary = dictionary
+        self.store      = store
+        self.cutoff     = store.freq_keys['---CUTOFF---']
+        self.records    = {}
+
+    def get(self, word, default=None):
+        if word in self.records:
+            return self.records[word]
+        idx = self.store.wordId(word)
+        if idx < 0:
+            return default
+        # stored before its canonical record is resolved, a word may map to itself
+        record = WordRecord(word, idx if idx < self.store.tokens else self.dictionary.token_ids.get(word, -1))
+        record.setCount(self.store.freq[idx], self.cutoff)
+        if self.store.hasSenses(idx):
+            record.senses = self.store.getSenses(idx)
+            for sense in record.senses:
+                record.pos_mask |= sense.pos_mask
+        self.records[word] = record
+        if self.store.canon[idx] != idx:
+            record.canonical = self.get(self.store.words[self.store.canon[idx]])
+        return record
+
+    def __getitem__(self, word):
+        record = self.get(word)
+        if record is None:
+            raise KeyError(word)
+        return record
+
+    def __setitem__(self, word, record):
+        self.records[word] = record
+
+    def __contains__(self, word):
+        return word in self.records or self.store.wordId(word) >= 0
+
+    def __iter__(self):
+        for idx in range(len(self.store.words)):
+            yield self.store.words[idx]
+        for word in self.records:
+            if self.store.wordId(word) < 0:
+                yield word
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+class TokenRecords:
+    # Dictionary.token_records, resolved once per token id
+    __slots__ = ('dictionary', 'store', 'records', 'extra')
+
+    def __init__(self, dictionary, store):
+        self.dictionary = dictionary
+        self.store      = store
+        self.records    = [None] * store.tokens
+        self.extra      = []
+
+    def __getitem__(self, token):
+        if token < self.store.tokens:
+            record = self.records[token]
+            if record is None:
+                record = self.records[token] = self.dictionary.records[self.store.words[token]]
+            return record
+        return self.extra[token - self.store.tokens]
+
+    def __len__(self):
+        return self.store.tokens + len(self.extra)
+
+    def __iter__(self):
+        for token in range(len(self)):
+            yield self[token]
+
+    def append(self, record):
+        self.extra.append(record)
@@ -0,0 +1,160 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import zlib
+import functools
+from array          import array
+from bisect         import bisect_left
+
+from .              import artifact
+
+
+# Suggestion index of the headwords, see Dictionary.getSuggestions() and
+# getCompletions(): prefix completion and SymSpell style spelling suggestions.
+#
+# Stored next to the dictionary artifact, i.e. dict/pg29765_suggest.dmt:
+# ----------------------------------------
+# words          string table of the headwords, in string order
+# counts         occurrences of each headword in the text, ranks suggestions
+# deletes.hash   crc32 of every string made of a headword prefix with up to
+#                MAX_DISTANCE characters deleted, sorted
+# deletes.word   the headword of each hash
+# ----------------------------------------
+# Completions of a prefix are a contiguous range of the sorted words, found by
+# bisection like a flattened trie. A misspelled word shares a delete with every
+# headword within MAX_DISTANCE edits, its candidates are the headwords of its
+# own deletes, then checked with the actual edit distance.
+
+MAX_DISTANCE    = 2
+PREFIX_LENGTH   = 7     # only prefixes get deletes, that bounds them per word
+
+
+def deletes(word, distance):
+    # `word` and every string with up to `distance` characters deleted from it
+    keys    = {word}
+    edge    = [word]
+    for x in range(distance):
+        edge = [y[:idx] + y[idx + 1:] for y in edge for idx in range(len(y))]
+        edge = [y for y in edge if not y in keys]
+        keys.update(edge)
+    return keys
+
+
+def _hash(key):
+    return zlib.crc32(key.encode('utf-8'))
+
+
+def edit_distance(a, b, limit):
+    # optimal string alignment distance (adjacent transpositions count once),
+    # limit + 1 as soon as it's known to exceed `limit`
+    start   = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end     = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a       = a[start:len(a) - end]
+    b       = b[start:len(b) - end]
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) == 0 or len(b) == 0:
+        return max(len(a), len(b))
+    previous2   = None
+    previous    = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        (previous2, previous) = (previous, current)
+    return previous[-1]
+
+
+def write(dictionary, filename, meta):
+    words   = sorted(dictionary.dictionary)
+    pairs   = []
+    for idx, word in enumerate(words):
+        for key in deletes(word[:PREFIX_LENGTH], MAX_DISTANCE):
+            pairs.append(_hash(key) << 32 | idx)
+    pairs.sort()
+    sections = {}
+    (sections['words.offsets'], sections['words.blob']) = artifact.pack_strings(words)
+    sections['counts']          = array('i', [dictionary.word_freq.get(x, 0) for x in words])
+    sections['deletes.hash']    = array('I', [x >> 32 for x in pairs])
+    sections['deletes.word']    = array('i', [x & 0xffffffff for x in pairs])
+    artifact.write(filename, meta, sections)
+
+
+class SuggestionIndex:
+    # read side of a mapped suggestion index
+
+    def __init__(self, source, written=False):
+        self.artifact   = source
+        self.meta       = source.meta
+        self.written    = written   # by this load(), not found up to date
+        self.words      = source.strings('words')
+        self.counts     = source.array('counts')
+        self.hashes     = source.array('deletes.hash')
+        self.ids        = source.array('deletes.word')
+
+    def __reduce__(self):
+        # shared with worker processes like the dictionary artifact
+        return (self.__class__, (self.artifact,))
+
+    def complete(self, prefix, limit=50):
+        # headwords starting with `prefix`, in string order
+        retval  = []
+        idx     = bisect_left(self.words, prefix)
+        while idx < len(self.words) and len(retval) < limit:
+            word = self.words[idx]
+            if not word.startswith(prefix):
+                break
+            retval.append(word)
+            idx += 1
+        return retval
+
+    def suggest(self, word, limit=5, max_distance=MAX_DISTANCE):
+        # [(headword, distance)] within `max_distance` edits, closest and most frequent first.
+        # Headwords within d edits share a delete of up to d characters with `word`,
+        # so once `limit` are found within d, deletes of more characters can't outrank them.
+        max_distance = min(max_distance, MAX_DISTANCE)
+        candidates = set()
+        ranked  = []
+        level   = {word[:PREFIX_LENGTH]}
+        seen    = set(level)
+        for distance in range(max_distance + 1):
+            if distance > 0:
+                level = {x[:idx] + x[idx + 1:] for x in level for idx in range(len(x))} - seen
+                seen.update(level)
+            for key in level:
+                value   = _hash(key)
+                idx     = bisect_left(self.hashes, value)
+                while idx < len(self.hashes) and self.hashes[idx] == value:
+                    if not self.ids[idx] in candidates:
+                        candidates.add(self.ids[idx])
+                        found = edit_distance(word, self.words[self.ids[idx]], max_distance)
+                        if found <= max_distance:
+                            ranked.append((found, -self.counts[self.ids[idx]], self.words[self.ids[idx]]))
+                    idx += 1
+            if len([x for x in ranked if x[0] <= distance]) >= limit:
+                break
+        ranked.sort()
+        return [(x[2], x[0]) for x in ranked[:limit]]
+
+    def close(self):
+        self.artifact.close()
+
+
+def index_filename(filename):
+    return artifact.index_filename(filename, 'suggest')
+
+
+def load(dictionary, filename, rebuild=False):
+    # SuggestionIndex of `dictionary`, written first when missing, built from other artifacts or `rebuild` is set
+    (source, written) = artifact.load_index(filename, {'artifact_version': dictionary.artifact_version}, functools.partial(write, dictionary), 'suggestion index', rebuild)
+    return SuggestionIndex(source, written)
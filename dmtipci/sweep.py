@@ -0,0 +1,124 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import time
+import itertools
+import multiprocessing
+
+from .find          import Finder
+from .evaluate      import score
+from .              import util, system, find
+
+
+# Threshold sweep over the WordNet evaluation, used by eval.py --sweep.
+#
+# The costly part of a lookup does not depend on the MINIMUM_* thresholds, so
+# it runs once per WordNet word and is cached as a trace (Finder.trace()), with
+# words instead of token ids:
+# ----------------------------------------
+# [(pos, [[(candidate, weight)] per definition], {candidate: unigram count}), ...]
+# ----------------------------------------
+# Every grid point then only applies its thresholds to the traces
+# (Finder.selectCandidates()) and scores the predicates like evaluate.py.
+# Candidate weights don't depend on MINIMUM_UNIGRAM_MATCH_PER_DEFINITION (see
+# Finder._getProfileWeight()), grid points differing in it alone share results.
+
+GRID = {
+    'output_weight':        [2, 3, 4, 5],
+    'word_shares':          [1, 2, 3],
+    'definition_weight':    [1, 2, 3],
+    'match_per_definition': [system.MINIMUM_UNIGRAM_MATCH_PER_DEFINITION],
+}
+
+
+def current():
+    # the system.py thresholds as a grid point
+    return {
+        'output_weight':        system.MINIMUM_OUTPUT_PREDICATE_WEIGHT,
+        'word_shares':          system.MINIMUM_UNIGRAM_WORD_SHARES,
+        'definition_weight':    system.MINIMUM_DEFINITION_PREDICT_WEIGHT,
+        'match_per_definition': system.MINIMUM_UNIGRAM_MATCH_PER_DEFINITION,
+    }
+
+
+def trace_words(finder, words):
+    # {word: trace} of a chunk, level-2 profiles shared across the chunk
+    profiles    = {}
+    token_words = finder.dictionary.token_words
+    traces      = {}
+    for word in words:
+        trace   = finder.trace(word, profiles)
+        if trace is None:
+            traces[word] = None
+            continue
+        traces[word] = []
+        for (pos, scored, unigram) in trace:
+            candidates = {w for x in scored for (w, weight) in x}
+            traces[word].append((pos, [[(token_words[w], weight) for (w, weight) in x] for x in scored], {token_words[w]: unigram[w] for w in candidates}))
+    return traces
+
+
+def _trace_worker(words):
+    return trace_words(find.worker_finder(), words)
+
+
+def load_traces(finder, words, filename, processes=1, chunk_size=256):
+    # {word: trace} of `words`, cached in `filename` for the same dictionary artifacts
+    traces      = util.load_pickle(filename + '.json.pd', 'sweep traces', system.VERSION, finder.dictionary.artifact_version)
+    missing     = [x for x in words if not x in traces]
+    if len(missing) == 0:
+        return traces
+    print('Tracing', len(missing), 'words ...')
+    chunks      = [missing[x:x + chunk_size] for x in range(0, len(missing), chunk_size)]
+    if processes > 1 and len(chunks) > 1:
+        with multiprocessing.Pool(processes, find.init_worker, (finder,)) as pool:
+            for chunk in pool.imap_unordered(_trace_worker, chunks):
+                traces.update(chunk)
+    else:
+        for chunk in chunks:
+            traces.update(trace_words(finder, chunk))
+    print('Writing sweep traces to', filename, '...')
+    util.save_pickle(traces, filename, system.VERSION, finder.dictionary.artifact_version)
+    return traces
+
+
+def predicates(trace, output_weight, word_shares, definition_weight):
+    # {pos: [predicate]} of a traced word, what Finder.find() returns with these thresholds
+    return {pos: [x[0] for x in Finder.selectCandidates(scored, shares, output_weight, word_shares, definition_weight)] for (pos, scored, shares) in trace}
+
+
+def points(grid):
+    # grid points, {threshold: value} for every combination of `grid` values
+    names = list(GRID)
+    return [dict(zip(names, x)) for x in itertools.product(*[grid[x] for x in names])]
+
+
+def run(traces, db, grid):
+    # [{thresholds, counted, precision, coverage}] per grid point, the figures
+    # eval.py reports (summed in WordNet order) for those thresholds
+    words       = [x for x in db if traces.get(x) is not None]
+    hypernyms   = [db[x] for x in words]
+    rows        = []
+    done        = {}
+    for point in points(grid):
+        key     = (point['output_weight'], point['word_shares'], point['definition_weight'])
+        if not key in done:
+            started         = time.time()
+            precision_total = 0
+            coverage_total  = 0
+            total_counted   = 0
+            for (word, dst) in zip(words, hypernyms):
+                scores = score(predicates(traces[word], *key), dst)
+                if scores is not None:
+                    precision_total += scores[0]
+                    coverage_total  += scores[1]
+                    total_counted   += 1
+            done[key] = {
+                'counted':      total_counted,
+                'precision':    precision_total / total_counted if total_counted else 0,
+                'coverage':     coverage_total / total_counted if total_counted else 0,
+                'seconds':      time.time() - started,
+            }
+        rows.append(dict(thresholds=point, **done[key]))
+    return rows
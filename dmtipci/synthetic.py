@@ -0,0 +1,157 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import random
+
+
+# Synthetic MWUD (Gutenberg pg29765) text generator, used by benchmarks so
+# they can run without the external dictionary submodule. The output follows
+# the layout `Dictionary.updateFromGutenbergText` expects (see gutenberg.py):
+#
+#   WORD
+#   Word variation, incl POS, and etymology
+#
+#   Defn: Definitions
+
+
+SYLLABLES   = ['ap', 'ple', 'tree', 'fru', 'it', 'po', 'me', 'ca', 'ro', 'lin', 'dor', 'es', 'ta', 'ven', 'mar',
+               'ul', 'sin', 'gor', 'bel', 'tha', 'qui', 'ra', 'on', 'de', 'mi', 'nus', 'pel', 'cor', 'ax', 'fen']
+HEADERS     = [
+    ('N',   '{0}, n. Etym: [OE. {1}, AS. {1}.]'),
+    ('N',   '{0}, n.; pl. {2}. Etym: [L. {1}.]'),
+    ('A',   '{0}, a. Etym: [F. {1}.]'),
+    ('NA',  '{0}, a. Also used as a noun. Etym: [L. {1}.]'),
+    ('ADV', '{0}, adv. Etym: [From {1}.]'),
+    ('VT',  '{0}, v. t. [imp. & p. p. {3}; p. pr. & vb. n. {4}.] Etym: [OF. {1}.]'),
+    ('VI',  '{0}, v. i. [imp. & p. p. {3}; p. pr. & vb. n. {4}.]'),
+    ('PP',  '{0}, p. p. of {1}.'),
+]
+TAXONOMY    = ['(Bot.)', '(Zoöl.)', '(Hort.)', '(Law)', '(Naut.)', '(Med.)', '(Chem.)']
+FILLERS     = ['the', 'of', 'a', 'or', 'in', 'to', 'and', 'which', 'is', 'as', 'by', 'with', 'that', 'for']
+
+
+def make_word(rnd, used):
+    while True:
+        word = ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(1, 4))).upper()
+        if not word in used:
+            used.add(word)
+            return word
+
+
+def zipf_choice(rnd, vocab, skew=1.2):
+    # heavy-tailed pick, so a handful of definition words dominate like they do in a real dictionary
+    idx = int(len(vocab) * (rnd.random() ** (skew * 3)))
+    return vocab[min(idx, len(vocab) - 1)]
+
+
+def inflect_form(rnd, word):
+    kind = rnd.random()
+    if kind < 0.1:
+        return word.lower() + 's'
+    elif kind < 0.14:
+        return word.lower() + 'ing'
+    elif kind < 0.17:
+        return word.lower() + 'ed'
+    return word.lower()
+
+
+def make_definition(rnd, vocab, length):
+    words = []
+    if rnd.random() < 0.15:
+        words.append(rnd.choice(TAXONOMY))
+    for i in range(length):
+        roll = rnd.random()
+        if roll < 0.35:
+            words.append(rnd.choice(FILLERS))
+        elif roll < 0.37:
+            words.append('zoöl')
+        elif roll < 0.38:
+            words.append(str(rnd.randint(1, 400)))
+        else:
+            w = inflect_form(rnd, zipf_choice(rnd, vocab))
+            if rnd.random() < 0.08:
+                w += rnd.choice([',', ';', '.', ':'])
+            if rnd.random() < 0.04:
+                w = '(' + w.capitalize() + ')'
+            words.append(w)
+    if rnd.random() < 0.05:
+        words += ['{', 'See', zipf_choice(rnd, vocab).capitalize(), '}']
+    if rnd.random() < 0.08:
+        words += ['[Obs.]']
+    sentence = ' '.join(words)
+    return sentence[0].upper() + sentence[1:] + '.'
+
+
+def wrap(text, width=70):
+    lines   = []
+    current = ''
+    for word in text.split(' '):
+        if current and len(current) + len(word) + 1 > width:
+            lines.append(current)
+            current = word
+        else:
+            current = (current + ' ' + word) if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+
+def generate(filename, headwords=2000, seed=29765, mean_definition_length=14):
+    rnd     = random.Random(seed)
+    used    = set()
+    vocab   = ['ZOÖL'] + [make_word(rnd, used) for _ in range(headwords - 1)]
+    # common function words are headwords too, they end up above the frequency cut off
+    for filler in FILLERS:
+        if not filler.upper() in used:
+            used.add(filler.upper())
+            vocab.append(filler.upper())
+    out     = open(filename, 'w', encoding='utf-8')
+    out.write('*** START OF THIS PROJECT GUTENBERG EBOOK WEBSTER\'S UNABRIDGED DICTIONARY ***\n\n')
+    for word in sorted(vocab):
+        for v in range(1 + int(rnd.random() ** 3 * 3)):
+            (pos, header) = rnd.choice(HEADERS)
+            spelled = word.capitalize()
+            out.write(word + '\n')
+            header = header.format(spelled, word.lower(), spelled + 's', spelled + 'ed', spelled + 'ing')
+            for line in wrap(header, 60):
+                out.write(line + '\n')
+            out.write('\n')
+            definitions = max(1, int(rnd.expovariate(1 / 2.5)))
+            for d in range(definitions):
+                length = max(3, int(rnd.gauss(mean_definition_length, mean_definition_length / 2)))
+                if definitions == 1:
+                    text = 'Defn: ' + make_definition(rnd, vocab, length)
+                elif rnd.random() < 0.1:
+                    # class only line, the real definition follows after an empty line
+                    out.write(str(d + 1) + '. ' + rnd.choice(TAXONOMY) + '\n\n')
+                    text = 'Defn: ' + make_definition(rnd, vocab, length)
+                else:
+                    text = str(d + 1) + '. ' + make_definition(rnd, vocab, length)
+                for line in wrap(text):
+                    out.write(line + '\n')
+                out.write('\n')
+                if rnd.random() < 0.1:
+                    for line in wrap('Note: ' + make_definition(rnd, vocab, length)):
+                        out.write(line + '\n')
+                    out.write('\n')
+    out.write('*** END OF THIS PROJECT GUTENBERG EBOOK WEBSTER\'S UNABRIDGED DICTIONARY ***\n')
+    out.close()
+    return len(vocab)
+
+
+def generate_wordnet(dirname, dictionary_text, seed=29765):
+    # Lexicographer files (see wordnet.py) with random hypernyms among the
+    # headwords of a generated text, enough for evaluation throughput runs.
+    rnd     = random.Random(seed)
+    words   = sorted(set([x.strip() for x in open(dictionary_text, encoding='utf-8') if x.strip().isupper() and not x.startswith('***')]))
+    os.makedirs(os.path.join(dirname, 'dbfiles'), exist_ok=True)
+    for kind in ('noun.plant', 'noun.artifact', 'verb.motion'):
+        with open(os.path.join(dirname, 'dbfiles', kind), 'w', encoding='utf-8') as out:
+            out.write('  (synthetic lexicographer file)\n')
+            for word in rnd.sample(words, len(words) // 3):
+                hypernyms = ' '.join([('noun.plant:' if rnd.random() < 0.2 else '') + rnd.choice(words).lower() + ',@' for x in range(rnd.randint(1, 3))])
+                context = (' [ %s, %s,! ]' % (rnd.choice(words).lower(), rnd.choice(words).lower())) if rnd.random() < 0.3 else ''
+                frames = ' frames: 1,2' if kind.startswith('verb') else ''
+                out.write('{ %s,%s %s%s (synthetic gloss; "an example") }\n' % (word.lower(), context, hypernyms, frames))
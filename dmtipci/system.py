@@ -1,6 +1,6 @@
 #!/usr/local/bin/python3
 
-VERSION = 20150101
+VERSION = 20150102
 
 MINIMUM_OUTPUT_PREDICATE_WEIGHT         = 3
 MINIMUM_UNIGRAM_WORD_SHARES             = 2
@@ -4,6 +4,7 @@
 
 
 import os
+import sys
 import json
 import pickle
 
@@ -27,23 +28,63 @@ BOLDCYAN    = "\033[1m\033[36m"
 BOLDWHITE   = "\033[1m\033[37m"
 
 
-def load_pickle(filename, kind, required_ver):
+def load_pickle(filename, kind, required_ver, source_hash=None):
+    # {} when missing, unreadable, of an older version or (given `source_hash`) built from another source text
     ret = {}
+    if not os.path.exists(filename):
+        return ret
+    print("Loading", kind, "from", filename, "...")
     try:
-        if os.path.exists(filename):
-            print("Loading", kind, "from", filename, "...")
-            ret = pickle.load(open(filename, 'rb'))
-            if not '---VERSION---' in ret or ret['---VERSION---'] < required_ver:
-                ret = {}
-            else:
-                del ret['---VERSION---']    # remove, as it's not needed during runtime
-    except:
-        pass
+        with open(filename, 'rb') as f:
+            ret = pickle.load(f)
+    except Exception as e:
+        # newer protocols, truncated or foreign files raise about anything, all mean rebuild
+        print("Ignoring", filename + ":", e)
+        return {}
+    if not isinstance(ret, dict) or not '---VERSION---' in ret or ret['---VERSION---'] < required_ver:
+        return {}
+    if source_hash is not None and ret.get('---SOURCE---') != source_hash:
+        print("Source text changed, rebuilding", kind, "...")
+        return {}
+    # remove, as they're not needed during runtime
+    del ret['---VERSION---']
+    ret.pop('---SOURCE---', None)
     return ret
 
 
-def save_pickle(data, filename, version):
+def save_pickle(data, filename, version, source_hash=None):
     data['---VERSION---'] = version
-    pickle.dump(data, open(filename + '.json.pd', 'wb'))
-    open(filename + '.json', 'w', encoding='utf-8', errors='ignore').write(json.dumps(data, ensure_ascii=False, sort_keys=True, indent=4))
+    if source_hash is not None:
+        data['---SOURCE---'] = source_hash
+    with open(filename + '.json.pd', 'wb') as f:
+        pickle.dump(data, f)
     del data['---VERSION---']
+    data.pop('---SOURCE---', None)
+
+
+def save_json(data, filename):
+    # human readable export, opt-in only (see Dictionary.exportJSON)
+    with open(filename + '.json', 'w', encoding='utf-8', errors='ignore') as f:
+        json.dump(data, f, ensure_ascii=False, sort_keys=True, indent=4, default=list)
+
+
+def sizeof(obj, seen):
+    # sys.getsizeof() of `obj` and everything it holds: containers and __slots__
+    # objects are followed, others (i.e. views, mapped buffers) count for
+    # themselves only. Objects already in `seen` (ids) are not counted again.
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for (key, value) in obj.items():
+            size += sizeof(key, seen) + sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for x in obj:
+            size += sizeof(x, seen)
+    elif not hasattr(obj, '__dict__'):
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(obj, name):
+                    size += sizeof(getattr(obj, name), seen)
+    return size
@@ -0,0 +1,183 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import os
+import glob
+import json
+from array          import array
+from collections.abc import Mapping
+
+from .              import artifact, system
+
+
+# WordNet lexicographer file ingest, used by eval.py.
+#
+# Note: Only hypernyms are being parsed.
+# Hypernyms are those with ,@ pointer syntax in wordnet, according to http://wordnet.princeton.edu/wordnet/man/wninput.5WN.html .
+# Refer to https://github.com/kazazes/DMTIPCI/issues/1 for the reasons we are only interested in hypernyms.
+# adj and adv are ignored because they use a more complex format.
+#
+# Noun and verb hypernyms of a subject are kept apart, verb hypernyms are only
+# scored against verb predicates (see evaluate.score()).
+#
+# The result, {SUBJECT: {POS: [HYPERNYM]}} with POS 'N' or 'V', is cached as an artifact (see artifact.py):
+# ----------------------------------------
+# words          string table of subjects and hypernyms
+# words.sorted   word ids in string order (bisect)
+# subjects       word ids of the subjects, in file order
+# positions      word id -> position in subjects, -1 for other words
+# hyp_ptr        (subject, POS) -> hypernyms (hyp), CSR style, subject * len(POS) + POS index
+# ----------------------------------------
+
+KINDS           = ['noun', 'verb']
+POS             = ['N', 'V']    # of KINDS, in hyp_ptr order
+INDEX_FORMAT    = 2             # bumped when the layout above changes
+POINTERS_2      = (',@', ';c', ';r', ';u', ',~')
+POINTERS_3      = (',@i', ',~i')
+
+
+def parse_line(line):
+    # (SUBJECT, [HYPERNYM]) of a {...} synset line, None for anything else
+    line = line.strip()
+    # {...} works for nouns and verbs
+    if not line.startswith('{') or not line.endswith('}'):
+        return None
+    # the gloss, in parentheses, is not used
+    line = line[1:line.find('(')]
+    # information about word usage context in square brackets: [] are not used, they have to be ignored
+    line = ''.join([x.split('[', 1)[0] for x in line.split(']')])
+    elements = []
+    for x in line.strip().split(' '):
+        if len(x.strip(',')) == 0:
+            continue
+        x = x.strip(',1234567890')
+        # words formatted like noun.plant:pome
+        semi_c = x.rfind(':')
+        if semi_c > 0 and '.' in x:
+            x = x[semi_c + 1:]
+        elements.append(x)
+    if len(elements) == 0 or elements[0].endswith(',@'):  # only a single hypernym? disregard
+        return None
+    hypernyms = []  # indirect hypernyms
+    for x in elements[1:]:
+        if x.endswith(POINTERS_2):
+            hypernyms.append(x[:-2].strip(',1234567890').upper())
+        elif x.endswith(POINTERS_3):
+            hypernyms.append(x[:-3].strip(',1234567890').upper())
+    return (elements[0].upper(), hypernyms)
+
+
+def parse(dbfiles, kinds=KINDS):
+    # {SUBJECT: {POS: [HYPERNYM]}} of all lexicographer files of `kinds`, hypernyms listed once per POS
+    db      = {}
+    seen    = {}
+    for kind in kinds:
+        pos = POS[KINDS.index(kind)]
+        for filename in sorted(glob.glob(os.path.join(dbfiles, kind + '.*'))):
+            print("Parsing", filename, "...")
+            with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    parsed = parse_line(line)
+                    if parsed is None:
+                        continue
+                    (subject, hypernyms) = parsed
+                    if not (subject, pos) in seen:
+                        seen[(subject, pos)] = set()
+                    for key in hypernyms:
+                        if not key in seen[(subject, pos)]:
+                            seen[(subject, pos)].add(key)
+                            if not subject in db:
+                                db[subject] = {}
+                            if not pos in db[subject]:
+                                db[subject][pos] = []
+                            db[subject][pos].append(key)
+    return db
+
+
+def write_index(db, filename, meta):
+    words   = []
+    ids     = {}
+    for subject in db:
+        for x in [subject] + [y for pos in POS for y in db[subject].get(pos, [])]:
+            if not x in ids:
+                ids[x] = len(words)
+                words.append(x)
+    sections = {}
+    (sections['words.offsets'], sections['words.blob']) = artifact.pack_strings(words)
+    sections['words.sorted'] = array('i', sorted(range(len(words)), key=words.__getitem__))
+    sections['subjects'] = array('i', [ids[x] for x in db])
+    positions = array('i', [-1] * len(words))
+    for idx, subject in enumerate(db):
+        positions[ids[subject]] = idx
+    sections['positions'] = positions
+    hyp_ptr = array('q', [0])
+    hyp     = array('i')
+    for subject in db:
+        for pos in POS:
+            hyp.extend([ids[x] for x in db[subject].get(pos, [])])
+            hyp_ptr.append(len(hyp))
+    sections['hyp_ptr'] = hyp_ptr
+    sections['hyp'] = hyp
+    artifact.write(filename, meta, sections)
+
+
+class HypernymIndex(Mapping):
+    # read-only {SUBJECT: {POS: [HYPERNYM]}} over a mapped index, in file order,
+    # a POS without hypernyms is left out
+
+    def __init__(self, source):
+        self.artifact   = source
+        self.build_hash = source.meta.get('build_hash')
+        self.words      = source.strings('words')
+        self.subjects   = source.array('subjects')
+        self.hyp_ptr    = source.array('hyp_ptr')
+        self.hyp        = source.array('hyp')
+        self.positions  = source.array('positions')
+
+    def __reduce__(self):
+        # evaluation workers map the index again instead of unpickling the hypernyms
+        return (self.__class__, (self.artifact,))
+
+    def _position(self, word):
+        idx = self.words.find(word)
+        return self.positions[idx] if idx >= 0 else -1
+
+    def __getitem__(self, word):
+        idx = self._position(word) if isinstance(word, str) else -1
+        if idx < 0:
+            raise KeyError(word)
+        retval = {}
+        for (x, pos) in enumerate(POS):
+            (start, end) = (self.hyp_ptr[idx * len(POS) + x], self.hyp_ptr[idx * len(POS) + x + 1])
+            if end > start:
+                retval[pos] = [self.words[y] for y in self.hyp[start:end]]
+        return retval
+
+    def __contains__(self, word):
+        return isinstance(word, str) and self._position(word) >= 0
+
+    def __iter__(self):
+        for x in self.subjects:
+            yield self.words[x]
+
+    def __len__(self):
+        return len(self.subjects)
+
+
+def load(wordnet_dir, kinds=KINDS):
+    # HypernymIndex of wordnet_dir/dbfiles, cached in wordnet_dir/cache/wordnet.dmt and
+    # rebuilt when a lexicographer file changes
+    dbfiles     = os.path.join(wordnet_dir, 'dbfiles')
+    cache_dir   = os.path.join(wordnet_dir, 'cache')
+    filename    = os.path.join(cache_dir, 'wordnet.dmt')
+    stamps      = {os.path.basename(x): artifact.file_stamp(x) for kind in kinds for x in glob.glob(os.path.join(dbfiles, kind + '.*'))}
+    params      = {'version': system.VERSION, 'format': artifact.FORMAT_VERSION, 'kinds': list(kinds), 'index': INDEX_FORMAT}
+    build_hash  = artifact.build_hash(json.dumps(stamps, sort_keys=True), params)
+    source      = artifact.open_artifact(filename, build_hash)
+    if source is None:
+        db = parse(dbfiles, kinds)
+        os.makedirs(cache_dir, exist_ok=True)
+        write_index(db, filename, {'build_hash': build_hash, 'params': params})
+        source = artifact.open_artifact(filename, build_hash)
+    return HypernymIndex(source)
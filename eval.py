@@ -1,95 +1,23 @@
 #!/usr/local/bin/python3
 
 
-import os
 import json
 import pickle
-import glob
-import time
+import random
+import argparse
 from dmtipci.dictionary import Dictionary
 from dmtipci.find       import Finder
+from dmtipci.vector     import MatrixEngine
 from dmtipci.debug      import _assert, __LINE__, __FILE__
-from dmtipci            import util, system
-
-
-WORDNET_CACHE_VERSION = system.VERSION
-
-
-def parse_wordnet_line(line, kind):
-    line = line.strip()
-    # {...} works for nouns and verbs
-    if line.startswith('{') and line.endswith('}'):
-        # information regarding the words
-        def_start   = line.find('(')
-        def_end     = line.rfind(')')
-        def_content = line[def_start+1:def_end-1]
-        # def_content is supposedly the definition of the word (aka gloss)
-        line        = line[1:def_start]
-        # information about word usage context in square brackets: [] are not used, they have to be ignored
-        line_p      = ''
-        in_bracket  = False
-        for char in line:
-            if char == '[':
-                in_bracket = True
-            elif char == ']':
-                in_bracket = False
-                continue
-            if not in_bracket:
-                line_p += char
-        elements    = [x.strip(',1234567890') for x in line_p.strip().split(' ') if len(x.strip(',')) > 0]
-        # process words formatted like noun.plant:pome
-        for i in range(0, len(elements)):
-            element = elements[i]
-            semi_c  = element.rfind(':')
-            if '.' in element and semi_c > 0:
-                element = element[semi_c + 1:]
-                elements[i] = element
-        subject     = elements[0]
-        if not subject.endswith(',@'):  # only a single hypernym? disregard
-            i_hypernyms = []    # indirect hypernyms
-            for i in range(1, len(elements)):
-                if elements[i].endswith(',@') or elements[i].endswith(';c') or elements[i].endswith(';r') or elements[i].endswith(';u') or elements[i].endswith(',~'):
-                    element = elements[i][:-2]  # remove ,@
-                    i_hypernyms.append(element.strip(',1234567890').upper())
-                elif elements[i].endswith(',@i') or elements[i].endswith(',~i'):
-                    element = elements[i][:-3]
-                    i_hypernyms.append(element.strip(',1234567890').upper())
-            return {
-                'subject':      subject.upper(),
-                'i_hypernyms':  i_hypernyms
-            }
-    return {}
+from dmtipci            import system, evaluate, wordnet, sweep, find
+
+
+REPORT_LINES = 20
 
 
 def load_wordnet():
-    wordnet_cache_dir   = 'wordnet_db/cache/'
-    wordnet_files       = 'wordnet_db/dbfiles/'
-    os.makedirs(wordnet_cache_dir, exist_ok=True)
-    db = util.load_pickle(wordnet_cache_dir + 'wordnet.json.pd', 'wordnet', WORDNET_CACHE_VERSION)
-    if len(db) != 0:
-        return db
-    # Note: Only hypernyms are being parsed.
-    # Hypernyms are those with ,@ pointer syntax in wordnet, according to http://wordnet.princeton.edu/wordnet/man/wninput.5WN.html .
-    # Refer to https://github.com/kazazes/DMTIPCI/issues/1 for the reasons we are only interested in hypernyms.
-    # adj and adv are temporarily ignored because they use a more complex format
-    for filename in glob.glob(wordnet_files + 'noun.*'):
-        # nouns
-        print("Parsing", filename, "...")
-        for line in open(filename, 'r').readlines():
-            l = parse_wordnet_line(line, 'noun')
-            if l:
-                hns = []
-                if l['subject'] in db:
-                    hns = db[l['subject']]
-                for key in l['i_hypernyms']:
-                    if not key in hns:
-                        hns.append(key)
-                if len(hns) > 0:
-                    db[l['subject']] = hns
-    for filename in glob.glob(wordnet_files + 'verb.*'):
-        # nouns
-        print("Parsing", filename)
-    util.save_pickle(db, wordnet_cache_dir + 'wordnet', WORDNET_CACHE_VERSION)
+    # {SUBJECT: {POS: [HYPERNYM]}} of nouns and verbs, see dmtipci/wordnet.py
+    db = wordnet.load('wordnet_db')
     if len(db) == 0:
         print("DMTIPCI Evaluation requires WordNet, instructions:")
         print("- Download from http://wordnetcode.princeton.edu/wn3.1.dict.tar.gz")
@@ -100,55 +28,78 @@ def load_wordnet():
     return db
 
 
-def main():
-    db = load_wordnet()
-    print('WordNet has', len(db), 'entries.')
+def load_dictionary(export_json=False):
     master_text = 'dict/pg29765.txt'
-    word_freq   = 'dict/pg29765_word_freq'
-    word_infl   = 'dict/pg29765_word_infl'
     d = Dictionary()
-    d.updateFromGutenbergText(master_text)
-    d.updateWordInflection(word_infl)
-    d.updateWordFrequency(word_freq)
-    finder = Finder(d)
-    precision_total = 0
-    coverage_total  = 0
-    total_counted   = 0
-    last_checkpoint = time.time()
+    # every shard is needed, map them while WordNet loads
+    d.load(master_text, prefetch=True)
+    if export_json:
+        d.exportJSON(master_text)
+    return d
+
+
+def verify_engine(d, sample_size):
+    # the vectorized engine must give exactly the same predicates as the pure-Python path,
+    # bench.py checks every headword of its synthetic dictionaries
+    words   = sorted(d.dictionary)
+    if sample_size < len(words):
+        words = random.Random(system.VERSION).sample(words, sample_size)
+    mismatches = find.verify_engine(d, MatrixEngine(d), words)
+    for (word, expected, actual) in mismatches:
+        print('Mismatch:', word, expected, actual)
+    print('Engine verification: %d headwords, %d mismatches.' % (len(words), len(mismatches)))
+    return len(mismatches) == 0
+
+
+def run_sweep(d, db, args):
+    # precision / coverage of every threshold combination of the grid, lookups traced once
+    grid    = {name: [int(x) for x in getattr(args, name).split(',')] for name in sweep.GRID}
+    finder  = Finder(d)
+    traces  = sweep.load_traces(finder, list(db), args.traces, args.processes, args.batch_size)
+    rows    = sweep.run(traces, db, grid)
+    current = sweep.current()
+    print('  output  shares  def.  match   counted   precision    coverage')
+    for row in rows:
+        t = row['thresholds']
+        print('%s %6d  %6d  %4d  %5d  %8d  %.8f  %.8f' % ('*' if t == current else ' ', t['output_weight'], t['word_shares'], t['definition_weight'], t['match_per_definition'], row['counted'], row['precision'], row['coverage']))
+    if args.sweep_output:
+        with open(args.sweep_output, 'w', encoding='utf-8') as f:
+            json.dump({'run': evaluate.run_info(finder, db), 'current': current, 'rows': rows}, f, indent=4)
+
+
+def print_report(report, log_file, filename):
+    # changes against the previous log, see evaluate.report()
+    print('Against %s.previous: precision %.8f -> %.8f, coverage %.8f -> %.8f' % (log_file, report['before']['precision'], report['after']['precision'], report['before']['coverage'], report['after']['coverage']))
+    print('%d words changed, precision down for %d, up for %d' % (len(report['changed']), report['regressed'], report['improved']))
+    for x in report['changed'][:REPORT_LINES]:
+        (before, after) = [[y for pos in (z or {}) for y in z[pos]] for z in x['predicates']]
+        figures = ['%.3f' % y if y is not None else '-' for y in x['precision'] + x['coverage']]
+        added   = [y for y in after if not y in before]
+        removed = [y for y in before if not y in after]
+        change  = ' '.join(['+' + y for y in added] + ['-' + y for y in removed]) if added or removed else 'reordered'
+        print('  %-20s precision %s -> %s, coverage %s -> %s, predicates %s' % tuple([x['word']] + figures + [change]))
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print('Regression report written to', filename)
+
+
+def main(args):
+    d = load_dictionary(args.export_json)
+    if args.verify_engine:
+        quit(0 if verify_engine(d, args.verify_engine) else 1)
+    db = load_wordnet()
+    print('WordNet has', len(db), 'entries.')
+    if args.sweep:
+        run_sweep(d, db, args)
+        return
+    finder = Finder(d, engine=(MatrixEngine(d) if args.engine == 'numpy' else None))
     print('Evaluation started.')
-    for idx, word in enumerate(db):
-        dst = db[word]
-        src = finder.find(word, debug_print=False)
-        if src and 'N' in src:
-            src = src['N']
-        if not src:
-            continue
-        total_counted += 1
-        dst_ = []
-        for e in dst:
-            dst_ += e.split('_')
-        # print(src)
-        # print(dst)
-        # print(dst_)
-        correct = 0
-        for e in src:
-            for e_ in dst_:
-                if e in e_:
-                    correct += 1
-        precision_total += correct / len(src)
-        # print('Precision', correct, 'of', len(src))
-        correct = 0
-        for e_ in dst_:
-            for e in src:
-                if e in e_:
-                    correct += 1
-        # print('Coverage', correct, 'of', len(dst_))
-        coverage_total += correct / len(dst_)
-        checkpoint = time.time()
-        if checkpoint - last_checkpoint >= 15:
-            print('Precision: %.8f, Coverage (Recall): %.8f' % (precision_total / total_counted, coverage_total / total_counted), ' %d%%' % (100 * (idx + 1) / len(db)))
-            last_checkpoint = checkpoint
-    print('Final Precision: %.8f, Coverage (Recall): %.8f' % (precision_total / total_counted, coverage_total / total_counted))
+    # words go to worker processes in batches sharing level-2 work, results are logged as they come
+    summary = evaluate.run(finder, db, args.log, processes=args.processes, chunk_size=args.batch_size, fresh=args.fresh)
+    print('Evaluated %d words in %.1fs, %.1f words/s, latency p50 %.1fms, p90 %.1fms, p99 %.1fms, max %.1fms' % (summary['evaluated'], summary['seconds'], summary['words_per_second'], summary['latency']['p50'] * 1000, summary['latency']['p90'] * 1000, summary['latency']['p99'] * 1000, summary['latency']['max'] * 1000))
+    print('Final Precision: %.8f, Coverage (Recall): %.8f' % (summary['precision'], summary['coverage']))
+    if summary['report'] is not None:
+        print_report(summary['report'], args.log, args.report)
 
 
 if __name__ == '__main__':
@@ -157,4 +108,21 @@ if __name__ == '__main__':
     print("═╩╝╩ ╩ ╩ ╩╩  ╚═╝╩")
     print("- DMTIPCI Eval. -")
     print("    v" + str(system.VERSION) + "    ")
-    main()
+    parser = argparse.ArgumentParser(description='DMTIPCI Evaluation')
+    parser.add_argument('-e', '--engine', choices=['python', 'numpy'], default='python', help='Candidate weight scoring engine (numpy uses the sparse matrix engine, only faster with long level-2 definition lists, see dmtipci/vector.py)')
+    parser.add_argument('-b', '--batch-size', type=int, default=256, help='Number of words looked up together')
+    parser.add_argument('-j', '--processes', type=int, default=1, help='Number of worker processes looking up batches')
+    parser.add_argument('-l', '--log', default='eval_log.jsonl', help='Per-word results log, an interrupted evaluation resumes from it')
+    parser.add_argument('--fresh', action='store_true', help='Start over, ignoring the words already in the log')
+    parser.add_argument('--report', default='eval_report.json', help='Changes against the previous log (when the dictionary changed since it was written), see dmtipci/evaluate.py')
+    parser.add_argument('--sweep', action='store_true', help='Evaluate every combination of the threshold values below instead, see dmtipci/sweep.py')
+    parser.add_argument('--output-weight', default=','.join(map(str, sweep.GRID['output_weight'])), metavar='N,N,...', help='MINIMUM_OUTPUT_PREDICATE_WEIGHT values to sweep')
+    parser.add_argument('--word-shares', default=','.join(map(str, sweep.GRID['word_shares'])), metavar='N,N,...', help='MINIMUM_UNIGRAM_WORD_SHARES values to sweep')
+    parser.add_argument('--definition-weight', default=','.join(map(str, sweep.GRID['definition_weight'])), metavar='N,N,...', help='MINIMUM_DEFINITION_PREDICT_WEIGHT values to sweep')
+    parser.add_argument('--match-per-definition', default=','.join(map(str, sweep.GRID['match_per_definition'])), metavar='N,N,...', help='MINIMUM_UNIGRAM_MATCH_PER_DEFINITION values to sweep')
+    parser.add_argument('--traces', default='eval_traces', metavar='FILE', help='Threshold-independent lookup scores kept between sweeps')
+    parser.add_argument('--sweep-output', metavar='FILE', help='Also write the sweep table as JSON')
+    parser.add_argument('--export-json', action='store_true', help='Also write the dictionary, frequency and inflection maps as JSON')
+    parser.add_argument('--verify-engine', type=int, default=0, metavar='N', help='Check the numpy engine against the Python path on N sampled headwords, then exit')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,51 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import json
+import asyncio
+import argparse
+from dmtipci.dictionary import Dictionary
+from dmtipci            import system, loadtest
+
+
+def load_words(args):
+    if args.words:
+        with open(args.words, 'r', encoding='utf-8') as f:
+            return [x.strip() for x in f if len(x.strip()) > 0]
+    # headwords of the dictionary the service runs on
+    d = Dictionary()
+    d.load(args.text)
+    return list(d.dictionary)
+
+
+def main(args):
+    words   = load_words(args)
+    summary = asyncio.run(loadtest.run(args.host, args.port, words, args.requests, args.concurrency, args.batch))
+    print('----- Load Test ----')
+    print('%d requests (%d words) in %.2fs, %d clients: %.1f requests/s' % (summary['requests'], summary['words'], summary['seconds'], summary['concurrency'], summary['qps']))
+    print('Latency p50 %.2fms, p90 %.2fms, p99 %.2fms, max %.2fms' % tuple([summary['latency'][x] * 1000 for x in ('p50', 'p90', 'p99', 'max')]))
+    print('Responses:', ', '.join(['%s: %d' % (x, summary['statuses'][x]) for x in summary['statuses']]))
+    print('Server: %d batches, %.1f words per batch, cache %d hits / %d misses' % (summary['server']['batches'], summary['server']['batch_mean'], summary['server']['cache']['hits'], summary['server']['cache']['misses']))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
+
+
+if __name__ == '__main__':
+    print("╔╦╗╔╦╗╔╦╗╦╔═╗╔═╗╦")
+    print(" ║║║║║ ║ ║╠═╝║  ║")
+    print("═╩╝╩ ╩ ╩ ╩╩  ╚═╝╩")
+    print("- DMTIPCI Load  -")
+    print("    v" + str(system.VERSION) + "    ")
+    parser = argparse.ArgumentParser(description='DMTIPCI Query Service Load Test')
+    parser.add_argument('-H', '--host', default='127.0.0.1', help='Address of the service (see serve.py)')
+    parser.add_argument('-P', '--port', type=int, default=8765, help='Port of the service')
+    parser.add_argument('-n', '--requests', type=int, default=2000, help='Number of requests sent')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='Number of clients sending requests at the same time')
+    parser.add_argument('-b', '--batch', type=int, default=1, help='Words per request, more than 1 sends POST /find batches')
+    parser.add_argument('--words', metavar='FILE', help='Words to look up, one per line (default: headwords of TEXT)')
+    parser.add_argument('--text', default='dict/pg29765.txt', help='Gutenberg dictionary text the words are drawn from')
+    parser.add_argument('-o', '--output', metavar='FILE', help='Also write the summary as JSON')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,46 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+#cython: language_level=3, boundscheck=False
+
+import asyncio
+import argparse
+from dmtipci.dictionary import Dictionary
+from dmtipci.service    import QueryService
+from dmtipci            import system, predicates
+
+
+async def serve(args):
+    d = Dictionary()
+    # every shard is needed sooner or later, map them while the first requests come in
+    d.load(args.text, prefetch=True)
+    index = predicates.load(d, predicates.index_filename(args.text)) if args.index else None
+    service = QueryService(d, args.processes, args.batch_size, args.batch_wait / 1000, args.timeout, args.cache_size, index=index)
+    (host, port) = (await service.start(args.host, args.port))[:2]
+    print('! Serving on http://%s:%d/ (GET /find?word=apple, POST /find, /health, /metrics)' % (host, port))
+    try:
+        await service.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == '__main__':
+    print("╔╦╗╔╦╗╔╦╗╦╔═╗╔═╗╦")
+    print(" ║║║║║ ║ ║╠═╝║  ║")
+    print("═╩╝╩ ╩ ╩ ╩╩  ╚═╝╩")
+    print("- DMTIPCI Serve -")
+    print("    v" + str(system.VERSION) + "    ")
+    parser = argparse.ArgumentParser(description='DMTIPCI Query Service')
+    parser.add_argument('text', nargs='?', default='dict/pg29765.txt', help='Gutenberg dictionary text')
+    parser.add_argument('-H', '--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('-P', '--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('-j', '--processes', type=int, default=0, help='Number of worker processes scoring lookups (0: a single worker thread)')
+    parser.add_argument('-b', '--batch-size', type=int, default=64, help='Maximum number of words looked up together')
+    parser.add_argument('-w', '--batch-wait', type=float, default=2, help='Milliseconds a word waits for others to join its batch')
+    parser.add_argument('-t', '--timeout', type=float, default=5, help='Seconds before a request is answered with 504')
+    parser.add_argument('-c', '--cache-size', type=int, default=4096, help='Number of lookup results kept in memory (0 disables the cache)')
+    parser.add_argument('-i', '--index', action='store_true', help='Answer from the predicate index precomputed by build_dict.py --predicates, when it is up to date')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -1,6 +1,6 @@
 #!/usr/local/bin/python3
 
-from distutils.core import setup
+from setuptools import setup
 from Cython.Build import cythonize
 
 setup(
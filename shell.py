@@ -4,28 +4,46 @@
 
 import os
 import cmd
+import time
 import argparse
 from dmtipci.dictionary import Dictionary
 from dmtipci.find       import Finder
-from dmtipci            import system
+from dmtipci.cache      import ResultCache
+from dmtipci.result     import render_definitions
+from dmtipci.record     import POS_NAMES
+from dmtipci.stats      import FinderStats, PHASES, COUNTERS
+from dmtipci.vector     import MatrixEngine
+from dmtipci            import system, predicates
+
+
+REVERSE_LINES = 20  # headwords listed by the :reverse command
+COMPLETIONS   = 50  # headwords offered by tab completion
 
 
 class Shell(cmd.Cmd):
-    intro   = '! Welcome to DMTIPCI shell. Type ? to list commands.\n  . Type any word to query:\n    apple <return>\n  . Type an empty line to quit.\n'
+    intro   = '! Welcome to DMTIPCI shell. Type ? to list commands.\n  . Type any word to query:\n    apple <return>\n  . Type an empty line to quit.\n  . Commands start with a colon, any other line is a word:\n    :stats <return>\n    :reverse fruit n <return>\n'
     prompt  = '(DMTIPCI) '
 
     def __init__(self, args):
         cmd.Cmd.__init__(self)
+        self.started = time.time()
+        self.ready  = 0
+        self.command_started = self.started
+        self.answered = False
         master_text = 'dict/pg29765.txt'
-        word_freq   = 'dict/pg29765_word_freq'
-        word_infl   = 'dict/pg29765_word_infl'
+        self.results_file = 'dict/pg29765_results'
         d = Dictionary()
-        d.updateFromGutenbergText(master_text)
-        d.updateWordInflection(word_infl)
-        d.updateWordFrequency(word_freq)
+        d.load(master_text, prefetch=args.prefetch)
+        if args.export_json:
+            d.exportJSON(master_text)
         self.dictionary = d
         self.args = args
-        self.finder = Finder(d)
+        self.cache  = ResultCache(args.cache_size)
+        if args.persist_cache:
+            self.cache.load(self.results_file, d.artifact_version, system.VERSION)
+        self.stats  = FinderStats(args.stats_dump) if args.stats or args.stats_dump else None
+        index = predicates.load(d, predicates.index_filename(master_text)) if args.index else None
+        self.finder = Finder(d, self.cache, MatrixEngine(d) if args.engine == 'numpy' else None, self.stats, index)
         self.last_lookup = None
         print('')
         if args.auto_definition:
@@ -33,7 +51,29 @@ class Shell(cmd.Cmd):
         else:
             print('! Using manual definition enumeration mode. Type . to switch to automatic.')
 
+    def preloop(self):
+        self.ready = time.time() - self.started
+        print('! Ready in %.2fs.' % self.ready)
+        try:
+            import readline
+            # ':' starts a command name, it's not a word break to complete after
+            readline.set_completer_delims(readline.get_completer_delims().replace(':', ''))
+        except ImportError:
+            pass
+
+    def parseline(self, line):
+        # completion sees the typed ':' of a command, precmd() already took it off otherwise
+        return cmd.Cmd.parseline(self, line[1:] if line.startswith(':') else line)
+
+    def postcmd(self, stop, line):
+        # time to first answer leaves out the time spent typing
+        if not self.answered and line.startswith(('lookup', 'seldef')):
+            self.answered = True
+            print('! First answer in %.2fs.' % (self.ready + time.time() - self.command_started))
+        return stop
+
     def precmd(self, line):
+        self.command_started = time.time()
         if len(line.strip()) == 0:
             return 'quit'
         elif line.strip() == '.':
@@ -45,6 +85,10 @@ class Shell(cmd.Cmd):
             line = 'emptyinternal'
         elif line.strip().isdigit():
             line = 'seldef ' + line
+        elif line.lstrip().startswith(':'):
+            # a command, `stats` or `reverse x` alone still look up STATS and REVERSE
+            (name, space, arg) = line.lstrip()[1:].partition(' ')
+            line = name.lower() + space + arg
         elif not line.lower().startswith('lookup'):
             line = 'lookup ' + line
         return line
@@ -52,17 +96,94 @@ class Shell(cmd.Cmd):
     def do_lookup(self, arg):
         'Lookup a word: LOOKUP APPLE'
         self.last_lookup = arg
-        self.finder.find(arg, def_mode=(0 if self.args.auto_definition else -1))
+        if self.args.auto_definition:
+            result = self.finder.lookup(arg)
+            self.show(result)
+        else:
+            result = self.finder.definitions(arg)
+            if result is not None:
+                print('\n'.join(render_definitions(result)))
+        if result is None:
+            suggestions = self.finder.suggest(arg)
+            print('! Unknown word: ' + Dictionary.bareWord(arg) + ('. Did you mean: ' + ', '.join([x[0] for x in suggestions]) + '?' if suggestions else '.'))
 
     def do_seldef(self, arg):
         'Select definition of a word: SELDEF 1'
-        self.finder.find(self.last_lookup, def_mode=int(arg))
+        if self.last_lookup is not None:
+            self.show(self.finder.lookup(self.last_lookup, def_mode=int(arg)))
+
+    def show(self, result):
+        if result is not None:
+            for line in result.render():
+                print(line)
+
+    def completenames(self, text, *ignored):
+        # the first word of a line is a :command or, as typed lookups are, a word
+        if text.startswith(':'):
+            return [':' + x for x in cmd.Cmd.completenames(self, text[1:], *ignored) if x != 'emptyinternal']
+        return self.complete_lookup(text)
+
+    def complete_lookup(self, text, *ignored):
+        if len(text) == 0:
+            return []
+        words = self.dictionary.getCompletions(text, COMPLETIONS)
+        return [x.lower() for x in words] if text.islower() else words
+
+    complete_reverse = complete_lookup
+
+    def do_reverse(self, arg):
+        'Headwords having a word as a predicate, and definitions mentioning it, optionally of a POS: :REVERSE FRUIT, :REVERSE FRUIT N'
+        args    = arg.split()
+        if len(args) == 0 or len(args) > 2 or (len(args) == 2 and not args[1].upper() in POS_NAMES):
+            print('! Usage: :reverse WORD [' + '|'.join(POS_NAMES) + ']')
+            return
+        started = time.time()
+        mask    = Dictionary.getPOSMask([args[1].upper()]) if len(args) == 2 else 0
+        users   = self.finder.reverse(args[0], mask)
+        mentions = self.dictionary.getMentions(args[0], mask)
+        word    = Dictionary.bareWord(args[0])
+        heads   = list(dict.fromkeys([x[0] for x in mentions]))
+        if users is None:
+            print('! Predicates need an up to date index: build_dict.py --predicates, then start the shell with -i.')
+            print('! %s is mentioned in %d definitions of %d headwords%s' % (word, len(mentions), len(heads), ':' if heads else '.'))
+        else:
+            print('[', word, '<-', ']')
+            for (head, pos, weight) in users[:REVERSE_LINES]:
+                print(' ·', head, pos.lower() + '.', weight)
+            print('! %s is a predicate of %d headwords, mentioned in %d definitions of %d headwords%s' % (word, len(users), len(mentions), len(heads), ':' if heads else '.'))
+        if heads:
+            print('  ' + ', '.join(heads[:REVERSE_LINES]) + (', ...' if len(heads) > REVERSE_LINES else ''))
+        print('! %.2fms' % ((time.time() - started) * 1000))
+
+    def do_stats(self, arg):
+        'Show lookup counters and phase timings (shell started with --stats): :STATS, or :STATS RESET'
+        if self.cache.capacity > 0:
+            cache = self.cache.stats()
+            print('! Cache: %d/%d results, %d hits, %d misses, %d evictions' % (cache['size'], cache['capacity'], cache['hits'], cache['misses'], cache['evictions']))
+        if self.stats is None:
+            print('! Lookup stats are off, start the shell with --stats.')
+            return
+        if arg.strip().lower() == 'reset':
+            self.stats.reset()
+            print('! Lookup stats reset.')
+            return
+        report = self.stats.report()
+        print('! %d lookups (%d cached), %.2fms mean' % (report['queries'], report['cached'], report['mean'] * 1000))
+        print('  ' + ', '.join(['%s %d' % (x, report['counters'][x]) for x in COUNTERS]))
+        for x in PHASES:
+            print('  %-8s %9.2fms %5.1f%%' % (x, report['phases'][x] * 1000, 100 * report['phases'][x] / report['seconds'] if report['seconds'] > 0 else 0))
+        if report['slowest'] is not None:
+            print('  slowest: %s %.2fms' % (report['slowest']['word'], report['slowest']['seconds'] * 1000))
 
     def do_emptyinternal(self, arg):
         pass
 
     def do_quit(self, arg):
         'Quit'
+        if self.args.persist_cache:
+            self.cache.save(self.results_file, self.dictionary.artifact_version, system.VERSION)
+        if self.stats is not None:
+            self.stats.close()
         return True
 
 
@@ -74,6 +195,14 @@ if __name__ == '__main__':
     print("    v" + str(system.VERSION) + "    ")
     parser = argparse.ArgumentParser(description='DMTIPCI Shell')
     parser.add_argument('-a', '--auto-definition', action='store_true', help='Automatically enumerate all definitions (by default, manual definition selection is required)')
+    parser.add_argument('-e', '--engine', choices=['python', 'numpy'], default='python', help='Candidate weight scoring engine (numpy uses the sparse matrix engine, only faster with long level-2 definition lists, see dmtipci/vector.py)')
+    parser.add_argument('-c', '--cache-size', type=int, default=4096, help='Number of lookup results kept in memory (0 disables the cache)')
+    parser.add_argument('-p', '--persist-cache', action='store_true', help='Load lookup results cached by a previous session, and save them on quit')
+    parser.add_argument('-s', '--stats', action='store_true', help='Count lookup work and time its phases, see the stats command')
+    parser.add_argument('--stats-dump', metavar='FILE', help='Also append the stats of every lookup to FILE as JSON lines (implies --stats)')
+    parser.add_argument('-i', '--index', action='store_true', help='Answer from the predicate index precomputed by build_dict.py --predicates, when it is up to date')
+    parser.add_argument('--prefetch', action='store_true', help='Map all dictionary shards in the background right after startup')
+    parser.add_argument('--export-json', action='store_true', help='Also write the dictionary, frequency and inflection maps as JSON')
     args = parser.parse_args()
     shell = Shell(args)
     shell.cmdloop()